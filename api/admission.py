@@ -0,0 +1,233 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import metrics
+from execution import CPU_WORKERS
+
+
+# Image requests (weighted by image count) processed at once; OpenCV work itself is
+# bounded by CPU_WORKERS, the headroom keeps cores busy while others wait on storage
+ADMISSION_MAX_IN_FLIGHT = int(os.environ.get("ADMISSION_MAX_IN_FLIGHT", str(2 * CPU_WORKERS)))
+# Requests allowed to wait for a slot; beyond this they are rejected at once with 503
+ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", str(2 * ADMISSION_MAX_IN_FLIGHT)))
+# Seconds a queued request waits for a slot before it is rejected with 503
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "10"))
+# Retry-After (seconds) sent with 503 responses
+ADMISSION_RETRY_AFTER = int(os.environ.get("ADMISSION_RETRY_AFTER", "2"))
+# Per-user token bucket: sustained images per minute and burst size (0 disables rate limiting)
+USER_RATE_LIMIT_PER_MINUTE = float(os.environ.get("USER_RATE_LIMIT_PER_MINUTE", "30"))
+USER_RATE_LIMIT_BURST = int(os.environ.get("USER_RATE_LIMIT_BURST", "10"))
+# Number of users whose buckets are tracked (least recently seen are dropped)
+USER_RATE_LIMIT_MAX_USERS = int(os.environ.get("USER_RATE_LIMIT_MAX_USERS", "10000"))
+
+
+class Overloaded(RuntimeError):
+    """Raised when no processing slot is free and the wait queue is full or timed out."""
+
+    def __init__(self, message: str, retry_after: int = ADMISSION_RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimited(RuntimeError):
+    """Raised when a user has used up their token bucket."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounds the image work in flight and the number of requests waiting for it.
+    Requests are admitted in arrival order; when every slot is taken and the
+    queue is full, new requests are shed immediately instead of piling up
+    behind the CPU. Endpoints that do not enter admit() are never delayed.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = ADMISSION_MAX_IN_FLIGHT,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT
+    ):
+        """
+        Initialize the controller.
+
+        Args:
+            max_in_flight: Slots for concurrent image work
+            max_queue: Requests allowed to wait for a slot
+            queue_timeout: Seconds a request waits before being rejected
+        """
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        # Waiting requests in arrival order: [weight, future, shed]
+        self._waiters: deque = deque()
+        self._update_gauges()
+
+    @property
+    def queued(self) -> int:
+        """Requests waiting for a slot that can be shed."""
+        return sum(1 for _, _, shed in self._waiters if shed)
+
+    @asynccontextmanager
+    async def admit(self, weight: int = 1, shed: bool = True) -> AsyncIterator[None]:
+        """
+        Hold processing slots for the duration of a block.
+
+        Args:
+            weight: Slots needed (e.g. images in a batch), capped at max_in_flight
+            shed: Reject with Overloaded when the queue is full or the wait times
+                out; False waits indefinitely (background jobs bounded elsewhere)
+
+        Raises:
+            Overloaded: When the request is shed
+        """
+        weight = min(max(1, weight), self.max_in_flight)
+        await self._acquire(weight, shed)
+        try:
+            yield
+        finally:
+            self._release(weight)
+
+    async def _acquire(self, weight: int, shed: bool):
+        if not self._waiters and self.in_flight + weight <= self.max_in_flight:
+            self._grant(weight)
+            return
+
+        if shed and self.queued >= self.max_queue:
+            metrics.ADMISSION_REJECTIONS.inc(reason="queue_full")
+            raise Overloaded(f"Server busy ({self.in_flight} in flight, {self.queued} queued)")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [weight, future, shed]
+        self._waiters.append(entry)
+        self._update_gauges()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout if shed else None)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Granted just as the wait ended: hand the slots back
+                self._release(weight)
+            else:
+                future.cancel()
+                self._waiters.remove(entry)
+                self._update_gauges()
+            if isinstance(e, asyncio.TimeoutError):
+                metrics.ADMISSION_REJECTIONS.inc(reason="queue_timeout")
+                raise Overloaded(f"Server busy (no slot within {self.queue_timeout:g}s)") from None
+            raise
+
+    def _grant(self, weight: int):
+        self.in_flight += weight
+        self._update_gauges()
+
+    def _release(self, weight: int):
+        self.in_flight -= weight
+        # Strict arrival order: a large batch at the head is not overtaken
+        while self._waiters and self.in_flight + self._waiters[0][0] <= self.max_in_flight:
+            next_weight, future, _ = self._waiters.popleft()
+            self.in_flight += next_weight
+            future.set_result(None)
+        self._update_gauges()
+
+    def _update_gauges(self):
+        metrics.ADMISSION_IN_FLIGHT.set(self.in_flight)
+        metrics.ADMISSION_QUEUED.set(len(self._waiters))
+
+
+class RateLimiter:
+    """Per-key token buckets (e.g. per userId) refilled at a constant rate."""
+
+    def __init__(
+        self,
+        rate_per_minute: float = USER_RATE_LIMIT_PER_MINUTE,
+        burst: int = USER_RATE_LIMIT_BURST,
+        max_keys: int = USER_RATE_LIMIT_MAX_USERS
+    ):
+        """
+        Initialize the rate limiter.
+
+        Args:
+            rate_per_minute: Tokens added per minute (0 disables limiting)
+            burst: Bucket capacity
+            max_keys: Buckets tracked before the least recently used is dropped
+        """
+        self.rate = rate_per_minute / 60.0
+        self.burst = max(1, burst)
+        self.max_keys = max(1, max_keys)
+        # key -> (tokens, last refill time), least recently used first
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def acquire(self, key: str, cost: int = 1):
+        """
+        Take tokens from a key's bucket.
+
+        Args:
+            key: Bucket key (userId)
+            cost: Tokens to take (e.g. images in a batch), capped at the burst size
+
+        Raises:
+            RateLimited: When the bucket holds too few tokens
+        """
+        if self.rate <= 0:
+            return
+
+        cost = min(max(1, cost), self.burst)
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+
+        if tokens < cost:
+            self._buckets[key] = (tokens, now)
+            metrics.ADMISSION_REJECTIONS.inc(reason="rate_limited")
+            raise RateLimited(
+                f"Rate limit exceeded for user {key}",
+                retry_after=max(1, math.ceil((cost - tokens) / self.rate))
+            )
+
+        self._buckets[key] = (tokens - cost, now)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+
+# Singleton instances for reuse
+_admission_instance: Optional[AdmissionController] = None
+_rate_limiter_instance: Optional[RateLimiter] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    """
+    Get or create the singleton AdmissionController.
+
+    Returns:
+        AdmissionController instance
+    """
+    global _admission_instance
+
+    if _admission_instance is None:
+        _admission_instance = AdmissionController()
+
+    return _admission_instance
+
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    Get or create the singleton per-user RateLimiter.
+
+    Returns:
+        RateLimiter instance
+    """
+    global _rate_limiter_instance
+
+    if _rate_limiter_instance is None:
+        _rate_limiter_instance = RateLimiter()
+
+    return _rate_limiter_instance
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Benchmark face detection backends and strategies.
+Compares recall and CPU cost of every detector backend (face_detectors) combined
+with every detection strategy in FaceProcessor.find_faces (e.g. the single
+300x300 blob against tiled multi-scale detection) and detection size, so the
+adaptive coarse-to-fine strategy can be compared against fixed sizes.
+"""
+
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from face_detectors import DETECTOR_BACKENDS, NO_FACE_PRECHECK_DIMENSION
+from face_processor import FaceProcessor, non_max_suppression
+from benchmark_utils import load_annotations, load_images, recall, time_call
+
+
+STRATEGIES = ["single", "tiled", "adaptive"]
+BACKENDS = ["ssd"]
+
+
+def precheck_report(processor: FaceProcessor, images, reference, backends, max_dimension: int, repeat: int) -> dict:
+    """
+    Skip rate of the no-face pre-check per backend, and the reference faces
+    in images it would have skipped (these faces would stay unanonymized).
+    """
+    report = {}
+    for backend in backends:
+        skipped = missed = 0
+        total_seconds = 0.0
+        for name, image in images:
+            seconds, face_free = time_call(
+                lambda: processor.likely_face_free(image, max_dimension, backend), repeat
+            )
+            total_seconds += seconds
+            if face_free:
+                skipped += 1
+                missed += len(reference.get(name, []))
+        report[f"{backend}/precheck"] = {
+            "skip_rate": skipped / max(1, len(images)),
+            "missed_faces": missed,
+            "mean_ms": 1000 * total_seconds / max(1, len(images))
+        }
+
+    print(f"\nNo-face pre-check ({processor.precheck_dimension}px, margin {processor.precheck_margin:g})")
+    print(f"{'backend':<24} {'skip rate':>9} {'mean ms':>9} {'missed faces':>13}")
+    for label, row in report.items():
+        print(f"{label:<24} {row['skip_rate']:9.0%} {row['mean_ms']:9.1f} {row['missed_faces']:13d}")
+    return report
+
+
+def run_benchmark(processor: FaceProcessor, images, annotations, backends, strategies, max_dimensions, repeat: int):
+    """Run every backend/strategy/size combination over every image and collect timing and detections."""
+    configs = [
+        (backend, strategy, max_dimension)
+        for backend in backends for strategy in strategies for max_dimension in max_dimensions
+    ]
+    labels = [
+        f"{backend}/{strategy}" + (f"@{max_dimension}" if len(max_dimensions) > 1 else "")
+        for backend, strategy, max_dimension in configs
+    ]
+    detections = {label: {} for label in labels}
+    timings = {label: [] for label in labels}
+
+    for name, image in images:
+        height, width = image.shape[:2]
+        print(f"\n{name} ({width}x{height})")
+        for label, (backend, strategy, max_dimension) in zip(labels, configs):
+            seconds, boxes = time_call(
+                lambda: processor.find_faces(image, max_dimension, strategy, backend), repeat
+            )
+            detections[label][name] = boxes
+            timings[label].append(seconds)
+            print(f"  {label:<24} {seconds * 1000:8.1f} ms  {len(boxes):3d} faces")
+
+    # Without ground truth, every face found by any configuration is the reference set
+    if annotations:
+        reference = annotations
+        reference_label = "ground truth"
+    else:
+        reference = {}
+        for name, _ in images:
+            boxes = np.array(
+                [box for label in labels for box in detections[label][name]], dtype=int
+            ).reshape(-1, 4)
+            # Larger boxes win so duplicates of one face collapse onto the fullest box
+            areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+            keep = non_max_suppression(boxes, areas.astype(float), processor.nms_threshold)
+            reference[name] = [tuple(box) for box in boxes[keep].tolist()]
+        reference_label = "union of all configurations (relative recall)"
+
+    baseline = sum(timings[labels[0]]) or 1e-9
+    summary = {}
+    for label in labels:
+        found = total = 0
+        for name, _ in images:
+            f, t = recall(reference.get(name, []), detections[label][name])
+            found += f
+            total += t
+        total_seconds = sum(timings[label])
+        summary[label] = {
+            "images_per_sec": len(images) / total_seconds if total_seconds else 0.0,
+            "mean_ms": 1000 * total_seconds / max(1, len(images)),
+            "faces": sum(len(b) for b in detections[label].values()),
+            "recall": found / total if total else None,
+            "relative_cost": total_seconds / baseline
+        }
+
+    print("\n" + "=" * 78)
+    print(f"Recall reference: {reference_label}")
+    print(f"{'backend/strategy':<24} {'img/s':>8} {'mean ms':>9} {'faces':>6} {'recall':>7} {'cost':>6}")
+    for label, row in summary.items():
+        recall_text = f"{row['recall']:.2f}" if row["recall"] is not None else "n/a"
+        print(
+            f"{label:<24} {row['images_per_sec']:8.2f} {row['mean_ms']:9.1f} "
+            f"{row['faces']:6d} {recall_text:>7} {row['relative_cost']:5.1f}x"
+        )
+    print("=" * 78)
+
+    if processor.precheck_dimension:
+        summary.update(precheck_report(processor, images, reference, backends, max(max_dimensions), repeat))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark face detection backends and strategies (recall and CPU cost)',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Compare single-blob and tiled detection on crowd photos
+  python benchmark_detection.py -i crowd1.jpg crowd2.jpg
+
+  # Compare every detector backend on CPU, including the Haar-gated SSD
+  python benchmark_detection.py -i crowd1.jpg empty_stall.jpg --backends ssd yunet onnx haar haar+ssd --strategies single
+
+  # Adaptive coarse-to-fine detection against fixed detection sizes
+  python benchmark_detection.py -i crowd1.jpg portrait.jpg --strategies single adaptive --max-dimensions 400 800 1600
+
+  # Skip rate and missed faces of the no-face pre-check (off in production) with a wider safety margin
+  NO_FACE_PRECHECK_MARGIN=0.45 python benchmark_detection.py -i stalls/*.jpg --strategies single --precheck-dimension 192
+
+  # Use ground-truth boxes for absolute recall and save the summary
+  python benchmark_detection.py -i crowd1.jpg --annotations faces.json --json results.json
+        """
+    )
+
+    parser.add_argument('-i', '--images', nargs='+', required=True, help='Image(s) to benchmark')
+    parser.add_argument('--annotations', help='JSON file with ground-truth face boxes per image name')
+    parser.add_argument('--backends', nargs='+', default=BACKENDS,
+                        help=f'Detector backends to compare ({", ".join(DETECTOR_BACKENDS)}, or haar+<backend>)')
+    parser.add_argument('--strategies', nargs='+', default=STRATEGIES, help='Detection strategies to compare')
+    parser.add_argument('--max-dimensions', nargs='+', type=int, default=[800],
+                        help='Detection max dimensions to compare (default: 800)')
+    parser.add_argument('--precheck-dimension', type=int, default=NO_FACE_PRECHECK_DIMENSION or 192,
+                        help='No-face pre-check size to evaluate, 0 to skip it (default: 192)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per image; the median is reported (default: 3)')
+    parser.add_argument('--json', help='Write the summary to this JSON file')
+
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        print("❌ ERROR: No readable images")
+        sys.exit(1)
+
+    processor = FaceProcessor(use_pixelateme=False, precheck_dimension=args.precheck_dimension)
+    backends = []
+    for backend in args.backends:
+        try:
+            if processor.get_detector(backend).available:
+                backends.append(backend)
+                continue
+        except (ValueError, RuntimeError) as e:
+            print(f"⚠️  {e}")
+        print(f"⚠️  Skipping unavailable backend: {backend}")
+    if not backends:
+        print("❌ ERROR: No face detection backend available")
+        sys.exit(1)
+
+    summary = run_benchmark(
+        processor, images, load_annotations(args.annotations),
+        backends, args.strategies, args.max_dimensions, args.repeat
+    )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"💾 Saved: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
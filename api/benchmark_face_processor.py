@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Reproducible benchmark suite for FaceProcessor.
+Runs decode, detection, anonymization and encode on a synthetic and fixture
+image corpus at several resolutions, for every mode and detection size, and
+reports images/sec, p50/p95/p99 latency, peak RSS and allocations per stage.
+Results are saved as JSON; --compare flags regressions against an earlier run.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import cv2
+import numpy as np
+
+from face_processor import FaceProcessor
+from benchmark_utils import peak_rss_mb, percentile, reset_peak_rss
+
+
+RESOLUTIONS_MP = [1, 4, 12, 48]
+MODES = ["pixelate", "blur", "color"]
+MAX_DIMENSIONS = [400, 800, 1600]
+STAGES = ["decode", "detect", "anonymize", "encode"]
+DEFAULT_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app", "assets", "process", "test.jpg")
+
+
+def synthetic_image(megapixels: float, seed: int = 0) -> np.ndarray:
+    """
+    Deterministic 4:3 test image: smooth colour regions plus sensor-like noise,
+    so JPEG sizes and decode cost resemble real photos.
+    """
+    width = int(round(np.sqrt(megapixels * 1e6 * 4 / 3)))
+    height = int(round(width * 3 / 4))
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 256, size=(12, 16, 3), dtype=np.uint8)
+    image = cv2.resize(coarse, (width, height), interpolation=cv2.INTER_CUBIC)
+    noise = rng.integers(-12, 13, size=image.shape, dtype=np.int16)
+    return np.clip(image.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def fixture_image(path: str, megapixels: float) -> np.ndarray:
+    """Fixture photo resized (keeping its aspect ratio) to the target resolution."""
+    image = cv2.imread(path)
+    if image is None:
+        raise ValueError(f"Could not read fixture: {path}")
+    height, width = image.shape[:2]
+    scale = np.sqrt(megapixels * 1e6 / (width * height))
+    return cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_CUBIC)
+
+
+def reference_boxes(width: int, height: int, count: int = 8) -> list:
+    """
+    Fixed face-sized boxes spread over the image. The anonymize stage uses
+    these instead of the detections so its cost does not depend on the model.
+    """
+    size = max(8, min(width, height) // 10)
+    boxes = []
+    for i in range(count):
+        x = int((i % 4 + 0.5) * width / 4 - size / 2)
+        y = int((i // 4 + 0.5) * height / 2 - size / 2)
+        boxes.append((x, y, x + size, y + size))
+    return boxes
+
+
+def build_corpus(resolutions, fixtures, synthetic: bool):
+    """List of (source name, megapixels, JPEG bytes) covering every resolution."""
+    corpus = []
+    for megapixels in resolutions:
+        images = []
+        if synthetic:
+            images.append(("synthetic", synthetic_image(megapixels)))
+        for path in fixtures:
+            images.append((os.path.splitext(os.path.basename(path))[0], fixture_image(path, megapixels)))
+        for name, image in images:
+            success, encoded = cv2.imencode(".jpg", image, [int(cv2.IMWRITE_JPEG_QUALITY), 90])
+            if not success:
+                raise RuntimeError(f"Could not encode {name} at {megapixels} MP")
+            corpus.append((name, megapixels, encoded.tobytes()))
+    return corpus
+
+
+def run_stages(processor: FaceProcessor, image_bytes: bytes, mode: str, max_dimension: int, strategy: str, timings=None):
+    """Run the pipeline once, stage by stage; returns the detected face count."""
+    stage_start = time.perf_counter()
+    image = processor.decode_image(image_bytes)
+    if timings is not None:
+        timings["decode"].append(time.perf_counter() - stage_start)
+
+    stage_start = time.perf_counter()
+    faces = processor.find_faces(image, max_dimension, strategy)
+    if timings is not None:
+        timings["detect"].append(time.perf_counter() - stage_start)
+
+    boxes = reference_boxes(image.shape[1], image.shape[0])
+    stage_start = time.perf_counter()
+    processed = processor.anonymize(image, boxes, mode, in_place=processor.anonymize_in_place)
+    if timings is not None:
+        timings["anonymize"].append(time.perf_counter() - stage_start)
+
+    stage_start = time.perf_counter()
+    processor.encode_image(processed)
+    if timings is not None:
+        timings["encode"].append(time.perf_counter() - stage_start)
+
+    return len(faces)
+
+
+def measure_allocations(processor: FaceProcessor, image_bytes: bytes, mode: str, max_dimension: int, strategy: str):
+    """
+    Allocations per stage from one extra run under tracemalloc (numpy arrays,
+    including OpenCV outputs, are traced). Kept out of the timed runs because
+    tracing slows allocation down. "pipeline" is the peak over the whole run,
+    with the source bytes, decoded frame and encoded output alive together.
+    """
+    allocations = {}
+    tracemalloc.start()
+    try:
+        pipeline_peak = 0
+        def traced(stage, func, *args, **kwargs):
+            nonlocal pipeline_peak
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            result = func(*args, **kwargs)
+            current, peak = tracemalloc.get_traced_memory()
+            pipeline_peak = max(pipeline_peak, peak)
+            allocations[stage] = {
+                "peak_mb": (peak - before) / 1e6,
+                "retained_mb": (current - before) / 1e6
+            }
+            return result
+
+        start, _ = tracemalloc.get_traced_memory()
+        image = traced("decode", processor.decode_image, image_bytes)
+        traced("detect", processor.find_faces, image, max_dimension, strategy)
+        boxes = reference_boxes(image.shape[1], image.shape[0])
+        processed = traced("anonymize", processor.anonymize, image, boxes, mode, in_place=processor.anonymize_in_place)
+        traced("encode", processor.encode_image, processed)
+        allocations["pipeline"] = {"peak_mb": (pipeline_peak - start) / 1e6}
+    finally:
+        tracemalloc.stop()
+    return allocations
+
+
+def summarize_ms(values) -> dict:
+    return {
+        "p50_ms": 1000 * percentile(values, 50),
+        "p95_ms": 1000 * percentile(values, 95),
+        "p99_ms": 1000 * percentile(values, 99)
+    }
+
+
+def run_suite(processor: FaceProcessor, corpus, modes, max_dimensions, strategy: str, iterations: int, warmup: int):
+    """Benchmark every (image, mode, detection size) combination."""
+    results = {}
+    for name, megapixels, image_bytes in corpus:
+        for max_dimension in max_dimensions:
+            for mode in modes:
+                key = f"{name}/{megapixels}mp/{mode}/{max_dimension}"
+                for _ in range(warmup):
+                    run_stages(processor, image_bytes, mode, max_dimension, strategy)
+
+                rss_reset = reset_peak_rss()
+                timings = {stage: [] for stage in STAGES}
+                totals = []
+                faces = 0
+                for _ in range(iterations):
+                    start = time.perf_counter()
+                    faces = run_stages(processor, image_bytes, mode, max_dimension, strategy, timings)
+                    totals.append(time.perf_counter() - start)
+                peak_rss = peak_rss_mb()
+
+                allocations = measure_allocations(processor, image_bytes, mode, max_dimension, strategy)
+                results[key] = {
+                    "source": name,
+                    "megapixels": megapixels,
+                    "mode": mode,
+                    "max_dimension": max_dimension,
+                    "strategy": strategy,
+                    "faces": faces,
+                    "images_per_sec": len(totals) / sum(totals) if sum(totals) else 0.0,
+                    "latency": summarize_ms(totals),
+                    # Without a peak reset this is the process-wide peak so far
+                    "peak_rss_mb": peak_rss,
+                    "peak_rss_is_per_config": rss_reset,
+                    "pipeline_peak_alloc_mb": allocations["pipeline"]["peak_mb"],
+                    "stages": {
+                        stage: {**summarize_ms(timings[stage]), "allocations": allocations[stage]}
+                        for stage in STAGES
+                    }
+                }
+                row = results[key]
+                print(
+                    f"{key:<36} {row['images_per_sec']:7.2f} img/s  "
+                    f"p50 {row['latency']['p50_ms']:8.1f}  p95 {row['latency']['p95_ms']:8.1f}  "
+                    f"p99 {row['latency']['p99_ms']:8.1f} ms  rss {peak_rss:7.1f} MB  "
+                    f"alloc {row['pipeline_peak_alloc_mb']:7.1f} MB"
+                )
+    return results
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """
+    Compare two runs stage by stage on p50 latency.
+
+    Returns:
+        List of (config, stage, baseline ms, current ms) rows that regressed
+        by more than threshold (a fraction, e.g. 0.1 for 10%)
+    """
+    regressions = []
+    print("\n" + "=" * 80)
+    print(f"{'config':<36} {'stage':<10} {'base ms':>9} {'now ms':>9} {'change':>8}")
+    for key, row in current["results"].items():
+        base_row = baseline.get("results", {}).get(key)
+        if base_row is None:
+            continue
+        for stage in ["total"] + STAGES:
+            if stage == "total":
+                base_ms, now_ms = base_row["latency"]["p50_ms"], row["latency"]["p50_ms"]
+            else:
+                base_ms, now_ms = base_row["stages"][stage]["p50_ms"], row["stages"][stage]["p50_ms"]
+            change = (now_ms - base_ms) / base_ms if base_ms > 0 else 0.0
+            flag = "  ⚠️" if change > threshold else ""
+            print(f"{key:<36} {stage:<10} {base_ms:9.2f} {now_ms:9.2f} {change:+7.1%}{flag}")
+            if change > threshold:
+                regressions.append((key, stage, base_ms, now_ms))
+    print("=" * 80)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark FaceProcessor stages (throughput, latency percentiles, memory)',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Full suite (1/4/12/48 MP, every mode and detection size), saved as JSON
+  python benchmark_face_processor.py --json baseline.json
+
+  # Quick run on small images only
+  python benchmark_face_processor.py --resolutions 1 4 --iterations 5
+
+  # Peak memory of the copying anonymization, for comparison with the default in-place mode
+  python benchmark_face_processor.py --resolutions 12 --anonymize copy --json copy.json
+
+  # Re-run and fail (exit 1) when any stage's p50 regressed by more than 10%
+  python benchmark_face_processor.py --json current.json --compare baseline.json --threshold 0.1
+        """
+    )
+
+    parser.add_argument('--resolutions', nargs='+', type=float, default=RESOLUTIONS_MP, help='Image sizes in megapixels')
+    parser.add_argument('--modes', nargs='+', default=MODES, help='Anonymization modes')
+    parser.add_argument('--max-dimensions', nargs='+', type=int, default=MAX_DIMENSIONS, help='Detection sizes (downscaleForDetection)')
+    parser.add_argument('--strategy', default='single', help='Detection strategy (default: single)')
+    parser.add_argument('--detector', help='Detector backend (default: FACE_DETECTOR_BACKEND)')
+    parser.add_argument('--anonymize', choices=['in-place', 'copy'], default='in-place',
+                        help='Anonymize the decoded frame in place or a copy of it (default: in-place)')
+    parser.add_argument('--fixtures', nargs='*', default=[DEFAULT_FIXTURE], help='Fixture photos scaled to every resolution')
+    parser.add_argument('--no-synthetic', action='store_true', help='Skip the synthetic images')
+    parser.add_argument('--iterations', type=int, default=20, help='Timed runs per configuration (default: 20)')
+    parser.add_argument('--warmup', type=int, default=2, help='Untimed runs per configuration (default: 2)')
+    parser.add_argument('--json', help='Write results to this JSON file')
+    parser.add_argument('--compare', help='Baseline JSON from an earlier run')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Regression threshold for --compare (default: 0.1)')
+
+    args = parser.parse_args()
+
+    fixtures = [path for path in args.fixtures if os.path.exists(path)]
+    for path in set(args.fixtures) - set(fixtures):
+        print(f"⚠️  Skipping missing fixture: {path}")
+    if args.no_synthetic and not fixtures:
+        print("❌ ERROR: Empty corpus")
+        sys.exit(1)
+
+    kwargs = {"detector_backend": args.detector} if args.detector else {}
+    processor = FaceProcessor(use_pixelateme=False, anonymize_in_place=args.anonymize == 'in-place', **kwargs)
+    if not processor.detector.available:
+        print("❌ ERROR: Face detection model not available")
+        sys.exit(1)
+
+    print("Building corpus...")
+    corpus = build_corpus(args.resolutions, fixtures, not args.no_synthetic)
+    results = run_suite(
+        processor, corpus, args.modes, args.max_dimensions,
+        args.strategy, max(1, args.iterations), max(0, args.warmup)
+    )
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "opencv_threads": cv2.getNumThreads(),
+            "detector": processor.detector_backend,
+            "anonymize": args.anonymize,
+            "iterations": args.iterations
+        },
+        "results": results
+    }
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Saved: {args.json}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} stage(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+        print("✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Benchmark the market list endpoints.
+
+search: /markets/nearby's full scan (haversine over every market in the
+date window) against the grid index of the market snapshot. Markets are
+synthetic, spread over Denmark with a denser cluster around the large
+cities; every query's results are checked to be identical.
+
+serialization: a market list response built from MarketSummary objects and
+serialized through response_model, against the pre-serialized snapshot
+fragments. Both run as FastAPI endpoints and must return the same bytes.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import List
+
+from fastapi import FastAPI
+
+from geo_index import GeoIndex
+from markets_api import MARKET_VIEWS, LIST_VIEWS, MarketSummary, calculate_distance, encode_market, render_markets
+
+
+MARKET_COUNTS = [1000, 10000, 100000]
+ROW_COUNTS = [50, 200, 1000]
+# (latitude, longitude) of Copenhagen, Aarhus, Odense and Aalborg
+CITIES = [(55.676, 12.568), (56.162, 10.203), (55.403, 10.402), (57.048, 9.919)]
+
+
+def synthetic_markets(count: int, seed: int = 0) -> list:
+    """Markets over the next 90 days, half around the cities and half anywhere in Denmark."""
+    rng = random.Random(seed)
+    today = date.today()
+    markets = []
+    for i in range(count):
+        if i % 2:
+            lat, lon = rng.choice(CITIES)
+            lat, lon = lat + rng.gauss(0, 0.15), lon + rng.gauss(0, 0.25)
+        else:
+            lat, lon = rng.uniform(54.6, 57.7), rng.uniform(8.1, 15.1)
+        # A few markets without coordinates, like scraped rows lacking an address
+        if i % 50 == 0:
+            lat = lon = None
+        markets.append({"latitude": lat, "longitude": lon, "start_date": today + timedelta(days=rng.randrange(90))})
+    return markets
+
+
+def full_scan(markets, latitude, longitude, radius_km, start, end, limit):
+    """The search as done before the index: every market in the window, sorted by distance."""
+    matches = []
+    for i, market in enumerate(markets):
+        if start <= market["start_date"] <= end and market["latitude"] and market["longitude"]:
+            distance = calculate_distance(latitude, longitude, market["latitude"], market["longitude"])
+            if distance <= radius_km:
+                matches.append((i, distance))
+    matches.sort(key=lambda match: match[1])
+    return matches[:limit]
+
+
+def run(count: int, queries: int, radius_km: float, days_ahead: int, limit: int, seed: int) -> dict:
+    """Time both searches over the same random user locations."""
+    markets = synthetic_markets(count, seed)
+    build_start = time.perf_counter()
+    index = GeoIndex([(m["latitude"], m["longitude"]) for m in markets])
+    build_ms = 1000 * (time.perf_counter() - build_start)
+
+    rng = random.Random(seed + 1)
+    start = date.today()
+    end = start + timedelta(days=days_ahead)
+    scan_ms, index_ms = [], []
+    for _ in range(queries):
+        lat, lon = rng.uniform(54.8, 57.5), rng.uniform(8.3, 12.6)
+
+        t = time.perf_counter()
+        expected = full_scan(markets, lat, lon, radius_km, start, end, limit)
+        scan_ms.append(1000 * (time.perf_counter() - t))
+
+        t = time.perf_counter()
+        found = index.nearest(
+            lat, lon, limit, max_km=radius_km,
+            predicate=lambda i: start <= markets[i]["start_date"] <= end
+        )
+        index_ms.append(1000 * (time.perf_counter() - t))
+
+        if found != expected:
+            raise AssertionError(f"Index results differ from the full scan at ({lat:.4f}, {lon:.4f})")
+
+    return {
+        "markets": count,
+        "build_ms": build_ms,
+        "scan_ms": statistics.mean(scan_ms),
+        "index_ms": statistics.mean(index_ms),
+        "speedup": statistics.mean(scan_ms) / statistics.mean(index_ms)
+    }
+
+
+def synthetic_rows(count: int, seed: int = 0) -> list:
+    """Markets with every list field filled in, as held by the market snapshot."""
+    rng = random.Random(seed)
+    today = date.today()
+    rows = []
+    for i in range(count):
+        start = today + timedelta(days=rng.randrange(30))
+        rows.append({
+            "id": f"00000000-0000-4000-8000-{i:012d}", "external_id": f"loppemarkeder_nu_{i}",
+            "name": f"Loppemarked {i} på Østerbro", "municipality": "København", "category": "Loppemarked",
+            "start_date": start, "end_date": start + timedelta(days=rng.randrange(3)),
+            "address": f"Nørre Allé {i}", "city": "København N", "postal_code": "2200",
+            "latitude": rng.uniform(55.6, 55.8), "longitude": rng.uniform(12.4, 12.6),
+            "description": "Hyggeligt loppemarked med tøj, bøger, møbler og kaffe. " * rng.randrange(1, 6),
+            "organizer_name": "Foreningen", "organizer_phone": "+45 12 34 56 78", "organizer_email": "info@example.dk",
+            "organizer_website": "https://example.dk", "opening_hours": "10:00-16:00",
+            "entry_fee": rng.choice([None, 0, 10.0, 25.5]), "stall_count": rng.choice([None, 40, 120]),
+            "has_food": True, "has_parking": bool(i % 2), "has_toilets": True, "has_wifi": False,
+            "is_indoor": bool(i % 3 == 0), "is_outdoor": bool(i % 3), "special_features": None,
+            "source_url": f"https://loppemarkeder.nu/marked/{i}",
+            "scraped_at": datetime(2025, 1, 7, 2, 0, rng.randrange(60), rng.randrange(1000000), tzinfo=timezone.utc)
+        })
+    return rows
+
+
+async def _get(app: FastAPI, path: str, query: str) -> bytes:
+    """Run one GET through the ASGI app and return the response body."""
+    body = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    await app({
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "root_path": "", "query_string": query.encode(),
+        "headers": [], "server": ("bench", 80), "client": ("bench", 1)
+    }, receive, send)
+    return b"".join(body)
+
+
+def serialization_app(items: list) -> FastAPI:
+    """Endpoints returning the same market list through response_model and as pre-serialized bytes."""
+    app = FastAPI()
+
+    @app.get("/model", response_model=List[MarketSummary], response_model_exclude_unset=True)
+    async def model_path(view: str = "list"):
+        fields = MARKET_VIEWS[view]
+        return [MarketSummary(**{field: dict(market, distance=distance).get(field) for field in fields})
+                for market, _, distance in items]
+
+    @app.get("/bytes")
+    async def bytes_path(view: str = "list"):
+        return render_markets(items, MARKET_VIEWS[view], view)
+
+    return app
+
+
+def run_serialization(count: int, repeat: int, seed: int) -> list:
+    """Time both serialization paths for one response size, per view."""
+    markets = synthetic_rows(count, seed)
+    encode_start = time.perf_counter()
+    encoded = [encode_market(market) for market in markets]
+    encode_us = 1e6 * (time.perf_counter() - encode_start) / count
+    rng = random.Random(seed)
+    items = [(market, fragments, rng.uniform(0, 50)) for market, fragments in zip(markets, encoded)]
+    app = serialization_app(items)
+
+    async def timed(path: str, view: str):
+        body = await _get(app, path, f"view={view}")
+        samples = []
+        for _ in range(repeat):
+            t = time.perf_counter()
+            await _get(app, path, f"view={view}")
+            samples.append(1000 * (time.perf_counter() - t))
+        return body, statistics.median(samples)
+
+    rows = []
+    for view in LIST_VIEWS:
+        model_body, model_ms = asyncio.run(timed("/model", view))
+        bytes_body, bytes_ms = asyncio.run(timed("/bytes", view))
+        if model_body != bytes_body:
+            raise AssertionError(f"Pre-serialized {view} response differs from response_model ({count} rows)")
+        rows.append({
+            "rows": count, "view": view, "kb": len(bytes_body) / 1024, "encode_us": encode_us,
+            "model_ms": model_ms, "bytes_ms": bytes_ms, "speedup": model_ms / bytes_ms
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark market search (full scan vs grid index) and list serialization (response_model vs pre-serialized)',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Default sizes (1k, 10k, 100k markets), 50 km radius, 50 results
+  python benchmark_markets.py
+
+  # Wide searches, as a user zoomed out over the whole country
+  python benchmark_markets.py --benchmarks search --radius-km 300 --limit 100 --json markets.json
+
+  # Response serialization only, up to 1000-market responses
+  python benchmark_markets.py --benchmarks serialization --rows 50 1000
+        """
+    )
+
+    parser.add_argument('--benchmarks', nargs='+', choices=['search', 'serialization'],
+                        default=['search', 'serialization'], help='What to run (default: both)')
+    parser.add_argument('--markets', type=int, nargs='+', default=MARKET_COUNTS,
+                        help='Snapshot sizes to test (default: 1000 10000 100000)')
+    parser.add_argument('--rows', type=int, nargs='+', default=ROW_COUNTS,
+                        help='Response sizes for the serialization benchmark (default: 50 200 1000)')
+    parser.add_argument('--repeat', type=int, default=20, help='Responses timed per size and view (default: 20)')
+    parser.add_argument('--queries', type=int, default=200, help='Random user locations per size (default: 200)')
+    parser.add_argument('--radius-km', type=float, default=50.0, help='Search radius (default: 50)')
+    parser.add_argument('--days-ahead', type=int, default=30, help='Date window (default: 30)')
+    parser.add_argument('--limit', type=int, default=50, help='Markets returned per query (default: 50)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    parser.add_argument('--json', help='Write the results to this JSON file')
+
+    args = parser.parse_args()
+
+    results = {}
+    if 'search' in args.benchmarks:
+        results['search'] = []
+        for count in args.markets:
+            print(f"⏱️  {count} markets ({args.queries} queries)")
+            results['search'].append(run(count, args.queries, args.radius_km, args.days_ahead, args.limit, args.seed))
+
+        print("\n" + "=" * 62)
+        print(f"{'markets':>9} {'index build':>12} {'full scan':>11} {'grid index':>11} {'speedup':>9}")
+        for row in results['search']:
+            print(
+                f"{row['markets']:>9} {row['build_ms']:10.1f}ms {row['scan_ms']:9.2f}ms "
+                f"{row['index_ms']:9.3f}ms {row['speedup']:8.1f}x"
+            )
+        print("=" * 62)
+        print("✅ Index results identical to the full scan for every query\n")
+
+    if 'serialization' in args.benchmarks:
+        results['serialization'] = []
+        for count in args.rows:
+            print(f"⏱️  {count}-market responses ({args.repeat} each)")
+            results['serialization'].extend(run_serialization(count, args.repeat, args.seed))
+
+        print("\n" + "=" * 70)
+        print(f"{'rows':>6} {'view':>5} {'KB':>8} {'encode/market':>14} {'response_model':>15} {'bytes':>9} {'speedup':>8}")
+        for row in results['serialization']:
+            print(
+                f"{row['rows']:>6} {row['view']:>5} {row['kb']:8.1f} {row['encode_us']:12.0f}us "
+                f"{row['model_ms']:13.2f}ms {row['bytes_ms']:7.2f}ms {row['speedup']:7.1f}x"
+            )
+        print("=" * 70)
+        print("✅ Pre-serialized responses identical to response_model for every size and view")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Saved: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Benchmark cold start and memory of each deployable app configuration.
+Every run starts a fresh interpreter with API_SERVICES set, imports main,
+runs the app's startup (including the face model load and warm-up for the
+image service) and reports time to ready and resident memory.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+CONFIGURATIONS = ["markets", "images", "markets,images"]
+HEAVY_MODULES = ["cv2", "numpy", "face_processor"]
+
+
+def _status_mb(field: str) -> float:
+    """A memory field of /proc/self/status (VmRSS, VmHWM) in MB."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run_child(services: str, spawned_at: float):
+    """Measure one cold start in this (fresh) process and print it as JSON."""
+    # No benchmark helpers are imported here: benchmark_utils pulls in OpenCV
+    os.environ["API_SERVICES"] = services
+    start = time.perf_counter()
+    import main
+    imported = time.perf_counter()
+
+    async def startup():
+        async with main.app.router.lifespan_context(main.app):
+            if "images" in services:
+                import images_api
+                try:
+                    await asyncio.shield(images_api.model_warmup)
+                except Exception as e:
+                    print(f"⚠️  Model load failed: {e}", file=sys.stderr)
+
+    asyncio.run(startup())
+    ready = time.time()
+
+    print(json.dumps({
+        "import_seconds": imported - start,
+        "cold_start_seconds": ready - spawned_at,
+        "rss_mb": _status_mb("VmRSS"),
+        "peak_rss_mb": _status_mb("VmHWM"),
+        "modules": [name for name in HEAVY_MODULES if name in sys.modules]
+    }))
+
+
+def measure(services: str, repeat: int, env: dict) -> dict:
+    """Start `repeat` fresh processes for one configuration and summarize them."""
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", services, str(time.time())],
+            capture_output=True, text=True, env=env, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout
+        # The app may print while starting; the measurement is the last line
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    return {
+        "cold_start_seconds": statistics.median(r["cold_start_seconds"] for r in runs),
+        "import_seconds": statistics.median(r["import_seconds"] for r in runs),
+        "rss_mb": statistics.median(r["rss_mb"] for r in runs),
+        "peak_rss_mb": statistics.median(r["peak_rss_mb"] for r in runs),
+        "modules": runs[-1]["modules"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark cold start time and memory of the market-only, image-only and combined apps',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Compare every configuration (5 cold starts each, median reported)
+  python benchmark_startup.py
+
+  # Only the slimmed market service, saved as JSON
+  python benchmark_startup.py --services markets --json startup.json
+        """
+    )
+
+    parser.add_argument('--services', nargs='+', default=CONFIGURATIONS,
+                        help='API_SERVICES values to compare (default: markets, images, markets,images)')
+    parser.add_argument('--repeat', type=int, default=5, help='Cold starts per configuration (default: 5)')
+    parser.add_argument('--json', help='Write the results to this JSON file')
+    parser.add_argument('--child', nargs=2, metavar=('SERVICES', 'SPAWNED_AT'), help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child[0], float(args.child[1]))
+        return
+
+    # Keep the job database and caches out of /app when run outside the container
+    scratch = tempfile.mkdtemp(prefix="startup-bench-")
+    env = dict(os.environ)
+    env.setdefault("JOB_DB_PATH", os.path.join(scratch, "jobs.db"))
+    env.setdefault("RESULT_CACHE_DIR", os.path.join(scratch, "results"))
+    env.setdefault("DETECTION_CACHE_DIR", os.path.join(scratch, "detections"))
+
+    results = {}
+    for services in args.services:
+        print(f"⏱️  {services} ({args.repeat} cold starts)")
+        results[services] = measure(services, args.repeat, env)
+
+    print("\n" + "=" * 78)
+    print(f"{'API_SERVICES':<16} {'cold start':>11} {'import':>9} {'RSS MB':>8} {'peak MB':>8}  heavy modules")
+    for services, row in results.items():
+        print(
+            f"{services:<16} {row['cold_start_seconds'] * 1000:9.0f}ms {row['import_seconds'] * 1000:7.0f}ms "
+            f"{row['rss_mb']:8.1f} {row['peak_rss_mb']:8.1f}  {', '.join(row['modules']) or '-'}"
+        )
+    print("=" * 78)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Saved: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Shared helpers for the face processing benchmark scripts.
+"""
+
+import json
+import os
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+
+Box = Tuple[int, int, int, int]
+
+
+def load_images(paths: Sequence[str]) -> List[Tuple[str, np.ndarray]]:
+    """Read images from disk, skipping files OpenCV cannot decode."""
+    images = []
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            print(f"⚠️  Skipping unreadable image: {path}")
+            continue
+        images.append((os.path.basename(path), image))
+    return images
+
+
+def load_annotations(path: Optional[str]) -> Dict[str, List[Box]]:
+    """
+    Load ground-truth face boxes.
+
+    The file maps image file names to lists of [x1, y1, x2, y2] boxes, e.g.
+    {"market.jpg": [[120, 80, 180, 150], [400, 90, 450, 160]]}
+    """
+    if not path:
+        return {}
+    with open(path) as f:
+        data = json.load(f)
+    return {name: [tuple(map(int, box)) for box in boxes] for name, boxes in data.items()}
+
+
+def covered_fraction(truth: Box, detections: Sequence[Box]) -> float:
+    """Fraction of a ground-truth box covered by the union of the detected boxes."""
+    x1, y1, x2, y2 = truth
+    width, height = max(1, x2 - x1), max(1, y2 - y1)
+    mask = np.zeros((height, width), dtype=bool)
+    for bx1, by1, bx2, by2 in detections:
+        mask[max(0, by1 - y1):max(0, by2 - y1), max(0, bx1 - x1):max(0, bx2 - x1)] = True
+    return float(mask.mean())
+
+
+def recall(truth: Sequence[Box], detections: Sequence[Box], min_coverage: float = 0.5) -> Tuple[int, int]:
+    """
+    Count ground-truth faces that are anonymized by the detections.
+    A face counts as found when the detections cover at least min_coverage
+    of it (what matters for anonymization is coverage, not IoU).
+
+    Returns:
+        Tuple of (faces found, total faces)
+    """
+    found = sum(1 for face in truth if covered_fraction(face, detections) >= min_coverage)
+    return found, len(truth)
+
+
+def time_call(func: Callable[[], object], repeat: int = 3) -> Tuple[float, object]:
+    """
+    Run a callable several times.
+
+    Returns:
+        Tuple of (median seconds per call, result of the last call)
+    """
+    timings = []
+    result = None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)), result
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Percentile of a list of values (0 for an empty list)."""
+    return float(np.percentile(values, q)) if len(values) else 0.0
+
+
+def reset_peak_rss() -> bool:
+    """
+    Reset the kernel's peak RSS counter for this process (Linux only).
+
+    Returns:
+        True when the reset worked, so peak_rss_mb() measures from now on
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024) if os.uname().sysname == "Darwin" else maxrss / 1024
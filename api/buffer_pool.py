@@ -0,0 +1,71 @@
+import os
+import threading
+from typing import Tuple
+
+import numpy as np
+
+
+# Largest scratch buffer (bytes) kept for reuse; bigger requests get a fresh array
+BUFFER_POOL_MAX_BYTES = int(os.environ.get("BUFFER_POOL_MAX_BYTES", str(32 * 1024 * 1024)))
+
+
+class BufferPool:
+    """
+    Per-thread scratch arrays reused across requests.
+
+    Each named buffer keeps a flat backing array that only grows, and hands
+    out views of the requested shape, so detection downscales, DNN blobs and
+    pixelation temporaries stop allocating once the common image sizes have
+    been seen. Buffers are thread-local: a view stays valid until the same
+    thread asks for the same name again, so callers must not keep it beyond
+    the operation that requested it.
+    """
+
+    def __init__(self, max_bytes: int = BUFFER_POOL_MAX_BYTES):
+        """
+        Initialize the pool.
+
+        Args:
+            max_bytes: Largest buffer kept for reuse
+        """
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+    def get(self, name: str, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """
+        Get a scratch array (contents undefined).
+
+        Args:
+            name: Buffer name; distinct names never share memory
+            shape: Shape of the returned array
+            dtype: Element type
+
+        Returns:
+            Array of the requested shape and dtype
+        """
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        if nbytes > self.max_bytes:
+            return np.empty(shape, dtype=dtype)
+
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        backing = buffers.get(name)
+        if backing is None or backing.nbytes < nbytes:
+            backing = buffers[name] = np.empty(nbytes, dtype=np.uint8)
+        return backing[:nbytes].view(dtype).reshape(shape)
+
+
+# Singleton instance for reuse
+_pool_instance = BufferPool()
+
+
+def get_buffer_pool() -> BufferPool:
+    """
+    Get the process-wide BufferPool.
+
+    Returns:
+        BufferPool instance
+    """
+    return _pool_instance
@@ -0,0 +1,131 @@
+import os
+from typing import Dict, List, NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+
+# Derivatives produced by /process when a request does not list its own, as
+# name:format:quality:max_dimension (max_dimension 0 keeps the full size)
+IMAGE_DERIVATIVES = os.environ.get(
+    "IMAGE_DERIVATIVES",
+    "full:jpeg:95:0,display:webp:80:1600,thumb:webp:70:320"
+)
+# Format used when the requested one has no encoder in this OpenCV build
+DERIVATIVE_FALLBACK_FORMAT = os.environ.get("DERIVATIVE_FALLBACK_FORMAT", "webp")
+
+# format -> (file extension, content type, quality flag)
+FORMATS = {
+    "jpeg": (".jpg", "image/jpeg", int(cv2.IMWRITE_JPEG_QUALITY)),
+    "webp": (".webp", "image/webp", int(cv2.IMWRITE_WEBP_QUALITY)),
+    # IMWRITE_AVIF_QUALITY only exists in OpenCV builds with AVIF support (4.9+)
+    "avif": (".avif", "image/avif", int(getattr(cv2, "IMWRITE_AVIF_QUALITY", 512))),
+}
+
+
+class DerivativeSpec(NamedTuple):
+    """One output rendition of a processed image."""
+    name: str
+    format: str = "jpeg"
+    quality: int = 90
+    max_dimension: Optional[int] = None  # None keeps the full size
+
+
+class EncodedDerivative(NamedTuple):
+    """An encoded rendition ready for upload."""
+    data: bytes
+    format: str
+    content_type: str
+    extension: str
+    width: int
+    height: int
+
+
+def parse_derivative_specs(value: str) -> List[DerivativeSpec]:
+    """
+    Parse a derivative list such as "full:jpeg:95:0,thumb:webp:70:320".
+
+    Args:
+        value: Comma-separated name:format:quality:max_dimension entries
+
+    Returns:
+        List of DerivativeSpec
+    """
+    specs = []
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        name, fmt, quality, max_dimension = entry.split(":")
+        specs.append(DerivativeSpec(name, fmt.lower(), int(quality), int(max_dimension) or None))
+    validate_derivative_specs(specs)
+    return specs
+
+
+def validate_derivative_specs(specs: List[DerivativeSpec]):
+    """Raise ValueError for unknown formats, bad qualities or duplicate names."""
+    if not specs:
+        raise ValueError("At least one derivative is required")
+    names = set()
+    for spec in specs:
+        if spec.format not in FORMATS:
+            raise ValueError(f"Unknown derivative format '{spec.format}' (expected one of {', '.join(FORMATS)})")
+        if not 1 <= spec.quality <= 100:
+            raise ValueError(f"Derivative quality must be between 1 and 100, got {spec.quality}")
+        if spec.max_dimension is not None and spec.max_dimension <= 0:
+            raise ValueError(f"Derivative max dimension must be positive, got {spec.max_dimension}")
+        if spec.name in names:
+            raise ValueError(f"Duplicate derivative name '{spec.name}'")
+        names.add(spec.name)
+
+
+def supported_format(fmt: str) -> str:
+    """The requested format, or the fallback when OpenCV cannot write it."""
+    if cv2.haveImageWriter(FORMATS[fmt][0]):
+        return fmt
+    return DERIVATIVE_FALLBACK_FORMAT
+
+
+def encode_derivatives(
+    image: np.ndarray,
+    specs: List[DerivativeSpec],
+    source_jpeg: Optional[bytes] = None
+) -> Dict[str, EncodedDerivative]:
+    """
+    Encode every derivative from one decoded, anonymized frame.
+    Smaller renditions are resized from the next larger one instead of
+    the full frame, so each INTER_AREA resize reads fewer pixels.
+
+    Args:
+        image: Anonymized image as numpy array (BGR format)
+        specs: Derivatives to produce
+        source_jpeg: JPEG bytes of exactly this frame (see image_ingest.passthrough_jpeg),
+            used as is for full-size JPEG derivatives instead of re-encoding
+
+    Returns:
+        Dict of derivative name -> EncodedDerivative
+    """
+    height, width = image.shape[:2]
+    longest = max(height, width)
+    results = {}
+    source = image
+
+    # Largest first so every resize can start from the previous rendition
+    for spec in sorted(specs, key=lambda s: -(s.max_dimension or longest)):
+        scale = min(1.0, (spec.max_dimension or longest) / float(longest))
+        target = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        if (source.shape[1], source.shape[0]) != target:
+            source = cv2.resize(source, target, interpolation=cv2.INTER_AREA)
+
+        fmt = supported_format(spec.format)
+        extension, content_type, quality_flag = FORMATS[fmt]
+        if source_jpeg is not None and fmt == "jpeg" and source is image:
+            data = source_jpeg
+        else:
+            success, encoded = cv2.imencode(extension, source, [quality_flag, spec.quality])
+            if not success:
+                raise RuntimeError(f"Failed to encode derivative '{spec.name}' as {fmt}")
+            data = encoded.tobytes()
+
+        results[spec.name] = EncodedDerivative(
+            data, fmt, content_type, extension, source.shape[1], source.shape[0]
+        )
+
+    return results
@@ -0,0 +1,68 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+
+# Number of threads running OpenCV work (decode, detection, anonymization, encode).
+# OpenCV releases the GIL inside its native calls, so threads scale across cores.
+CPU_WORKERS = int(os.environ.get("CPU_WORKERS", os.cpu_count() or 1))
+
+
+class ExecutionLayer:
+    """
+    Runs CPU-bound OpenCV work for the image pipeline on a bounded thread
+    pool so it never blocks the event loop.
+    """
+
+    def __init__(self, cpu_workers: int = CPU_WORKERS):
+        """
+        Initialize the execution layer.
+
+        Args:
+            cpu_workers: Number of threads for CPU-bound image work
+        """
+        self.cpu_workers = max(1, cpu_workers)
+
+        self._cpu_executor = ThreadPoolExecutor(
+            max_workers=self.cpu_workers,
+            thread_name_prefix="image-cpu"
+        )
+
+    async def run_cpu(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run a CPU-bound callable on the thread pool and await its result.
+
+        Args:
+            func: Callable to run
+            *args, **kwargs: Arguments passed to the callable
+
+        Returns:
+            Whatever the callable returns
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._cpu_executor, partial(func, *args, **kwargs))
+
+    async def close(self):
+        """Shut down the CPU pool."""
+        self._cpu_executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Singleton instance for reuse
+_execution_instance: Optional[ExecutionLayer] = None
+
+
+def get_execution_layer() -> ExecutionLayer:
+    """
+    Get or create a singleton ExecutionLayer instance.
+
+    Returns:
+        ExecutionLayer instance
+    """
+    global _execution_instance
+
+    if _execution_instance is None:
+        _execution_instance = ExecutionLayer()
+
+    return _execution_instance
@@ -0,0 +1,512 @@
+import os
+import threading
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from buffer_pool import get_buffer_pool
+
+
+# Backend used when a request does not name one (see create_detector)
+FACE_DETECTOR_BACKEND = os.environ.get("FACE_DETECTOR_BACKEND", "ssd")
+# Model files for the ONNX backends; the SSD paths are FaceProcessor arguments
+YUNET_MODEL_PATH = os.environ.get("YUNET_MODEL_PATH", "/models/face_detection_yunet_2022mar.onnx")
+ONNX_FACE_MODEL_PATH = os.environ.get("ONNX_FACE_MODEL_PATH", "/models/version-RFB-320-int8.onnx")
+# Empty means the frontal-face cascade bundled with opencv-python
+HAAR_CASCADE_PATH = os.environ.get("HAAR_CASCADE_PATH", "")
+# Longest side of the image the Haar pre-filter looks at
+HAAR_PREFILTER_DIMENSION = int(os.environ.get("HAAR_PREFILTER_DIMENSION", "480"))
+# No-face pre-check before single-pass detection: longest side of the cheap pass
+# (0 disables it) and how far below the detection confidence threshold a
+# candidate still counts as a possible face (larger = safer, fewer skips).
+# Off by default: a skipped photo is published without anonymization, so only
+# enable it once benchmark_detection shows no missed faces for the SSD
+NO_FACE_PRECHECK_DIMENSION = int(os.environ.get("NO_FACE_PRECHECK_DIMENSION", "0"))
+NO_FACE_PRECHECK_MARGIN = float(os.environ.get("NO_FACE_PRECHECK_MARGIN", "0.35"))
+
+# Standalone backends; "haar+<backend>" gates any of them behind the Haar pre-filter
+DETECTOR_BACKENDS = ("ssd", "yunet", "onnx", "haar")
+PREFILTER_PREFIX = "haar+"
+
+Detections = Tuple[np.ndarray, np.ndarray]
+
+# Per-channel (BGR) mean the res10 SSD was trained with, shaped for NCHW blobs
+SSD_MEAN = np.array([104.0, 177.0, 123.0], dtype=np.float32).reshape(1, 3, 1, 1)
+
+
+def non_max_suppression(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    iou_threshold: float = 0.3
+) -> np.ndarray:
+    """
+    Greedy non-maximum suppression, vectorized over the remaining boxes.
+
+    Args:
+        boxes: (N, 4) array of x1, y1, x2, y2
+        scores: (N,) array of confidences
+        iou_threshold: Boxes overlapping a kept box above this IoU are dropped
+
+    Returns:
+        Indices of the kept boxes, highest score first
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=int)
+
+    boxes = boxes.astype(np.float64)
+    areas = np.maximum(0, boxes[:, 2] - boxes[:, 0]) * np.maximum(0, boxes[:, 3] - boxes[:, 1])
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+
+    while order.size > 0:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+
+        ix1 = np.maximum(boxes[best, 0], boxes[rest, 0])
+        iy1 = np.maximum(boxes[best, 1], boxes[rest, 1])
+        ix2 = np.minimum(boxes[best, 2], boxes[rest, 2])
+        iy2 = np.minimum(boxes[best, 3], boxes[rest, 3])
+        intersection = np.maximum(0, ix2 - ix1) * np.maximum(0, iy2 - iy1)
+        union = areas[best] + areas[rest] - intersection
+        iou = intersection / np.maximum(union, 1e-9)
+
+        order = rest[iou <= iou_threshold]
+
+    return np.array(keep, dtype=int)
+
+
+def downscale(image: np.ndarray, max_dimension: int, buffer: Optional[str] = None) -> Tuple[np.ndarray, float]:
+    """
+    Shrink an image so its longest side is at most max_dimension.
+
+    Args:
+        image: Input image
+        max_dimension: Longest side of the result
+        buffer: Name of a BufferPool scratch buffer to resize into instead of
+            allocating; the result is then only valid until this thread
+            reuses that buffer
+
+    Returns:
+        Tuple of (downscaled image or the input itself, scale factor <= 1)
+    """
+    height, width = image.shape[:2]
+    scale = min(1.0, max_dimension / float(max(height, width)))
+    if scale < 1.0:
+        size = (int(width * scale), int(height * scale))
+        if buffer is None:
+            return cv2.resize(image, size), scale
+        dst = get_buffer_pool().get(buffer, (size[1], size[0]) + image.shape[2:], image.dtype)
+        return cv2.resize(image, size, dst=dst), scale
+    return image, scale
+
+
+def _empty_detections() -> Detections:
+    return np.empty((0, 4), dtype=int), np.empty(0, dtype=np.float32)
+
+
+class FaceDetector:
+    """
+    Interface of a face detection backend.
+
+    Backends return boxes in the pixel coordinates of the image they were
+    given, so FaceProcessor can swap them without touching anonymization.
+    """
+
+    name = "base"
+    # Fixed network input (width, height) every image is resized to; None when
+    # the backend detects at the requested max_dimension
+    input_size: Optional[Tuple[int, int]] = None
+
+    @property
+    def available(self) -> bool:
+        """Whether the model loaded and the backend can detect faces."""
+        return True
+
+    def detect(self, image: np.ndarray, max_dimension: int = 800) -> Detections:
+        """
+        Detect faces in one image.
+
+        Args:
+            image: Input image as numpy array (BGR format)
+            max_dimension: Maximum dimension for downscaling during detection
+
+        Returns:
+            Tuple of (boxes as (N, 4) int array of x1, y1, x2, y2, confidences as (N,) array)
+        """
+        raise NotImplementedError
+
+    def detect_batch(self, images: List[np.ndarray], max_dimension: int = 800) -> List[Detections]:
+        """Detect faces in several images (one call per image unless overridden)."""
+        return [self.detect(image, max_dimension) for image in images]
+
+    def detect_candidates(self, image: np.ndarray, max_dimension: int, min_confidence: float) -> Detections:
+        """
+        Detect faces down to a lower confidence than the backend's threshold,
+        so callers can re-examine uncertain candidates at a higher resolution.
+        Backends without calibrated scores return detect()'s results.
+
+        Args:
+            image: Input image as numpy array (BGR format)
+            max_dimension: Maximum dimension for downscaling during detection
+            min_confidence: Lowest confidence returned
+
+        Returns:
+            Tuple of (boxes as (N, 4) int array of x1, y1, x2, y2, confidences as (N,) array)
+        """
+        return self.detect(image, max_dimension)
+
+    def detect_windows(self, windows: List[np.ndarray], batch_size: int = 16) -> np.ndarray:
+        """
+        Detect faces in image windows (tiles) at their native resolution.
+
+        Args:
+            windows: Window images as numpy arrays (BGR format)
+            batch_size: Windows per forward pass for backends that batch
+
+        Returns:
+            (N, 6) array of window index, confidence and x1, y1, x2, y2
+            normalized to the window size
+        """
+        rows = []
+        for index, window in enumerate(windows):
+            height, width = window.shape[:2]
+            boxes, scores = self.detect(window, max(height, width))
+            if len(boxes):
+                normalized = boxes / np.array([width, height, width, height], dtype=np.float64)
+                rows.append(np.column_stack([np.full(len(boxes), index), scores, normalized]))
+        return np.concatenate(rows) if rows else np.empty((0, 6))
+
+
+class CaffeSSDDetector(FaceDetector):
+    """The res10 300x300 SSD Caffe model run through cv2.dnn."""
+
+    name = "ssd"
+    input_size = (300, 300)
+
+    def __init__(self, proto_path: str, weights_path: str, confidence_threshold: float = 0.5):
+        self.confidence_threshold = confidence_threshold
+        # cv2.dnn.Net is not thread-safe; serialize forward passes across executor threads
+        self._lock = threading.Lock()
+        try:
+            self.net = cv2.dnn.readNetFromCaffe(proto_path, weights_path)
+        except Exception as e:
+            print(f"Warning: Could not load face detection model: {e}")
+            self.net = None
+
+    @property
+    def available(self) -> bool:
+        return self.net is not None
+
+    def _forward(self, blob: np.ndarray) -> np.ndarray:
+        """Run the network on a blob and return the (N, 7) detection rows."""
+        with self._lock:
+            self.net.setInput(blob)
+            return self.net.forward()[0, 0]
+
+    @staticmethod
+    def _blob(images: List[np.ndarray], size: Tuple[int, int] = (300, 300)) -> np.ndarray:
+        """
+        Same blob as cv2.dnn.blobFromImages(images, 1.0, size, SSD_MEAN),
+        built in reusable per-thread buffers instead of fresh allocations.
+        """
+        width, height = size
+        pool = get_buffer_pool()
+        resized = pool.get("ssd_resized", (len(images), height, width, 3))
+        for index, image in enumerate(images):
+            cv2.resize(image, size, dst=resized[index])
+        blob = pool.get("ssd_blob", (len(images), 3, height, width), np.float32)
+        np.subtract(resized.transpose(0, 3, 1, 2), SSD_MEAN, out=blob)
+        return blob
+
+    def _boxes(
+        self,
+        rows: np.ndarray,
+        small_width: int,
+        small_height: int,
+        scale: float,
+        min_confidence: Optional[float] = None
+    ) -> Detections:
+        """Convert the detection rows of one image into pixel boxes."""
+        rows = rows[rows[:, 2] > (self.confidence_threshold if min_confidence is None else min_confidence)]
+        boxes = (rows[:, 3:7] * np.array([
+            small_width, small_height, small_width, small_height
+        ])).astype(int)
+
+        # Scale back to original size if needed
+        if scale < 1.0:
+            boxes = (boxes / scale).astype(int)
+
+        return boxes, rows[:, 2]
+
+    def detect(self, image: np.ndarray, max_dimension: int = 800) -> Detections:
+        return self.detect_batch([image], max_dimension)[0]
+
+    def detect_candidates(self, image: np.ndarray, max_dimension: int, min_confidence: float) -> Detections:
+        if self.net is None:
+            return _empty_detections()
+
+        small, scale = downscale(image, max_dimension, "ssd_input0")
+        # The network is fully convolutional: below its 300x300 input a cheap
+        # pass runs at the image's own (smaller) size instead of upscaling it
+        height, width = small.shape[:2]
+        size = self.input_size if max(height, width) >= max(self.input_size) else (width, height)
+        rows = self._forward(self._blob([small], size))
+        return self._boxes(rows, width, height, scale, min_confidence)
+
+    def detect_batch(self, images: List[np.ndarray], max_dimension: int = 800) -> List[Detections]:
+        if self.net is None or not images:
+            return [_empty_detections() for _ in images]
+
+        inputs = [downscale(image, max_dimension, f"ssd_input{index}") for index, image in enumerate(images)]
+
+        # Column 0 of each detection row is the index of the image in the batch
+        rows = self._forward(self._blob([small for small, _ in inputs]))
+        image_ids = rows[:, 0].astype(int)
+
+        return [
+            self._boxes(rows[image_ids == index], small.shape[1], small.shape[0], scale)
+            for index, (small, scale) in enumerate(inputs)
+        ]
+
+    def detect_windows(self, windows: List[np.ndarray], batch_size: int = 16) -> np.ndarray:
+        if self.net is None or not windows:
+            return np.empty((0, 6))
+
+        all_rows = []
+        for start in range(0, len(windows), max(1, batch_size)):
+            rows = self._forward(self._blob(windows[start:start + batch_size]))
+            rows = rows[rows[:, 2] > self.confidence_threshold]
+            # Column 0 is the index inside this forward pass; make it global
+            rows[:, 0] += start
+            all_rows.append(rows[:, [0, 2, 3, 4, 5, 6]])
+
+        return np.concatenate(all_rows)
+
+
+class YuNetDetector(FaceDetector):
+    """OpenCV's YuNet face detector (cv2.FaceDetectorYN, ONNX)."""
+
+    name = "yunet"
+
+    def __init__(
+        self,
+        model_path: str = YUNET_MODEL_PATH,
+        confidence_threshold: float = 0.5,
+        nms_threshold: float = 0.3
+    ):
+        self.confidence_threshold = confidence_threshold
+        # setInputSize and detect share state inside the detector object
+        self._lock = threading.Lock()
+        try:
+            self.detector = cv2.FaceDetectorYN.create(
+                model_path, "", (320, 320), confidence_threshold, nms_threshold
+            )
+        except Exception as e:
+            print(f"Warning: Could not load YuNet face detection model: {e}")
+            self.detector = None
+
+    @property
+    def available(self) -> bool:
+        return self.detector is not None
+
+    def detect(self, image: np.ndarray, max_dimension: int = 800) -> Detections:
+        return self.detect_candidates(image, max_dimension, self.confidence_threshold)
+
+    def detect_candidates(self, image: np.ndarray, max_dimension: int, min_confidence: float) -> Detections:
+        if self.detector is None:
+            return _empty_detections()
+
+        small, scale = downscale(image, max_dimension, "yunet_input")
+        with self._lock:
+            self.detector.setScoreThreshold(min_confidence)
+            self.detector.setInputSize((small.shape[1], small.shape[0]))
+            _, faces = self.detector.detect(small)
+
+        if faces is None or len(faces) == 0:
+            return _empty_detections()
+
+        # Rows are x, y, w, h, five landmarks, score
+        x, y, w, h = faces[:, 0], faces[:, 1], faces[:, 2], faces[:, 3]
+        boxes = np.stack([x, y, x + w, y + h], axis=1) / scale
+        height, width = image.shape[:2]
+        boxes = np.clip(boxes, 0, [width, height, width, height]).astype(int)
+        return boxes, faces[:, 14]
+
+
+class OnnxUltraFaceDetector(FaceDetector):
+    """
+    Ultra-Light-Fast-Generic-Face-Detector (RFB-320) ONNX export, e.g. the
+    int8-quantized model, run through cv2.dnn.
+    """
+
+    name = "onnx"
+    input_size = (320, 240)
+
+    def __init__(
+        self,
+        model_path: str = ONNX_FACE_MODEL_PATH,
+        confidence_threshold: float = 0.5,
+        nms_threshold: float = 0.3
+    ):
+        self.confidence_threshold = confidence_threshold
+        self.nms_threshold = nms_threshold
+        self._lock = threading.Lock()
+        try:
+            self.net = cv2.dnn.readNetFromONNX(model_path)
+            self._output_names = self.net.getUnconnectedOutLayersNames()
+        except Exception as e:
+            print(f"Warning: Could not load ONNX face detection model: {e}")
+            self.net = None
+
+    @property
+    def available(self) -> bool:
+        return self.net is not None
+
+    def detect(self, image: np.ndarray, max_dimension: int = 800) -> Detections:
+        return self.detect_candidates(image, max_dimension, self.confidence_threshold)
+
+    def detect_candidates(self, image: np.ndarray, max_dimension: int, min_confidence: float) -> Detections:
+        if self.net is None:
+            return _empty_detections()
+
+        # The network has a fixed input, so max_dimension only bounds the resize source
+        small, _ = downscale(image, max_dimension, "onnx_input")
+        blob = cv2.dnn.blobFromImage(small, 1.0 / 128, self.input_size, (127, 127, 127), swapRB=True)
+        with self._lock:
+            self.net.setInput(blob)
+            outputs = self.net.forward(self._output_names)
+
+        # Outputs are class scores (1, N, 2) and normalized corner boxes (1, N, 4)
+        scores = next(o for o in outputs if o.shape[-1] == 2)[0, :, 1]
+        boxes = next(o for o in outputs if o.shape[-1] == 4)[0]
+        mask = scores > min_confidence
+        scores, boxes = scores[mask], boxes[mask]
+
+        height, width = image.shape[:2]
+        boxes = np.clip(boxes * np.array([width, height, width, height]), 0, [width, height, width, height])
+        keep = non_max_suppression(boxes, scores, self.nms_threshold)
+        return boxes[keep].astype(int), scores[keep]
+
+
+class HaarCascadeDetector(FaceDetector):
+    """Viola-Jones Haar cascade; cheap, but frontal faces only."""
+
+    name = "haar"
+
+    def __init__(self, cascade_path: str = HAAR_CASCADE_PATH, min_neighbors: int = 4, min_size: int = 16):
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        # CascadeClassifier keeps per-call scratch buffers
+        self._lock = threading.Lock()
+        path = cascade_path or os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+        self.cascade = cv2.CascadeClassifier(path)
+        if self.cascade.empty():
+            print(f"Warning: Could not load Haar cascade: {path}")
+            self.cascade = None
+
+    @property
+    def available(self) -> bool:
+        return self.cascade is not None
+
+    def detect(self, image: np.ndarray, max_dimension: int = 800) -> Detections:
+        if self.cascade is None:
+            return _empty_detections()
+
+        small, scale = downscale(image, max_dimension, "haar_input")
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        with self._lock:
+            rects = self.cascade.detectMultiScale(
+                gray, scaleFactor=1.1, minNeighbors=self.min_neighbors,
+                minSize=(self.min_size, self.min_size)
+            )
+
+        if len(rects) == 0:
+            return _empty_detections()
+
+        rects = np.asarray(rects, dtype=np.float64)
+        boxes = np.column_stack([rects[:, :2], rects[:, :2] + rects[:, 2:]]) / scale
+        # The cascade has no calibrated confidence
+        return boxes.astype(int), np.ones(len(boxes), dtype=np.float32)
+
+
+class PrefilteredDetector(FaceDetector):
+    """
+    Runs a cheap pre-filter first and only calls the main detector when the
+    pre-filter finds a face candidate, so face-free photos skip the DNN.
+    """
+
+    def __init__(self, prefilter: FaceDetector, detector: FaceDetector, prefilter_dimension: int = HAAR_PREFILTER_DIMENSION):
+        self.prefilter = prefilter
+        self.detector = detector
+        self.prefilter_dimension = prefilter_dimension
+        self.name = f"{prefilter.name}+{detector.name}"
+        self.input_size = detector.input_size
+
+    @property
+    def available(self) -> bool:
+        return self.prefilter.available and self.detector.available
+
+    def detect(self, image: np.ndarray, max_dimension: int = 800) -> Detections:
+        candidates, _ = self.prefilter.detect(image, min(max_dimension, self.prefilter_dimension))
+        if len(candidates) == 0:
+            return _empty_detections()
+        return self.detector.detect(image, max_dimension)
+
+    def detect_candidates(self, image: np.ndarray, max_dimension: int, min_confidence: float) -> Detections:
+        candidates, _ = self.prefilter.detect(image, min(max_dimension, self.prefilter_dimension))
+        if len(candidates) == 0:
+            return _empty_detections()
+        return self.detector.detect_candidates(image, max_dimension, min_confidence)
+
+
+def haar_prefilter(detector: FaceDetector) -> PrefilteredDetector:
+    """Gate a detector behind the Haar cascade pre-filter."""
+    # A low neighbour count keeps the pre-filter on the side of recall
+    return PrefilteredDetector(HaarCascadeDetector(min_neighbors=2), detector)
+
+
+def is_detector_backend(name: str) -> bool:
+    """Whether create_detector accepts this backend name."""
+    if name.startswith(PREFILTER_PREFIX):
+        name = name[len(PREFILTER_PREFIX):]
+    return name in DETECTOR_BACKENDS
+
+
+def create_detector(
+    name: str = FACE_DETECTOR_BACKEND,
+    confidence_threshold: float = 0.5,
+    model_proto_path: str = "/models/deploy.prototxt",
+    model_weights_path: str = "/models/res10_300x300_ssd_iter_140000.caffemodel"
+) -> FaceDetector:
+    """
+    Create a face detection backend by name.
+
+    Args:
+        name: "ssd", "yunet", "onnx", "haar", or "haar+<backend>" for a backend
+            gated by the Haar pre-filter
+        confidence_threshold: Minimum confidence for face detection (0.0-1.0)
+        model_proto_path: Caffe prototxt for the SSD backend
+        model_weights_path: Caffe weights for the SSD backend
+
+    Returns:
+        FaceDetector instance
+    """
+    if not is_detector_backend(name):
+        raise ValueError(
+            f"Unknown face detector backend '{name}' "
+            f"(expected one of {', '.join(DETECTOR_BACKENDS)}, optionally prefixed with '{PREFILTER_PREFIX}')"
+        )
+
+    if name.startswith(PREFILTER_PREFIX):
+        return haar_prefilter(
+            create_detector(name[len(PREFILTER_PREFIX):], confidence_threshold, model_proto_path, model_weights_path)
+        )
+
+    if name == "ssd":
+        return CaffeSSDDetector(model_proto_path, model_weights_path, confidence_threshold)
+    if name == "yunet":
+        return YuNetDetector(confidence_threshold=confidence_threshold)
+    if name == "onnx":
+        return OnnxUltraFaceDetector(confidence_threshold=confidence_threshold)
+    return HaarCascadeDetector()
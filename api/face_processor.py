@@ -1,22 +1,59 @@
 import cv2
+import importlib.util
 import numpy as np
-from typing import Tuple, Optional
-import tempfile
-import os
+from contextlib import contextmanager
+from typing import Any, Callable, Tuple, Optional
+import threading
+import time
 
-# Try to import pixelateme, fall back to manual implementation if not available
-try:
-    from pixelateme.main import run as pixelateme_run
-    PIXELATEME_AVAILABLE = True
-except ImportError:
-    PIXELATEME_AVAILABLE = False
-    print("Warning: pixelateme not available, using fallback OpenCV implementation")
+import image_ingest
+from buffer_pool import get_buffer_pool
+from face_detectors import (
+    FACE_DETECTOR_BACKEND,
+    NO_FACE_PRECHECK_DIMENSION,
+    NO_FACE_PRECHECK_MARGIN,
+    PREFILTER_PREFIX,
+    FaceDetector,
+    create_detector,
+    downscale,
+    haar_prefilter,
+    non_max_suppression
+)
+
+# pixelateme is no longer called (its features are implemented in memory below);
+# its presence only decides the default of the use_pixelateme compatibility flag
+PIXELATEME_AVAILABLE = importlib.util.find_spec("pixelateme") is not None
+
+# Fill colour (BGR) for "color" mode
+FILL_COLOR = (0, 0, 0)
+
+
+@contextmanager
+def _timed(timings: Optional[dict], stage: str):
+    """Add the duration of a block to timings[stage] (no-op when timings is None)."""
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+def detection_record(boxes: np.ndarray, scores: np.ndarray) -> dict:
+    """JSON-serializable face boxes and confidences, as stored for re-rendering."""
+    return {
+        "boxes": [[int(v) for v in box] for box in np.asarray(boxes).reshape(-1, 4).tolist()],
+        "scores": [round(float(score), 4) for score in np.asarray(scores).reshape(-1).tolist()]
+    }
 
 
 class FaceProcessor:
     """
     Handles face detection and anonymization in images.
-    Supports both pixelateme library and fallback OpenCV implementation.
+    Anonymization runs in memory on numpy arrays and covers pixelateme's
+    features (pixelate, blur and colour fill with an optional feathered soft mask).
     """
     
     def __init__(
@@ -24,7 +61,23 @@ class FaceProcessor:
         model_proto_path: str = "/models/deploy.prototxt",
         model_weights_path: str = "/models/res10_300x300_ssd_iter_140000.caffemodel",
         confidence_threshold: float = 0.5,
-        use_pixelateme: bool = True
+        use_pixelateme: bool = True,
+        soft_mask: Optional[bool] = None,
+        soft_mask_strength: int = 7,
+        detector_backend: str = FACE_DETECTOR_BACKEND,
+        tile_size: int = 600,
+        tile_overlap: float = 0.25,
+        tile_scales: Tuple[float, ...] = (1.0, 0.5),
+        tile_max_dimension: int = 3000,
+        tile_batch_size: int = 16,
+        nms_threshold: float = 0.3,
+        adaptive_coarse_dimension: int = 320,
+        adaptive_candidate_threshold: float = 0.2,
+        adaptive_large_face: float = 0.15,
+        precheck_dimension: int = NO_FACE_PRECHECK_DIMENSION,
+        precheck_margin: float = NO_FACE_PRECHECK_MARGIN,
+        anonymize_in_place: bool = True,
+        max_frame_dimension: Optional[int] = image_ingest.IMAGE_MAX_DIMENSION
     ):
         """
         Initialize the face processor.
@@ -33,88 +86,435 @@ class FaceProcessor:
             model_proto_path: Path to Caffe prototxt file for face detection
             model_weights_path: Path to Caffe model weights
             confidence_threshold: Minimum confidence for face detection (0.0-1.0)
-            use_pixelateme: Whether to use pixelateme library (if available)
+            use_pixelateme: Compatibility flag; when pixelateme is installed it turns
+                on pixelateme's soft mask by default (see soft_mask)
+            soft_mask: Feather the edges of anonymized regions by default
+                (None follows use_pixelateme)
+            soft_mask_strength: Default feather width in percent of the face box size
+            detector_backend: Default face detector backend (see face_detectors.create_detector)
+            tile_size: Tile edge length in pixels for tiled detection
+            tile_overlap: Fraction of overlap between neighbouring tiles
+            tile_scales: Pyramid scales (relative to tile_max_dimension) that are tiled
+            tile_max_dimension: Longest side of the finest pyramid level
+            tile_batch_size: Number of tiles per DNN forward pass
+            nms_threshold: IoU above which overlapping detections are merged
+            adaptive_coarse_dimension: Detection size of the cheap first pass of adaptive detection
+            adaptive_candidate_threshold: Lowest first-pass confidence that is re-examined
+                at full resolution by adaptive detection
+            adaptive_large_face: Face size (fraction of the longest image side) from which
+                adaptive detection treats a photo as a close-up and skips the fine pass
+            precheck_dimension: Longest side of the no-face pre-check that lets
+                process_image skip detection on photos without people (0, the
+                default, disables it)
+            precheck_margin: How far below confidence_threshold a pre-check
+                candidate still counts as a possible face
+            anonymize_in_place: Let the pipeline methods (process_image,
+                rerender_image, process_images_batch) anonymize the frame they
+                decoded in place instead of copying it first
+            max_frame_dimension: Longest side of decoded frames; larger sources are
+                decoded at reduced resolution and downscaled (None keeps the full size)
         """
         self.confidence_threshold = confidence_threshold
+        self.model_proto_path = model_proto_path
+        self.model_weights_path = model_weights_path
+        self.detector_backend = detector_backend
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.tile_scales = tile_scales
+        self.tile_max_dimension = tile_max_dimension
+        self.tile_batch_size = tile_batch_size
+        self.nms_threshold = nms_threshold
+        self.adaptive_coarse_dimension = adaptive_coarse_dimension
+        self.adaptive_candidate_threshold = adaptive_candidate_threshold
+        self.adaptive_large_face = adaptive_large_face
+        self.precheck_dimension = precheck_dimension
+        self.precheck_margin = precheck_margin
         self.use_pixelateme = use_pixelateme and PIXELATEME_AVAILABLE
+        self.soft_mask = self.use_pixelateme if soft_mask is None else soft_mask
+        self.soft_mask_strength = soft_mask_strength
+        self.anonymize_in_place = anonymize_in_place
+        self.max_frame_dimension = max_frame_dimension
         
-        # Initialize OpenCV DNN face detector (fallback or for manual detection)
-        if not self.use_pixelateme or model_proto_path and model_weights_path:
-            try:
-                self.net = cv2.dnn.readNetFromCaffe(model_proto_path, model_weights_path)
-            except Exception as e:
-                print(f"Warning: Could not load face detection model: {e}")
-                self.net = None
+        # Detector backends by name; the deployment default loads now, others on first request
+        self._detectors: dict[str, FaceDetector] = {}
+        self._detectors_lock = threading.Lock()
+        self.detector = self.get_detector()
+    
+    def get_detector(self, name: Optional[str] = None) -> FaceDetector:
+        """
+        Get (or lazily load) a face detection backend.
+        
+        Args:
+            name: Backend name (see face_detectors.create_detector); None for
+                the deployment default
+            
+        Returns:
+            FaceDetector instance
+        """
+        name = name or self.detector_backend
+        detector = self._detectors.get(name)
+        if detector is None:
+            with self._detectors_lock:
+                detector = self._detectors.get(name)
+                if detector is None and name.startswith(PREFILTER_PREFIX):
+                    # Share the already loaded backend instead of loading its model twice
+                    inner = name[len(PREFILTER_PREFIX):]
+                    inner_detector = self._detectors.get(inner)
+                    if inner_detector is not None:
+                        detector = haar_prefilter(inner_detector)
+                        self._detectors[name] = detector
+                if detector is None:
+                    detector = create_detector(
+                        name,
+                        confidence_threshold=self.confidence_threshold,
+                        model_proto_path=self.model_proto_path,
+                        model_weights_path=self.model_weights_path
+                    )
+                    self._detectors[name] = detector
+        
+        # Never silently skip anonymization because a requested model is missing
+        if name != self.detector_backend and not detector.available:
+            raise RuntimeError(f"Face detector backend '{name}' is not available")
+        
+        return detector
+    
+    def warm_up(self, max_dimension: int = 800) -> bool:
+        """
+        Run one forward pass of the default detector on a blank frame, so the
+        first request does not pay OpenCV DNN's first-inference setup
+        (layer allocation and backend initialization).
+        
+        Args:
+            max_dimension: Longest side of the warm-up frame (the usual detection size)
+            
+        Returns:
+            True when the detector is available and warmed up
+        """
+        if not self.detector.available:
+            return False
+        
+        blank = np.zeros((max_dimension * 3 // 4, max_dimension, 3), dtype=np.uint8)
+        self.detector.detect(blank, max_dimension)
+        return True
+    
+    def likely_face_free(
+        self,
+        image: np.ndarray,
+        max_dimension: int = 800,
+        detector: Optional[str] = None
+    ) -> bool:
+        """
+        Cheap no-face pre-check: one detector pass at precheck_dimension that
+        accepts candidates down to precheck_margin below the confidence
+        threshold. Only when even that finds nothing is the image treated as
+        face-free, so doubtful photos still get the full detection.
+        It only runs for fixed-input networks (the 300x300 SSD); backends that
+        detect at max_dimension resolve faces far smaller than a pre-check would.
+        Off by default (precheck_dimension 0): below its 300x300 input the SSD
+        sees faces smaller than in the full pass and may miss them, and a
+        skipped photo is published without anonymization. Enable it only once
+        benchmark_detection reports no missed faces on representative photos.
+        
+        Args:
+            image: Input image as numpy array (BGR format)
+            max_dimension: Detection size the full pass would use; the pre-check
+                only runs when it is cheaper (precheck_dimension is smaller)
+            detector: Detector backend name (None for the deployment default)
+            
+        Returns:
+            True when the image can skip detection and anonymization
+        """
+        if not self.precheck_dimension or self.precheck_dimension >= max_dimension:
+            return False
+        backend = self.get_detector(detector)
+        if not backend.available or backend.input_size is None:
+            return False
+        if self.precheck_dimension >= max(backend.input_size):
+            return False
+        
+        min_confidence = max(0.0, self.confidence_threshold - self.precheck_margin)
+        boxes, _ = backend.detect_candidates(image, self.precheck_dimension, min_confidence)
+        return len(boxes) == 0
     
     def detect_faces(
         self,
         image: np.ndarray,
-        max_dimension: int = 800
+        max_dimension: int = 800,
+        detector: Optional[str] = None
     ) -> list[Tuple[int, int, int, int]]:
         """
-        Detect faces in an image using OpenCV DNN.
+        Detect faces in an image.
         
         Args:
             image: Input image as numpy array (BGR format)
             max_dimension: Maximum dimension for downscaling during detection
+            detector: Detector backend name (None for the deployment default)
             
         Returns:
             List of face bounding boxes as (x1, y1, x2, y2) tuples
         """
-        if self.net is None:
-            return []
+        boxes, _ = self.get_detector(detector).detect(image, max_dimension)
+        return [tuple(box) for box in boxes.tolist()]
+    
+    def _tile_windows(
+        self,
+        image: np.ndarray,
+        max_dimension: Optional[int] = None,
+        tile_size: Optional[int] = None,
+        scales: Optional[Tuple[float, ...]] = None
+    ) -> list[Tuple[np.ndarray, float, int, int, int, int]]:
+        """
+        Cut an image pyramid into overlapping tiles.
         
+        Args:
+            image: Input image as numpy array (BGR format)
+            max_dimension: Longest side of the finest level (None for tile_max_dimension)
+            tile_size: Tile edge length (None for the processor's tile_size)
+            scales: Pyramid scales relative to max_dimension (None for tile_scales)
+            
+        Returns:
+            List of (tile, inverse_scale, x_offset, y_offset, tile_width, tile_height);
+            offsets and sizes are in pyramid-level pixels
+        """
+        tile_size = tile_size or self.tile_size
         height, width = image.shape[:2]
+        base_scale = min(1.0, (max_dimension or self.tile_max_dimension) / float(max(height, width)))
+        stride = max(1, int(tile_size * (1.0 - self.tile_overlap)))
+        windows = []
         
-        # Downscale for faster detection if needed
-        scale = min(1.0, max_dimension / float(max(height, width)))
-        if scale < 1.0:
-            small_img = cv2.resize(image, (int(width * scale), int(height * scale)))
-        else:
-            small_img = image.copy()
-        
-        # Prepare blob for DNN
-        blob = cv2.dnn.blobFromImage(
-            cv2.resize(small_img, (300, 300)),
-            1.0,
-            (300, 300),
-            (104.0, 177.0, 123.0)
-        )
+        for index, level_scale in enumerate(scales or self.tile_scales):
+            scale = base_scale * level_scale
+            level_width, level_height = max(1, int(width * scale)), max(1, int(height * scale))
+            if scale == 1.0:
+                level = image
+            else:
+                # Tiles are views into the level, so every level needs its own buffer
+                level = get_buffer_pool().get(f"tile_level{index}", (level_height, level_width) + image.shape[2:])
+                cv2.resize(image, (level_width, level_height), dst=level, interpolation=cv2.INTER_AREA)
+            
+            xs = list(range(0, max(level_width - tile_size, 0) + 1, stride))
+            ys = list(range(0, max(level_height - tile_size, 0) + 1, stride))
+            # Make sure the last row/column of tiles reaches the image edge
+            if xs[-1] + tile_size < level_width:
+                xs.append(level_width - tile_size)
+            if ys[-1] + tile_size < level_height:
+                ys.append(level_height - tile_size)
+            
+            for y in ys:
+                for x in xs:
+                    tile = level[y:y + tile_size, x:x + tile_size]
+                    windows.append((tile, 1.0 / scale, x, y, tile.shape[1], tile.shape[0]))
         
-        # Detect faces
-        self.net.setInput(blob)
-        detections = self.net.forward()
-        
-        # Parse detections
-        face_boxes = []
-        small_height, small_width = small_img.shape[:2]
-        
-        for i in range(detections.shape[2]):
-            confidence = detections[0, 0, i, 2]
-            
-            if confidence > self.confidence_threshold:
-                # Get bounding box coordinates
-                box = detections[0, 0, i, 3:7] * np.array([
-                    small_width, small_height, small_width, small_height
-                ])
-                (x1, y1, x2, y2) = box.astype("int")
-                
-                # Scale back to original size if needed
-                if scale < 1.0:
-                    x1 = int(x1 / scale)
-                    y1 = int(y1 / scale)
-                    x2 = int(x2 / scale)
-                    y2 = int(y2 / scale)
-                
-                face_boxes.append((x1, y1, x2, y2))
-        
-        return face_boxes
+        return windows
+    
+    def detect_faces_tiled(
+        self,
+        image: np.ndarray,
+        max_dimension: int = 800,
+        detector: Optional[str] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Detect faces with overlapping tiles over an image pyramid.
+        Small faces that vanish in a single 300x300 blob stay large enough to
+        detect inside a tile. A whole-image pass at max_dimension catches faces
+        larger than a tile. Backends that batch (the SSD) run the tiles in
+        batches so each forward pass runs across all cores, and the merged
+        boxes go through non-maximum suppression.
+        
+        Args:
+            image: Input image as numpy array (BGR format)
+            max_dimension: Maximum dimension for the whole-image pass
+            detector: Detector backend name (None for the deployment default)
+            
+        Returns:
+            Tuple of (boxes as (N, 4) int array of x1, y1, x2, y2, confidences as (N,) array)
+        """
+        backend = self.get_detector(detector)
+        if not backend.available:
+            return np.empty((0, 4), dtype=int), np.empty(0, dtype=np.float32)
+        
+        height, width = image.shape[:2]
+        small, scale = downscale(image, max_dimension, "tiled_input")
+        windows = [(small, 1.0 / scale, 0, 0, small.shape[1], small.shape[0])]
+        windows += self._tile_windows(image)
+        
+        boxes, scores = self._detect_in_windows(backend, windows, width, height)
+        keep = non_max_suppression(boxes, scores, self.nms_threshold)
+        return boxes[keep], scores[keep]
+    
+    def _detect_in_windows(
+        self,
+        backend: FaceDetector,
+        windows: list[Tuple[np.ndarray, float, int, int, int, int]],
+        width: int,
+        height: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Run a backend over windows (see _tile_windows for the tuple layout) and
+        map the detections back to pixels of the width x height source image.
+        """
+        # Per-window geometry: x offset, y offset, width, height, inverse scale
+        geometry = np.array([(x, y, w, h, inv) for _, inv, x, y, w, h in windows], dtype=np.float64)
+        # Rows are window index, confidence, normalized x1, y1, x2, y2
+        rows = backend.detect_windows([tile for tile, _, _, _, _, _ in windows], self.tile_batch_size)
+        window = geometry[rows[:, 0].astype(int)]
+        
+        # Map normalized window coordinates back to original image pixels
+        x1 = (window[:, 0] + rows[:, 2] * window[:, 2]) * window[:, 4]
+        y1 = (window[:, 1] + rows[:, 3] * window[:, 3]) * window[:, 4]
+        x2 = (window[:, 0] + rows[:, 4] * window[:, 2]) * window[:, 4]
+        y2 = (window[:, 1] + rows[:, 5] * window[:, 3]) * window[:, 4]
+        boxes = np.stack([x1, y1, x2, y2], axis=1)
+        boxes = np.clip(boxes, 0, [width, height, width, height]).astype(int)
+        return boxes, rows[:, 1]
+    
+    def detect_faces_adaptive(
+        self,
+        image: np.ndarray,
+        max_dimension: int = 800,
+        detector: Optional[str] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Detect faces coarse-to-fine instead of at one fixed resolution.
+        A cheap pass at adaptive_coarse_dimension finds large faces and
+        low-confidence candidates. Candidates are re-examined in crops at full
+        resolution, and the whole image is only searched again at max_dimension
+        when small faces are likely: nothing certain was found, or some face
+        found is small. Close-up portraits therefore cost one cheap pass.
+        
+        Args:
+            image: Input image as numpy array (BGR format)
+            max_dimension: Detection size of the fine pass
+            detector: Detector backend name (None for the deployment default)
+            
+        Returns:
+            Tuple of (boxes as (N, 4) int array of x1, y1, x2, y2, confidences as (N,) array)
+        """
+        backend = self.get_detector(detector)
+        if not backend.available:
+            return np.empty((0, 4), dtype=int), np.empty(0, dtype=np.float32)
+        
+        height, width = image.shape[:2]
+        coarse_dimension = min(self.adaptive_coarse_dimension, max_dimension)
+        boxes, scores = backend.detect_candidates(image, coarse_dimension, self.adaptive_candidate_threshold)
+        confident = scores > self.confidence_threshold
+        
+        # Uncertain candidates: a crop around each, at full resolution
+        windows = []
+        for x1, y1, x2, y2 in boxes[~confident].tolist():
+            side = min(width, height, 3 * max(x2 - x1, y2 - y1))
+            if side <= 0:
+                continue
+            x = int(min(max(0, (x1 + x2 - side) // 2), width - side))
+            y = int(min(max(0, (y1 + y2 - side) // 2), height - side))
+            windows.append((image[y:y + side, x:x + side], 1.0, x, y, side, side))
+        
+        # Faces smaller than the coarse pass resolves are likely unless every face
+        # found is large (a close-up)
+        sizes = np.minimum(boxes[confident, 2] - boxes[confident, 0], boxes[confident, 3] - boxes[confident, 1])
+        close_up = len(sizes) > 0 and sizes.min() >= self.adaptive_large_face * max(width, height)
+        fine_pass = max_dimension > coarse_dimension and not close_up
+        
+        found_boxes, found_scores = [boxes[confident]], [scores[confident]]
+        if fine_pass and backend.input_size is not None:
+            # A fixed-input network (the 300x300 SSD) would squeeze a max_dimension
+            # image into the same blob again; tiles of its input size at
+            # max_dimension let it actually see that resolution
+            windows += self._tile_windows(image, max_dimension, max(backend.input_size), (1.0,))
+        elif fine_pass:
+            fine_boxes, fine_scores = backend.detect(image, max_dimension)
+            found_boxes.append(fine_boxes)
+            found_scores.append(fine_scores)
+        if windows:
+            window_boxes, window_scores = self._detect_in_windows(backend, windows, width, height)
+            found_boxes.append(window_boxes)
+            found_scores.append(window_scores)
+        
+        boxes = np.concatenate(found_boxes).reshape(-1, 4).astype(int)
+        scores = np.concatenate(found_scores).astype(np.float32)
+        keep = non_max_suppression(boxes, scores, self.nms_threshold)
+        return boxes[keep], scores[keep]
+    
+    def locate_faces(
+        self,
+        image: np.ndarray,
+        max_dimension: int = 800,
+        strategy: str = "single",
+        detector: Optional[str] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Detect faces with the requested detection strategy and backend, keeping confidences.
+        
+        Args:
+            image: Input image as numpy array (BGR format)
+            max_dimension: Maximum dimension for downscaling during detection
+            strategy: "single" (one pass over the downscaled image), "tiled" (multi-scale
+                tiles) or "adaptive" (coarse-to-fine, see detect_faces_adaptive)
+            detector: Detector backend name (None for the deployment default)
+            
+        Returns:
+            Tuple of (boxes as (N, 4) int array of x1, y1, x2, y2, confidences as (N,) array)
+        """
+        if strategy == "tiled":
+            return self.detect_faces_tiled(image, max_dimension, detector)
+        if strategy == "adaptive":
+            return self.detect_faces_adaptive(image, max_dimension, detector)
+        
+        return self.get_detector(detector).detect(image, max_dimension)
+    
+    def find_faces(
+        self,
+        image: np.ndarray,
+        max_dimension: int = 800,
+        strategy: str = "single",
+        detector: Optional[str] = None
+    ) -> list[Tuple[int, int, int, int]]:
+        """
+        Detect faces with the requested detection strategy and backend.
+        
+        Args:
+            image: Input image as numpy array (BGR format)
+            max_dimension: Maximum dimension for downscaling during detection
+            strategy: "single", "tiled" or "adaptive" (see locate_faces)
+            detector: Detector backend name (None for the deployment default)
+            
+        Returns:
+            List of face bounding boxes as (x1, y1, x2, y2) tuples
+        """
+        boxes, _ = self.locate_faces(image, max_dimension, strategy, detector)
+        return [tuple(box) for box in boxes.tolist()]
+    
+    def detect_faces_batch(
+        self,
+        images: list[np.ndarray],
+        max_dimension: int = 800,
+        detector: Optional[str] = None
+    ) -> list[list[Tuple[int, int, int, int]]]:
+        """
+        Detect faces in several images, as a single forward pass for backends that batch.
+        
+        Args:
+            images: Input images as numpy arrays (BGR format)
+            max_dimension: Maximum dimension for downscaling during detection
+            detector: Detector backend name (None for the deployment default)
+            
+        Returns:
+            List with one list of face bounding boxes per input image
+        """
+        if not images:
+            return []
+        
+        return [
+            [tuple(box) for box in boxes.tolist()]
+            for boxes, _ in self.get_detector(detector).detect_batch(images, max_dimension)
+        ]
     
     def pixelate_faces(
         self,
         image: np.ndarray,
         face_boxes: list[Tuple[int, int, int, int]],
-        pixelate_size: int = 15
+        pixelate_size: int = 15,
+        in_place: bool = False
     ) -> np.ndarray:
         """
         Pixelate faces in an image using manual implementation.
@@ -123,11 +523,13 @@ class FaceProcessor:
             image: Input image as numpy array
             face_boxes: List of face bounding boxes
             pixelate_size: Size of pixelation blocks (higher = more pixelated)
+            in_place: Modify image itself instead of a copy
             
         Returns:
             Image with pixelated faces
         """
-        output = image.copy()
+        output = image if in_place else image.copy()
+        pool = get_buffer_pool()
         
         for (x1, y1, x2, y2) in face_boxes:
             # Ensure coordinates are within image bounds
@@ -147,12 +549,10 @@ class FaceProcessor:
             temp_height = max(1, roi_height // pixelate_size)
             temp_width = max(1, roi_width // pixelate_size)
             
-            # Pixelate by downscaling and upscaling
-            temp = cv2.resize(face_roi, (temp_width, temp_height), interpolation=cv2.INTER_LINEAR)
-            pixelated = cv2.resize(temp, (roi_width, roi_height), interpolation=cv2.INTER_NEAREST)
-            
-            # Replace face region with pixelated version
-            output[y1:y2, x1:x2] = pixelated
+            # Pixelate by downscaling and upscaling straight back into the face region
+            temp = pool.get("pixelate_blocks", (temp_height, temp_width) + face_roi.shape[2:])
+            cv2.resize(face_roi, (temp_width, temp_height), dst=temp, interpolation=cv2.INTER_LINEAR)
+            cv2.resize(temp, (roi_width, roi_height), dst=face_roi, interpolation=cv2.INTER_NEAREST)
         
         return output
     
@@ -160,7 +560,8 @@ class FaceProcessor:
         self,
         image: np.ndarray,
         face_boxes: list[Tuple[int, int, int, int]],
-        blur_strength: int = 31
+        blur_strength: int = 31,
+        in_place: bool = False
     ) -> np.ndarray:
         """
         Blur faces in an image using Gaussian blur.
@@ -169,11 +570,12 @@ class FaceProcessor:
             image: Input image as numpy array
             face_boxes: List of face bounding boxes
             blur_strength: Kernel size for Gaussian blur (must be odd)
+            in_place: Modify image itself instead of a copy
             
         Returns:
             Image with blurred faces
         """
-        output = image.copy()
+        output = image if in_place else image.copy()
         
         # Ensure blur strength is odd
         if blur_strength % 2 == 0:
@@ -192,87 +594,93 @@ class FaceProcessor:
             if face_roi.size == 0:
                 continue
             
-            blurred = cv2.GaussianBlur(face_roi, (blur_strength, blur_strength), 0)
-            output[y1:y2, x1:x2] = blurred
+            cv2.GaussianBlur(face_roi, (blur_strength, blur_strength), 0, dst=face_roi)
         
         return output
     
-    def process_image_with_pixelateme(
+    def color_faces(
         self,
-        image_bytes: bytes,
+        image: np.ndarray,
+        face_boxes: list[Tuple[int, int, int, int]],
+        color: Tuple[int, int, int] = FILL_COLOR,
+        in_place: bool = False
+    ) -> np.ndarray:
+        """
+        Cover faces with a solid colour.
+        
+        Args:
+            image: Input image as numpy array
+            face_boxes: List of face bounding boxes
+            color: Fill colour (BGR)
+            in_place: Modify image itself instead of a copy
+            
+        Returns:
+            Image with covered faces
+        """
+        output = image if in_place else image.copy()
+        
+        for (x1, y1, x2, y2) in face_boxes:
+            output[max(0, y1):max(0, y2), max(0, x1):max(0, x2)] = color
+        
+        return output
+    
+    def soft_mask_faces(
+        self,
+        image: np.ndarray,
+        face_boxes: list[Tuple[int, int, int, int]],
         mode: str = "pixelate",
-        pixelate_size: int = 3,
-        blur_strength: int = 3,
-        threshold: float = 0.5,
-        soft_mask: bool = True,
-        soft_mask_strength: int = 7
-    ) -> Tuple[bytes, int]:
+        pixelate_size: int = 15,
+        blur_strength: int = 31,
+        soft_mask_strength: int = 7,
+        in_place: bool = False
+    ) -> np.ndarray:
         """
-        Process image using pixelateme library.
+        Anonymize faces with a feathered soft mask (pixelateme's soft_mask).
+        The face box itself is fully anonymized; a fade of soft_mask_strength
+        percent of the box size blends the effect into its surroundings.
         
         Args:
-            image_bytes: Input image as bytes
-            mode: Anonymization mode ("pixelate", "blur", or "color")
+            image: Input image as numpy array
+            face_boxes: List of face bounding boxes
+            mode: Anonymization mode ("pixelate", "blur" or "color")
             pixelate_size: Pixelation block size
-            blur_strength: Blur kernel strength
-            threshold: Face detection confidence threshold
-            soft_mask: Enable soft mask transition
-            soft_mask_strength: Feather strength for mask edge
+            blur_strength: Blur kernel size
+            soft_mask_strength: Feather width in percent of the face box size
+            in_place: Modify image itself instead of a copy
             
         Returns:
-            Tuple of (processed_image_bytes, faces_detected)
-        """
-        if not PIXELATEME_AVAILABLE:
-            raise RuntimeError("pixelateme library not available")
-        
-        # Create temporary files for input and output
-        with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as input_file:
-            input_path = input_file.name
-            input_file.write(image_bytes)
-        
-        output_dir = tempfile.mkdtemp()
-        
-        try:
-            # Run pixelateme
-            pixelateme_run(
-                path=[input_path],
-                output=output_dir,
-                mode=mode,
-                threshold=threshold,
-                pixelate_size=pixelate_size,
-                blur_strength=blur_strength,
-                soft_mask=soft_mask,
-                soft_mask_strength=soft_mask_strength,
-                preview=False
-            )
-            
-            # Read processed image
-            input_filename = os.path.basename(input_path)
-            output_path = os.path.join(output_dir, input_filename)
-            
-            if not os.path.exists(output_path):
-                # If no output file, no faces were detected
-                return image_bytes, 0
-            
-            with open(output_path, "rb") as f:
-                processed_bytes = f.read()
+            Image with anonymized faces
+        """
+        output = image if in_place else image.copy()
+        height, width = image.shape[:2]
+        
+        for (x1, y1, x2, y2) in face_boxes:
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(width, x2), min(height, y2)
+            if x2 <= x1 or y2 <= y1:
+                continue
             
-            # Try to count faces by detecting them in the original image
-            arr = np.frombuffer(image_bytes, np.uint8)
-            img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-            faces = self.detect_faces(img) if img is not None else []
+            feather = max(1, int(round(min(x2 - x1, y2 - y1) * soft_mask_strength / 100.0)))
+            # Anonymize the box plus room for the fade on every side
+            rx1, ry1 = max(0, x1 - 2 * feather), max(0, y1 - 2 * feather)
+            rx2, ry2 = min(width, x2 + 2 * feather), min(height, y2 + 2 * feather)
+            region = output[ry1:ry2, rx1:rx2]
+            box = [(0, 0, rx2 - rx1, ry2 - ry1)]
+            # A copy: the blend below still needs the original region
+            anonymized = self.anonymize(region, box, mode, pixelate_size, blur_strength, soft_mask=False)
             
-            return processed_bytes, len(faces)
+            # Mask covers the box grown by one feather width, so after the blur
+            # it is still ~1 everywhere inside the face box
+            mask = np.zeros(region.shape[:2], dtype=np.float32)
+            mask[
+                max(0, y1 - feather - ry1):y2 + feather - ry1,
+                max(0, x1 - feather - rx1):x2 + feather - rx1
+            ] = 1.0
+            mask = cv2.GaussianBlur(mask, (0, 0), sigmaX=feather / 3.0)[..., None]
             
-        finally:
-            # Cleanup temporary files
-            try:
-                os.unlink(input_path)
-                if os.path.exists(output_path):
-                    os.unlink(output_path)
-                os.rmdir(output_dir)
-            except Exception as e:
-                print(f"Warning: Could not cleanup temporary files: {e}")
+            region[...] = (anonymized * mask + region * (1.0 - mask) + 0.5).astype(np.uint8)
+        
+        return output
     
     def process_image(
         self,
@@ -280,65 +688,328 @@ class FaceProcessor:
         mode: str = "pixelate",
         pixelate_size: int = 15,
         blur_strength: int = 31,
-        max_dimension: int = 800
-    ) -> Tuple[bytes, int]:
+        max_dimension: int = 800,
+        detection_strategy: str = "single",
+        detector: Optional[str] = None,
+        soft_mask: Optional[bool] = None,
+        soft_mask_strength: Optional[int] = None,
+        timings: Optional[dict] = None,
+        encode: Optional[Callable[[np.ndarray], Any]] = None,
+        detections: Optional[dict] = None
+    ) -> Tuple[Any, int]:
         """
         Process image to anonymize faces.
-        Uses pixelateme library if available and enabled, otherwise falls back to OpenCV.
+        Faces are detected once; the same boxes are anonymized and counted.
         
         Args:
             image_bytes: Input image as bytes
-            mode: Anonymization mode ("pixelate" or "blur")
-            pixelate_size: Pixelation block size (manual mode)
-            blur_strength: Blur kernel size (manual mode)
+            mode: Anonymization mode ("pixelate", "blur" or "color")
+            pixelate_size: Pixelation block size
+            blur_strength: Blur kernel size
+            max_dimension: Maximum dimension for detection downscaling
+            detection_strategy: "single" or "tiled" (see find_faces)
+            detector: Detector backend name (None for the deployment default)
+            soft_mask: Feather the anonymized regions (None for the processor default)
+            soft_mask_strength: Feather width in percent of the face box size
+            timings: Optional dict that receives seconds per stage ("decode",
+                "precheck", "detect", "anonymize", "encode"); "anonymize" is
+                missing when no face was found, "detect" when the no-face
+                pre-check (if enabled) skipped it
+            encode: Called with the anonymized frame instead of encode_image
+                (e.g. derivatives.encode_derivatives for several renditions),
+                and with source_jpeg when no face was found (see encode_unchanged)
+            detections: Optional dict that receives the detected "boxes" and
+                "scores" (see detection_record), for re-rendering with rerender_image
+            
+        Returns:
+            Tuple of (processed_image_bytes or the encode result, faces_detected)
+        """
+        with _timed(timings, "decode"):
+            image = self.decode_image(image_bytes)
+        
+        # Optional low-resolution pre-check (off by default, see likely_face_free)
+        if detection_strategy == "single" and self.precheck_dimension:
+            with _timed(timings, "precheck"):
+                face_free = self.likely_face_free(image, max_dimension, detector)
+            if face_free:
+                if detections is not None:
+                    detections.update(detection_record(np.empty((0, 4)), np.empty(0)))
+                return self.encode_unchanged(image_bytes, image, encode, timings), 0
+        
+        # Detect faces
+        with _timed(timings, "detect"):
+            boxes, scores = self.locate_faces(image, max_dimension, detection_strategy, detector)
+            face_boxes = [tuple(box) for box in boxes.tolist()]
+        if detections is not None:
+            detections.update(detection_record(boxes, scores))
+        
+        # Photos of goods only: nothing to anonymize and, when the source JPEG
+        # matches the frame, no re-encode (metadata is stripped)
+        if not face_boxes:
+            return self.encode_unchanged(image_bytes, image, encode, timings), 0
+        
+        # Process faces
+        with _timed(timings, "anonymize"):
+            processed = self.anonymize(
+                image, face_boxes, mode, pixelate_size, blur_strength, soft_mask, soft_mask_strength,
+                self.anonymize_in_place
+            )
+        
+        with _timed(timings, "encode"):
+            return (encode or self.encode_image)(processed), len(face_boxes)
+    
+    def encode_unchanged(
+        self,
+        image_bytes: bytes,
+        image: np.ndarray,
+        encode: Optional[Callable[..., Any]] = None,
+        timings: Optional[dict] = None
+    ) -> Any:
+        """
+        Encode a frame without faces, reusing the source JPEG (metadata
+        stripped) when it holds exactly this frame.
+        
+        Args:
+            image_bytes: Source image the frame was decoded from
+            image: Decoded frame
+            encode: Called with the frame and source_jpeg instead of encode_image
+            timings: Optional dict that receives the "encode" seconds
+            
+        Returns:
+            JPEG bytes or the encode result
+        """
+        with _timed(timings, "encode"):
+            source_jpeg = image_ingest.passthrough_jpeg(image_bytes, image.shape)
+            return (encode or self.encode_image)(image, source_jpeg=source_jpeg)
+    
+    def rerender_image(
+        self,
+        image_bytes: bytes,
+        face_boxes: list,
+        mode: str = "pixelate",
+        pixelate_size: int = 15,
+        blur_strength: int = 31,
+        soft_mask: Optional[bool] = None,
+        soft_mask_strength: Optional[int] = None,
+        timings: Optional[dict] = None,
+        encode: Optional[Callable[[np.ndarray], Any]] = None
+    ) -> Tuple[Any, int]:
+        """
+        Anonymize an image with face boxes detected earlier (see process_image's
+        detections), so changing the anonymization parameters skips detection.
+        
+        Args:
+            image_bytes: Input image as bytes (the source the boxes were detected in)
+            face_boxes: Face bounding boxes as (x1, y1, x2, y2) in source pixels
+            mode: Anonymization mode ("pixelate", "blur" or "color")
+            pixelate_size: Pixelation block size
+            blur_strength: Blur kernel size
+            soft_mask: Feather the anonymized regions (None for the processor default)
+            soft_mask_strength: Feather width in percent of the face box size
+            timings: Optional dict that receives seconds per stage ("decode", "anonymize", "encode")
+            encode: Called with the anonymized frame instead of encode_image
+            
+        Returns:
+            Tuple of (processed_image_bytes or the encode result, faces_detected)
+        """
+        with _timed(timings, "decode"):
+            image = self.decode_image(image_bytes)
+        
+        face_boxes = [tuple(int(v) for v in box) for box in face_boxes]
+        if not face_boxes:
+            return self.encode_unchanged(image_bytes, image, encode, timings), 0
+        
+        with _timed(timings, "anonymize"):
+            processed = self.anonymize(
+                image, face_boxes, mode, pixelate_size, blur_strength, soft_mask, soft_mask_strength,
+                self.anonymize_in_place
+            )
+        
+        with _timed(timings, "encode"):
+            return (encode or self.encode_image)(processed), len(face_boxes)
+    
+    def process_images_batch(
+        self,
+        images_bytes: list[bytes],
+        mode: str = "pixelate",
+        pixelate_size: int = 15,
+        blur_strength: int = 31,
+        max_dimension: int = 800,
+        detection_strategy: str = "single",
+        detector: Optional[str] = None,
+        soft_mask: Optional[bool] = None,
+        soft_mask_strength: Optional[int] = None,
+        timings: Optional[dict] = None,
+        encode: Optional[Callable[[np.ndarray], Any]] = None,
+        stored_boxes: Optional[list] = None,
+        detections: Optional[list] = None
+    ) -> list:
+        """
+        Process several images, running face detection as one batched forward pass.
+        
+        Args:
+            images_bytes: Input images as bytes
+            mode: Anonymization mode ("pixelate", "blur" or "color")
+            pixelate_size: Pixelation block size
+            blur_strength: Blur kernel size
             max_dimension: Maximum dimension for detection downscaling
+            detection_strategy: "single" batches all images into one forward pass;
+                other strategies (see find_faces) run per image
+            detector: Detector backend name (None for the deployment default)
+            soft_mask: Feather the anonymized regions (None for the processor default)
+            soft_mask_strength: Feather width in percent of the face box size
+            timings: Optional dict that receives seconds per stage, summed over the batch
+            encode: Called with each anonymized frame instead of encode_image
+            stored_boxes: Optional face boxes detected earlier, one entry per input;
+                images with an entry other than None skip detection (see rerender_image)
+            detections: Optional list that receives one detection_record per input
+                (None for images that failed to decode or reused stored boxes)
             
         Returns:
-            Tuple of (processed_image_bytes, faces_detected)
+            List with one entry per input: a (processed_image_bytes or encode result,
+            faces_detected) tuple, or the exception raised while processing that image
         """
-        # Try pixelateme first if enabled
-        if self.use_pixelateme:
+        results: list = [None] * len(images_bytes)
+        stored_boxes = stored_boxes or [None] * len(images_bytes)
+        if detections is not None:
+            detections[:] = [None] * len(images_bytes)
+        decoded = []
+        
+        for index, image_bytes in enumerate(images_bytes):
             try:
-                return self.process_image_with_pixelateme(
-                    image_bytes,
-                    mode=mode,
-                    pixelate_size=max(1, pixelate_size // 5),  # Adjust for pixelateme scale
-                    blur_strength=max(1, blur_strength // 10),  # Adjust for pixelateme scale
-                    soft_mask=True
+                with _timed(timings, "decode"):
+                    decoded.append((index, self.decode_image(image_bytes)))
+            except Exception as e:
+                results[index] = e
+        
+        face_boxes_by_index = {
+            index: [tuple(int(v) for v in box) for box in stored_boxes[index]]
+            for index, _ in decoded if stored_boxes[index] is not None
+        }
+        to_detect = [(index, image) for index, image in decoded if index not in face_boxes_by_index]
+        
+        with _timed(timings, "detect"):
+            if detection_strategy == "single":
+                batch_detections = (
+                    self.get_detector(detector).detect_batch([image for _, image in to_detect], max_dimension)
+                    if to_detect else []
                 )
+            else:
+                batch_detections = [
+                    self.locate_faces(image, max_dimension, detection_strategy, detector) for _, image in to_detect
+                ]
+        
+        for (index, _), (boxes, scores) in zip(to_detect, batch_detections):
+            face_boxes_by_index[index] = [tuple(box) for box in boxes.tolist()]
+            if detections is not None:
+                detections[index] = detection_record(boxes, scores)
+        
+        for index, image in decoded:
+            face_boxes = face_boxes_by_index[index]
+            try:
+                with _timed(timings, "anonymize"):
+                    processed = self.anonymize(
+                        image, face_boxes, mode, pixelate_size, blur_strength, soft_mask, soft_mask_strength,
+                        self.anonymize_in_place
+                    )
+                with _timed(timings, "encode"):
+                    results[index] = ((encode or self.encode_image)(processed), len(face_boxes))
             except Exception as e:
-                print(f"Warning: pixelateme failed, falling back to OpenCV: {e}")
+                results[index] = e
+        
+        return results
+    
+    def decode_image(self, image_bytes: bytes) -> np.ndarray:
+        """
+        Decode image bytes into a BGR numpy array, within the ingestion budgets
+        (see image_ingest.decode): the result is at most max_frame_dimension on
+        its longest side, so face boxes are in these (possibly reduced) pixels.
+        
+        Args:
+            image_bytes: Input image as bytes
+            
+        Returns:
+            Decoded image
+            
+        Raises:
+            image_ingest.ImageRejected: For oversized or unsupported images
+            ValueError: For undecodable data
+        """
+        return image_ingest.decode(image_bytes, self.max_frame_dimension)
+    
+    def anonymize(
+        self,
+        image: np.ndarray,
+        face_boxes: list[Tuple[int, int, int, int]],
+        mode: str = "pixelate",
+        pixelate_size: int = 15,
+        blur_strength: int = 31,
+        soft_mask: Optional[bool] = None,
+        soft_mask_strength: Optional[int] = None,
+        in_place: bool = False
+    ) -> np.ndarray:
+        """
+        Apply the requested anonymization to the detected faces.
+        
+        Args:
+            image: Input image as numpy array
+            face_boxes: List of face bounding boxes
+            mode: Anonymization mode ("pixelate", "blur" or "color")
+            pixelate_size: Pixelation block size
+            blur_strength: Blur kernel size
+            soft_mask: Feather the anonymized regions (None for the processor default)
+            soft_mask_strength: Feather width in percent of the face box size
+                (None for the processor default)
+            in_place: Modify image itself instead of a copy (only safe when the
+                caller owns the frame and no longer needs the original pixels)
+            
+        Returns:
+            Anonymized image (the input itself when there are no faces or in_place is set)
+        """
+        if not face_boxes:
+            return image
         
-        # Fallback to manual OpenCV implementation
-        arr = np.frombuffer(image_bytes, np.uint8)
-        image = cv2.imdecode(arr, cv2.IMREAD_COLOR)
+        if soft_mask if soft_mask is not None else self.soft_mask:
+            return self.soft_mask_faces(
+                image, face_boxes, mode, pixelate_size, blur_strength,
+                soft_mask_strength if soft_mask_strength is not None else self.soft_mask_strength,
+                in_place
+            )
         
-        if image is None:
-            raise ValueError("Invalid image data")
+        if mode == "blur":
+            return self.blur_faces(image, face_boxes, blur_strength, in_place)
         
-        # Detect faces
-        face_boxes = self.detect_faces(image, max_dimension)
+        if mode == "color":
+            return self.color_faces(image, face_boxes, in_place=in_place)
+        
+        # pixelate
+        return self.pixelate_faces(image, face_boxes, pixelate_size, in_place)
+    
+    def encode_image(self, image: np.ndarray, source_jpeg: Optional[bytes] = None) -> bytes:
+        """
+        Encode an image as JPEG.
+        
+        Args:
+            image: Image as numpy array
+            source_jpeg: JPEG bytes of exactly this image, returned as is
+                (see image_ingest.passthrough_jpeg)
+            
+        Returns:
+            JPEG bytes
+        """
+        if source_jpeg is not None:
+            return source_jpeg
         
-        # Process faces
-        if face_boxes:
-            if mode == "blur":
-                processed = self.blur_faces(image, face_boxes, blur_strength)
-            else:  # pixelate
-                processed = self.pixelate_faces(image, face_boxes, pixelate_size)
-        else:
-            processed = image
-        
-        # Encode back to JPEG
         success, encoded = cv2.imencode(
             ".jpg",
-            processed,
+            image,
             [int(cv2.IMWRITE_JPEG_QUALITY), 95]
         )
         
         if not success:
             raise RuntimeError("Failed to encode processed image")
         
-        return encoded.tobytes(), len(face_boxes)
+        return encoded.tobytes()
 
 
 # Singleton instance for reuse
@@ -356,7 +1027,7 @@ def get_face_processor(
     Args:
         model_proto_path: Path to face detection model prototxt
         model_weights_path: Path to face detection model weights
-        use_pixelateme: Whether to use pixelateme library
+        use_pixelateme: Compatibility flag (see FaceProcessor)
         
     Returns:
         FaceProcessor instance
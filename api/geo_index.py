@@ -0,0 +1,154 @@
+import math
+import os
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+
+# Side of a grid cell in degrees (0.25 is ~28 km north-south; Denmark spans ~400 cells)
+GEO_INDEX_CELL_DEGREES = float(os.environ.get("GEO_INDEX_CELL_DEGREES", "0.25"))
+
+EARTH_RADIUS_KM = 6371
+# Half the earth's circumference: no two points are further apart
+_MAX_DISTANCE_KM = math.pi * EARTH_RADIUS_KM
+# Slack (degrees) added to query bounds so rounding never drops a point on the edge
+_PAD_DEGREES = 1e-6
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in kilometers between two points (Haversine formula)"""
+    # Convert decimal degrees to radians
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+
+    # Haversine formula
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
+    c = 2 * math.asin(math.sqrt(a))
+    return c * EARTH_RADIUS_KM
+
+
+class GeoIndex:
+    """
+    Uniform latitude/longitude grid over a fixed list of points.
+
+    Queries visit only the cells overlapping the bounding box of the search
+    circle and compute exact haversine distances for the points in them, so
+    their cost follows the number of nearby points rather than the list
+    size. Points are referred to by their position in the list, and results
+    list them in that order (or by distance, then position), so callers get
+    the same order a full scan would produce.
+    """
+
+    def __init__(self, points: Sequence[Tuple[Optional[float], Optional[float]]], cell_degrees: float = GEO_INDEX_CELL_DEGREES):
+        """
+        Build the index.
+
+        Args:
+            points: (latitude, longitude) per item; items with a missing (or
+                zero) coordinate are not indexed, like the full scan skipped them
+            cell_degrees: Side of a grid cell in degrees
+        """
+        self.cell_degrees = cell_degrees
+        self._lon_cells = max(1, math.ceil(360 / cell_degrees))
+        self._points = list(points)
+        self._cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for i, (lat, lon) in enumerate(self._points):
+            if lat and lon:
+                self._cells[self._lat_cell(lat), self._lon_cell(lon)].append(i)
+        self._cells = dict(self._cells)
+        self.size = sum(len(items) for items in self._cells.values())
+
+    def _lat_cell(self, lat: float) -> int:
+        return math.floor(lat / self.cell_degrees)
+
+    def _lon_cell(self, lon: float) -> int:
+        return math.floor((lon + 180) / self.cell_degrees) % self._lon_cells
+
+    def _candidates(self, lat: float, lon: float, radius_km: float) -> List[int]:
+        """Indexed points in the cells overlapping the circle's bounding box, in list order."""
+        arc = min(radius_km, _MAX_DISTANCE_KM) / EARTH_RADIUS_KM
+        dlat = math.degrees(arc) + _PAD_DEGREES
+        lat_cells = range(self._lat_cell(max(-90.0, lat - dlat)), self._lat_cell(min(90.0, lat + dlat)) + 1)
+
+        # Widest longitude offset on a spherical cap that contains no pole
+        spread = math.sin(arc) / math.cos(math.radians(lat)) if abs(lat) + math.degrees(arc) < 90 else 2.0
+        if spread >= 1 or arc >= math.pi / 2:
+            lon_cells = range(self._lon_cells)
+        else:
+            dlon = math.degrees(math.asin(spread)) + _PAD_DEGREES
+            first = math.floor((lon - dlon + 180) / self.cell_degrees)
+            last = math.floor((lon + dlon + 180) / self.cell_degrees)
+            if last - first + 1 >= self._lon_cells:
+                lon_cells = range(self._lon_cells)
+            else:
+                lon_cells = sorted({cell % self._lon_cells for cell in range(first, last + 1)})
+
+        candidates = []
+        for lat_cell in lat_cells:
+            for lon_cell in lon_cells:
+                candidates.extend(self._cells.get((lat_cell, lon_cell), ()))
+        candidates.sort()
+        return candidates
+
+    def within(
+        self,
+        lat: float,
+        lon: float,
+        radius_km: float,
+        predicate: Optional[Callable[[int], bool]] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Points within a radius.
+
+        Args:
+            lat: Latitude of the center
+            lon: Longitude of the center
+            radius_km: Search radius (inclusive)
+            predicate: Optional filter on the point position, checked before the distance
+
+        Returns:
+            (position, distance_km) pairs in list order
+        """
+        matches = []
+        for i in self._candidates(lat, lon, radius_km):
+            if predicate is not None and not predicate(i):
+                continue
+            point_lat, point_lon = self._points[i]
+            distance = haversine_km(lat, lon, point_lat, point_lon)
+            if distance <= radius_km:
+                matches.append((i, distance))
+        return matches
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        k: int,
+        max_km: float = _MAX_DISTANCE_KM,
+        predicate: Optional[Callable[[int], bool]] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        The k points closest to a location.
+        Searches a circle of one cell and doubles it until k points are
+        inside (or max_km is reached); the k nearest are then all within it.
+
+        Args:
+            lat: Latitude of the center
+            lon: Longitude of the center
+            k: Number of points
+            max_km: Ignore points further away than this
+            predicate: Optional filter on the point position
+
+        Returns:
+            Up to k (position, distance_km) pairs by distance, then list order
+        """
+        if k <= 0:
+            return []
+        radius_km = min(max_km, math.radians(self.cell_degrees) * EARTH_RADIUS_KM)
+        while True:
+            matches = self.within(lat, lon, radius_km, predicate)
+            if len(matches) >= k or radius_km >= min(max_km, _MAX_DISTANCE_KM):
+                break
+            radius_km = min(max_km, radius_km * 2)
+        matches.sort(key=lambda match: (match[1], match[0]))
+        return matches[:k]
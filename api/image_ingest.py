@@ -0,0 +1,310 @@
+import os
+import struct
+from typing import NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+
+# Largest source image (bytes) accepted for processing
+IMAGE_MAX_BYTES = int(os.environ.get("IMAGE_MAX_BYTES", str(30 * 1024 * 1024)))
+# Largest source image (width x height, as declared in its header) accepted for processing
+IMAGE_MAX_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", str(64 * 1024 * 1024)))
+# Longest side of the frame that is anonymized and encoded; larger sources are
+# decoded at reduced resolution and/or downscaled first (0 keeps the full size)
+IMAGE_MAX_DIMENSION = int(os.environ.get("IMAGE_MAX_DIMENSION", "4096"))
+
+# Reduced decode factor -> imread flag; libjpeg scales while decoding, so a
+# reduced JPEG never materializes at full size
+_REDUCED_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+]
+
+# JPEG start-of-frame markers (every SOFn except DHT, JPG and DAC)
+_JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Segments describing the image itself: frames, tables, scans, restart
+# interval, number of lines and hierarchical progression
+_JPEG_IMAGE_MARKERS = _JPEG_SOF_MARKERS | {0xC4, 0xCC, 0xDA, 0xDB, 0xDC, 0xDD, 0xDE, 0xDF}
+
+
+class ImageRejected(ValueError):
+    """Raised for source images that are not processed (too large or unsupported)."""
+
+    def __init__(self, message: str, status: int = 413):
+        super().__init__(message)
+        self.status = status
+
+
+class ImageHeader(NamedTuple):
+    """Format and dimensions read from an image header, without decoding."""
+    format: str
+    width: int
+    height: int
+
+
+def _jpeg_size(data) -> Optional[tuple]:
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            offset += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            # Standalone markers carry no length
+            offset += 2
+            continue
+        (length,) = struct.unpack_from(">H", data, offset + 2)
+        if marker in _JPEG_SOF_MARKERS:
+            if offset + 9 > len(data):
+                return None
+            height, width = struct.unpack_from(">HH", data, offset + 5)
+            return width, height
+        if marker == 0xDA or length < 2:
+            # Scan data without a frame header first: not a valid JPEG
+            return None
+        offset += 2 + length
+    return None
+
+
+def _png_size(data) -> Optional[tuple]:
+    if len(data) < 24 or data[12:16] != b"IHDR":
+        return None
+    return struct.unpack_from(">II", data, 16)
+
+
+def _webp_size(data) -> Optional[tuple]:
+    if len(data) < 30:
+        return None
+    chunk = data[12:16]
+    if chunk == b"VP8X":
+        width = 1 + int.from_bytes(data[24:27], "little")
+        height = 1 + int.from_bytes(data[27:30], "little")
+        return width, height
+    if chunk == b"VP8L" and data[20] == 0x2F:
+        (bits,) = struct.unpack_from("<I", data, 21)
+        return 1 + (bits & 0x3FFF), 1 + ((bits >> 14) & 0x3FFF)
+    if chunk == b"VP8 " and data[23:26] == b"\x9d\x01\x2a":
+        width, height = struct.unpack_from("<HH", data, 26)
+        return width & 0x3FFF, height & 0x3FFF
+    return None
+
+
+def read_header(image_bytes) -> ImageHeader:
+    """
+    Read the format and dimensions of a JPEG, PNG or WebP image from its header.
+
+    Args:
+        image_bytes: Encoded image
+
+    Returns:
+        ImageHeader
+
+    Raises:
+        ImageRejected: For other formats or headers without usable dimensions (415)
+    """
+    data = memoryview(image_bytes)
+    head = bytes(data[:16])
+    if head.startswith(b"\xff\xd8"):
+        fmt, size = "jpeg", _jpeg_size(data)
+    elif head.startswith(b"\x89PNG\r\n\x1a\n"):
+        fmt, size = "png", _png_size(data)
+    elif head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        fmt, size = "webp", _webp_size(data)
+    else:
+        raise ImageRejected("Unsupported image format (expected JPEG, PNG or WebP)", status=415)
+
+    if size is None or min(size) <= 0:
+        raise ImageRejected(f"Could not read the {fmt.upper()} image dimensions", status=415)
+    return ImageHeader(fmt, *size)
+
+
+def _exif_orientation(payload) -> int:
+    """EXIF orientation tag of an APP1 payload ("Exif\\0\\0" + TIFF), 1 when absent."""
+    tiff = bytes(payload[6:])
+    order = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if order is None or len(tiff) < 8:
+        return 1
+    (ifd,) = struct.unpack_from(order + "I", tiff, 4)
+    if ifd + 2 > len(tiff):
+        return 1
+    (count,) = struct.unpack_from(order + "H", tiff, ifd)
+    for entry in range(ifd + 2, min(ifd + 2 + 12 * count, len(tiff) - 11), 12):
+        tag, _, _ = struct.unpack_from(order + "HHI", tiff, entry)
+        if tag == 0x0112:
+            return struct.unpack_from(order + "H", tiff, entry + 8)[0]
+    return 1
+
+
+def _entropy_end(data: bytes, offset: int) -> int:
+    """Offset of the marker ending the entropy-coded data that starts at offset (-1 when there is none)."""
+    while True:
+        offset = data.find(b"\xff", offset)
+        if offset < 0 or offset + 1 >= len(data):
+            return -1
+        following = data[offset + 1]
+        if following == 0x00 or 0xD0 <= following <= 0xD7:
+            # Stuffed 0xFF byte or restart marker, both part of the scan
+            offset += 2
+        elif following == 0xFF:
+            # Fill byte before the marker
+            offset += 1
+        else:
+            return offset
+
+
+def _keep_segment(marker: int, payload: bytes) -> Optional[bool]:
+    """
+    Whether a segment is copied by passthrough_jpeg: True to keep it, False
+    to drop it (metadata), None when it is unknown and the source must be
+    re-encoded instead.
+    """
+    if marker in _JPEG_IMAGE_MARKERS:
+        return True
+    if marker == 0xE0:
+        return payload.startswith(b"JFIF\x00")
+    if marker == 0xE2:
+        # Only ICC profiles; MPF (multi-picture index of embedded images) and FlashPix are dropped
+        return payload.startswith(b"ICC_PROFILE\x00")
+    if marker == 0xEE:
+        return payload.startswith(b"Adobe")
+    if 0xE1 <= marker <= 0xEF or marker == 0xFE:
+        # Other application segments (EXIF incl. GPS, XMP, ...) and comments
+        return False
+    return None
+
+
+def passthrough_jpeg(image_bytes, frame_shape) -> Optional[bytes]:
+    """
+    The source JPEG with its metadata removed, for serving a photo unchanged
+    without re-encoding it (e.g. when it contains no faces).
+    Only the main image is kept: its frame, table and scan segments, JFIF
+    (APP0), ICC profiles (APP2) and Adobe colour info (APP14), which change
+    how the pixels are decoded. EXIF (incl. GPS), XMP, MPF, other
+    application segments, comments and everything after the main image's
+    EOI (e.g. the embedded images of multi-picture files) are dropped.
+
+    Args:
+        image_bytes: Source image
+        frame_shape: Shape of the frame decoded from it
+
+    Returns:
+        JPEG bytes, or None when the source is no JPEG, was decoded at a
+        reduced size, needs an EXIF rotation (which would be lost) or has a
+        structure this function does not know (re-encode it instead)
+    """
+    data = bytes(image_bytes)
+    if not data.startswith(b"\xff\xd8"):
+        return None
+    header = read_header(data)
+    if (header.height, header.width) != tuple(frame_shape[:2]):
+        return None
+
+    kept = [b"\xff\xd8"]
+    offset = 2
+    while offset + 2 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            offset += 1
+            continue
+        if marker == 0xD9:
+            kept.append(b"\xff\xd9")
+            return b"".join(kept)
+        if marker == 0xD8 or marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            return None
+        if offset + 4 > len(data):
+            return None
+        (length,) = struct.unpack_from(">H", data, offset + 2)
+        end = offset + 2 + length
+        if length < 2 or end > len(data):
+            return None
+        payload = data[offset + 4:end]
+        if marker == 0xE1 and payload.startswith(b"Exif\x00\x00") and _exif_orientation(payload) != 1:
+            return None
+
+        keep = _keep_segment(marker, payload)
+        if keep is None:
+            return None
+        if keep:
+            kept.append(data[offset:end])
+        offset = end
+
+        if marker == 0xDA:
+            # Entropy-coded scan data runs up to the next marker
+            scan_end = _entropy_end(data, offset)
+            if scan_end < 0:
+                return None
+            kept.append(data[offset:scan_end])
+            offset = scan_end
+    # Truncated: no EOI
+    return None
+
+
+def reduction_factor(header: ImageHeader, max_dimension: Optional[int]) -> int:
+    """
+    Largest reduced-decode factor that still leaves at least max_dimension
+    pixels on the longest side (1 when no reduction applies). Only JPEG
+    decodes at reduced size; other formats would be decoded in full anyway.
+    """
+    if header.format != "jpeg" or not max_dimension:
+        return 1
+    longest = max(header.width, header.height)
+    for factor, _ in _REDUCED_FLAGS:
+        if longest // factor >= max_dimension:
+            return factor
+    return 1
+
+
+def decode(
+    image_bytes,
+    max_dimension: Optional[int] = IMAGE_MAX_DIMENSION,
+    max_pixels: int = IMAGE_MAX_PIXELS,
+    max_bytes: int = IMAGE_MAX_BYTES
+) -> np.ndarray:
+    """
+    Decode an uploaded image within byte, pixel and size budgets.
+    The header is checked before anything is decoded, sources well above
+    max_dimension are decoded at 1/2, 1/4 or 1/8 resolution, and the
+    result is downscaled to max_dimension, so the frame that is anonymized
+    and encoded never exceeds it.
+
+    Args:
+        image_bytes: Encoded image (bytes, bytearray or memoryview)
+        max_dimension: Longest side of the returned frame (None or 0 keeps the full size)
+        max_pixels: Largest accepted width x height declared by the header
+        max_bytes: Largest accepted encoded size
+
+    Returns:
+        Decoded BGR image
+
+    Raises:
+        ImageRejected: When a budget is exceeded (413) or the format is unsupported (415)
+        ValueError: When the data cannot be decoded
+    """
+    if len(image_bytes) > max_bytes:
+        raise ImageRejected(f"Image is {len(image_bytes)} bytes; the limit is {max_bytes}")
+
+    header = read_header(image_bytes)
+    if header.width * header.height > max_pixels:
+        raise ImageRejected(
+            f"Image is {header.width}x{header.height} pixels; the limit is {max_pixels} pixels"
+        )
+
+    factor = reduction_factor(header, max_dimension)
+    flag = dict(_REDUCED_FLAGS).get(factor, cv2.IMREAD_COLOR)
+    image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), flag)
+    if image is None:
+        raise ValueError("Invalid image data")
+
+    height, width = image.shape[:2]
+    if max_dimension and max(height, width) > max_dimension:
+        scale = max_dimension / float(max(height, width))
+        size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    return image
@@ -0,0 +1,591 @@
+from fastapi import APIRouter, FastAPI, HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+import asyncio, os, time
+from functools import partial
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from face_processor import get_face_processor
+from face_detectors import is_detector_backend
+from execution import get_execution_layer
+from inference_pool import InferencePoolFull, get_inference_pool
+from job_queue import JobQueueFull, get_job_queue, validate_callback_url
+from admission import Overloaded, RateLimited, get_admission_controller, get_rate_limiter
+from storage_client import StorageError, get_storage_client
+from image_ingest import IMAGE_MAX_BYTES, ImageRejected
+from result_cache import (
+    content_digest, detection_cache_key, get_detection_cache, get_result_cache, result_cache_key
+)
+import metrics
+from derivatives import (
+    IMAGE_DERIVATIVES, DerivativeSpec,
+    encode_derivatives, parse_derivative_specs, validate_derivative_specs
+)
+
+# Face anonymization endpoints (/process, /process/batch, /process/jobs) and the
+# detector readiness probe. Mounted by main.py when API_SERVICES includes "images".
+
+# Maximum number of images accepted by /process/batch
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "8"))
+# Maximum number of derivatives a request may ask for
+MAX_DERIVATIVES = int(os.environ.get("MAX_DERIVATIVES", "6"))
+
+# Renditions produced when a request does not list its own (see derivatives.py)
+DEFAULT_DERIVATIVES = parse_derivative_specs(IMAGE_DERIVATIVES)
+
+# Face processor, set by the background load in lifespan once the model is loaded
+# and warmed up; image endpoints wait for it (require_face_processor), markets don't
+face_processor = None
+model_warmup: Optional[asyncio.Task] = None
+model_warmup_seconds: Optional[float] = None
+
+# Thread pool for OpenCV work
+execution = get_execution_layer()
+
+# Pooled keep-alive client for Supabase Storage
+storage = get_storage_client()
+
+# Content-addressed cache of processed results (memory + disk tiers)
+result_cache = get_result_cache()
+
+# Face boxes per source image, reused when only anonymization parameters change
+detection_cache = get_detection_cache()
+
+# Optional process pool for face detection (enabled with INFERENCE_WORKERS > 0)
+inference_pool = get_inference_pool(run_cpu=execution.run_cpu)
+
+# Durable queue for asynchronous /process jobs (disabled with JOB_WORKERS=0)
+job_queue = get_job_queue()
+
+# Bounds image work in flight and sheds excess load; per-user token buckets
+admission = get_admission_controller()
+rate_limiter = get_rate_limiter()
+
+async def load_face_processor():
+    """Load the face model off the event loop, then run a warm-up forward pass"""
+    global face_processor, model_warmup_seconds
+    start = time.perf_counter()
+    processor = await execution.run_cpu(get_face_processor)
+    warm = await execution.run_cpu(processor.warm_up)
+    face_processor = processor
+    model_warmup_seconds = time.perf_counter() - start
+    metrics.observe_stage("model_warmup", model_warmup_seconds)
+    print(f"Face detector {'ready' if warm else 'unavailable'} after {model_warmup_seconds:.2f}s")
+
+async def require_face_processor():
+    """Wait for the background model load (503 with Retry-After if it failed)"""
+    try:
+        await asyncio.shield(model_warmup)
+    except Exception as e:
+        raise HTTPException(503, f"Face detector failed to load: {e}", headers={"Retry-After": "5"})
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global model_warmup
+    # The app answers (health, markets) while the model loads in the background
+    model_warmup = asyncio.create_task(load_face_processor())
+    if inference_pool is not None:
+        inference_pool.start()
+    if job_queue is not None:
+        job_queue.start(run_process_job)
+    yield
+    model_warmup.cancel()
+    if job_queue is not None:
+        await job_queue.close()
+    if inference_pool is not None:
+        inference_pool.close()
+    await storage.close()
+    await execution.close()
+
+router = APIRouter()
+
+class DerivativeRequest(BaseModel):
+    name: str  # e.g. "full", "display", "thumb"
+    format: str = "jpeg"  # "jpeg", "webp" or "avif" (falls back to webp without an AVIF encoder)
+    quality: int = 90
+    maxDimension: Optional[int] = None  # Longest side in pixels; None keeps the full size
+
+class ProcessRequest(BaseModel):
+    imagePath: str
+    userId: str
+    mode: str = "pixelate"  # "pixelate", "blur" or "color"
+    pixelateSize: int = 20
+    blurStrength: int = 31
+    softMask: Optional[bool] = None  # Feathered edges; None uses the processor default
+    softMaskStrength: Optional[int] = None  # Feather width in percent of the face box size
+    downscaleForDetection: int = 800
+    detectionStrategy: str = "single"  # "single", "tiled" (multi-scale tiles for crowd photos) or "adaptive" (coarse-to-fine)
+    detector: Optional[str] = None  # "ssd", "yunet", "onnx", "haar" or "haar+<backend>"; None uses FACE_DETECTOR_BACKEND
+    derivatives: Optional[List[DerivativeRequest]] = None  # None uses IMAGE_DERIVATIVES
+
+class ProcessJobRequest(ProcessRequest):
+    priority: int = Field(0, ge=0, le=10)  # Higher runs first
+    callbackUrl: Optional[str] = None  # https URL on a public host (or JOB_CALLBACK_HOSTS); receives the finished job as a JSON POST
+
+class BatchProcessRequest(BaseModel):
+    imagePaths: List[str]
+    userId: str
+    mode: str = "pixelate"  # "pixelate", "blur" or "color"
+    pixelateSize: int = 20
+    blurStrength: int = 31
+    softMask: Optional[bool] = None
+    softMaskStrength: Optional[int] = None
+    downscaleForDetection: int = 800
+    detectionStrategy: str = "single"
+    detector: Optional[str] = None
+    derivatives: Optional[List[DerivativeRequest]] = None
+
+async def source_digest(img_bytes: bytes) -> Optional[str]:
+    """Content hash of a source image (None when neither cache is enabled)"""
+    if result_cache is None and detection_cache is None:
+        return None
+    return await execution.run_cpu(content_digest, img_bytes)
+
+def process_cache_key(source_digest: Optional[str], req) -> Optional[str]:
+    """
+    Cache key for a source image, the request's processing parameters and its user.
+    Cached results point at objects in the requesting user's folder, which
+    that user may delete, so they are never handed to another user.
+    """
+    if result_cache is None or source_digest is None:
+        return None
+    return result_cache_key(
+        source_digest,
+        userId=req.userId,
+        mode=req.mode,
+        pixelateSize=req.pixelateSize,
+        blurStrength=req.blurStrength,
+        softMask=face_processor.soft_mask if req.softMask is None else req.softMask,
+        softMaskStrength=face_processor.soft_mask_strength if req.softMaskStrength is None else req.softMaskStrength,
+        downscaleForDetection=req.downscaleForDetection,
+        detectionStrategy=req.detectionStrategy,
+        detector=req.detector or face_processor.detector_backend,
+        derivatives=[list(spec) for spec in request_derivatives(req)],
+        frameDimension=face_processor.max_frame_dimension
+    )
+
+def stored_detections_key(source_digest: Optional[str], req) -> Optional[str]:
+    """Key of the stored face boxes for a source image and the request's detection parameters"""
+    if detection_cache is None or source_digest is None:
+        return None
+    return detection_cache_key(
+        source_digest,
+        req.downscaleForDetection,
+        req.detectionStrategy,
+        req.detector or face_processor.detector_backend,
+        face_processor.confidence_threshold,
+        face_processor.max_frame_dimension
+    )
+
+def detector_available(req) -> bool:
+    """
+    Whether the request's detector backend is loaded. Without its model it
+    finds no faces at all, so neither its detections nor the un-anonymized
+    results may be cached (they would outlive the fix of the model).
+    """
+    return face_processor.get_detector(req.detector).available
+
+def lookup_detections(key: Optional[str]) -> Optional[dict]:
+    """Stored detections for a key, counting the lookup"""
+    if key is None:
+        return None
+    stored = detection_cache.get(key)
+    metrics.DETECTION_CACHE_REQUESTS.inc(result="hit" if stored is not None else "miss")
+    return stored
+
+def request_derivatives(req) -> List[DerivativeSpec]:
+    """Derivative specs for a request (the server default when it lists none)"""
+    if req.derivatives is None:
+        return DEFAULT_DERIVATIVES
+    if len(req.derivatives) > MAX_DERIVATIVES:
+        raise HTTPException(400, f"At most {MAX_DERIVATIVES} derivatives per request")
+    specs = [DerivativeSpec(d.name, d.format.lower(), d.quality, d.maxDimension) for d in req.derivatives]
+    try:
+        validate_derivative_specs(specs)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return specs
+
+async def upload_derivatives(encoded: dict, base_path: str) -> dict:
+    """
+    Upload every derivative of one image concurrently.
+    The "full" rendition keeps the legacy path (<base>.jpg for JPEG); others get a name suffix.
+    """
+    names = list(encoded)
+    paths = [
+        f"{base_path}{encoded[name].extension}" if name == "full" else f"{base_path}-{name}{encoded[name].extension}"
+        for name in names
+    ]
+    urls = await asyncio.gather(*(
+        storage.upload(encoded[name].data, path, content_type=encoded[name].content_type)
+        for name, path in zip(names, paths)
+    ))
+    return {
+        name: {
+            "url": url,
+            "format": encoded[name].format,
+            "width": encoded[name].width,
+            "height": encoded[name].height,
+            "bytes": len(encoded[name].data)
+        }
+        for name, url in zip(names, urls)
+    }
+
+def primary_url(derivatives: dict) -> str:
+    """processedImageUrl: the "full" rendition, or the first one requested"""
+    return (derivatives.get("full") or next(iter(derivatives.values())))["url"]
+
+def check_rate_limit(user_id: str, cost: int = 1):
+    """Take cost tokens from the user's bucket, answering 429 with Retry-After when empty"""
+    try:
+        rate_limiter.acquire(user_id, cost)
+    except RateLimited as e:
+        raise HTTPException(429, str(e), headers={"Retry-After": str(e.retry_after)})
+
+@asynccontextmanager
+async def admitted(weight: int = 1, shed: bool = True):
+    """Hold processing slots for a block, answering 503 with Retry-After when shed"""
+    try:
+        async with admission.admit(weight, shed):
+            yield
+    except Overloaded as e:
+        raise HTTPException(503, str(e), headers={"Retry-After": str(e.retry_after)})
+
+def validate_detector(detector: Optional[str]):
+    """Reject unknown detector backend names before any work is done"""
+    if detector is not None and not is_detector_backend(detector):
+        raise HTTPException(400, f"Unknown detector backend: {detector}")
+
+@router.post("/process")
+async def process(req: ProcessRequest):
+    """
+    Process an image to anonymize faces.
+    Supports pixelation, blur and colour-fill modes, optionally with a feathered soft mask.
+    """
+    return await process_request(req, "process")
+
+@router.post("/process/jobs", status_code=202)
+async def submit_process_job(req: ProcessJobRequest):
+    """
+    Queue an image for processing and return immediately with a job id.
+    Poll /process/jobs/{id} or pass callbackUrl to receive the finished job.
+    """
+    if job_queue is None:
+        raise HTTPException(503, "Asynchronous processing is disabled (JOB_WORKERS=0 or the job database is unavailable)")
+    # Reject invalid requests now rather than in the job
+    validate_detector(req.detector)
+    request_derivatives(req)
+    if req.callbackUrl is not None:
+        try:
+            validate_callback_url(req.callbackUrl)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+    check_rate_limit(req.userId)
+
+    try:
+        job = await job_queue.submit(
+            req.model_dump(exclude={"priority", "callbackUrl"}),
+            priority=req.priority,
+            callback_url=req.callbackUrl
+        )
+    except JobQueueFull as e:
+        raise HTTPException(503, str(e), headers={"Retry-After": "30"})
+    status_url = f"/process/jobs/{job['id']}"
+    return JSONResponse(
+        status_code=202,
+        content={"jobId": job["id"], "status": job["status"], "statusUrl": status_url},
+        headers={"Location": status_url}
+    )
+
+@router.get("/process/jobs/{job_id}")
+async def get_process_job(job_id: str):
+    """Status of an asynchronous job; result holds the /process response once it succeeded"""
+    job = await job_queue.get(job_id) if job_queue is not None else None
+    if job is None:
+        raise HTTPException(404, f"Unknown job: {job_id}")
+    return job
+
+async def run_process_job(payload: dict) -> dict:
+    """Job handler: the same processing as /process"""
+    return await process_request(ProcessRequest(**payload), "process_job", background=True)
+
+async def process_request(req: ProcessRequest, endpoint: str, background: bool = False) -> dict:
+    """
+    Download, anonymize and upload one image (shared by /process and its jobs).
+    Background jobs skip the rate limit and wait for a slot instead of being shed.
+    """
+    with metrics.request_trace(endpoint) as trace:
+        validate_detector(req.detector)
+        specs = request_derivatives(req)
+        trace.attributes["imagePath"] = req.imagePath
+
+        # Shed excess load before downloading anything; cheap endpoints never wait here
+        if not background:
+            check_rate_limit(req.userId)
+        async with admitted(shed=not background):
+            await require_face_processor()
+            try:
+                # Download image from Supabase
+                img_bytes = await storage.download(req.imagePath, max_bytes=IMAGE_MAX_BYTES)
+
+                # Same source bytes and parameters: return the earlier result without reprocessing
+                digest = await source_digest(img_bytes)
+                cache_key = process_cache_key(digest, req)
+                cached = result_cache.get(cache_key) if cache_key else None
+                if cache_key:
+                    metrics.CACHE_REQUESTS.inc(result="hit" if cached is not None else "miss")
+                if cached is not None:
+                    return {
+                        "success": True,
+                        "processedImageUrl": cached["processedImageUrl"],
+                        "facesDetected": cached["facesDetected"],
+                        "derivatives": cached["derivatives"],
+                        "mode": req.mode,
+                        "cached": True
+                    }
+            
+                # Same source and detection parameters: re-render the stored face boxes
+                detections_key = stored_detections_key(digest, req)
+                stored = lookup_detections(detections_key)
+
+                # All renditions are encoded from the one decoded, anonymized frame
+                encode = partial(encode_derivatives, specs=specs)
+                timings = {}
+                detections = {}
+                if stored is not None:
+                    # Only decode, anonymization and encode; no detection and no worker round trip
+                    trace.attributes["detections"] = "stored"
+                    encoded, faces_detected = await execution.run_cpu(
+                        face_processor.rerender_image,
+                        image_bytes=img_bytes,
+                        face_boxes=stored["boxes"],
+                        mode=req.mode,
+                        pixelate_size=req.pixelateSize,
+                        blur_strength=req.blurStrength,
+                        soft_mask=req.softMask,
+                        soft_mask_strength=req.softMaskStrength,
+                        timings=timings,
+                        encode=encode
+                    )
+                elif inference_pool is not None:
+                    # Decode here, detect and anonymize on a worker process via shared memory
+                    with metrics.stage_timer("decode"):
+                        image = await execution.run_cpu(face_processor.decode_image, img_bytes)
+                    pending = inference_pool.process_image(
+                        image,
+                        encode=encode,
+                        image_bytes=img_bytes,
+                        mode=req.mode,
+                        pixelate_size=req.pixelateSize,
+                        blur_strength=req.blurStrength,
+                        max_dimension=req.downscaleForDetection,
+                        detection_strategy=req.detectionStrategy,
+                        detector=req.detector,
+                        soft_mask=req.softMask,
+                        soft_mask_strength=req.softMaskStrength,
+                        timings=timings,
+                        detections=detections
+                    )
+                    # The pool copies the frame into shared memory; holding it here would
+                    # keep a second full-size frame alive until the encode finishes
+                    del image
+                    encoded, faces_detected = await pending
+                else:
+                    # Process image with face processor (off the event loop)
+                    encoded, faces_detected = await execution.run_cpu(
+                        face_processor.process_image,
+                        image_bytes=img_bytes,
+                        mode=req.mode,
+                        pixelate_size=req.pixelateSize,
+                        blur_strength=req.blurStrength,
+                        max_dimension=req.downscaleForDetection,
+                        detection_strategy=req.detectionStrategy,
+                        detector=req.detector,
+                        soft_mask=req.softMask,
+                        soft_mask_strength=req.softMaskStrength,
+                        timings=timings,
+                        encode=encode,
+                        detections=detections
+                    )
+                # Only the encoded derivatives are needed from here on
+                img_bytes = None
+                if "precheck" in timings:
+                    metrics.NO_FACE_PRECHECKS.inc(result="detected" if "detect" in timings else "skipped")
+                if detections_key and stored is None and detector_available(req):
+                    detection_cache.put(detections_key, detections)
+                metrics.observe_stages(timings)
+                metrics.IMAGES_PROCESSED.inc(endpoint=endpoint)
+                metrics.FACES_DETECTED.inc(faces_detected, endpoint=endpoint)
+            
+                # Upload all derivatives in parallel
+                derivatives = await upload_derivatives(encoded, f"{req.userId}/{int(time.time()*1000)}-processed")
+                url = primary_url(derivatives)
+
+                # Faces were found by a loaded detector, or re-rendered from stored boxes
+                if cache_key and (stored is not None or detector_available(req)):
+                    result_cache.put(cache_key, {
+                        "processedImageUrl": url,
+                        "facesDetected": faces_detected,
+                        "derivatives": derivatives
+                    })
+
+                return {
+                    "success": True,
+                    "processedImageUrl": url,
+                    "facesDetected": faces_detected,
+                    "derivatives": derivatives,
+                    "mode": req.mode
+                }
+
+            except InferencePoolFull as e:
+                raise HTTPException(503, str(e), headers={"Retry-After": "1"})
+            except ImageRejected as e:
+                raise HTTPException(e.status, str(e))
+            except StorageError as e:
+                if e.status == 413:
+                    raise HTTPException(413, str(e))
+                raise HTTPException(500, str(e))
+            except Exception as e:
+                raise HTTPException(500, str(e))
+
+@router.post("/process/batch")
+async def process_batch(req: BatchProcessRequest):
+    """
+    Process several images in one request.
+    Face detection for the whole batch runs as a single DNN forward pass.
+    """
+    with metrics.request_trace("process_batch") as trace:
+        if not req.imagePaths:
+            raise HTTPException(400, "imagePaths must not be empty")
+        if len(req.imagePaths) > MAX_BATCH_SIZE:
+            raise HTTPException(400, f"At most {MAX_BATCH_SIZE} images per batch")
+        validate_detector(req.detector)
+        specs = request_derivatives(req)
+        trace.attributes["images"] = len(req.imagePaths)
+
+        # A batch costs one token and one processing slot per image
+        check_rate_limit(req.userId, len(req.imagePaths))
+        async with admitted(weight=len(req.imagePaths)):
+            await require_face_processor()
+            try:
+                # Download all images concurrently
+                downloads = await asyncio.gather(
+                    *(storage.download(path, max_bytes=IMAGE_MAX_BYTES) for path in req.imagePaths),
+                    return_exceptions=True
+                )
+                valid = [i for i, d in enumerate(downloads) if not isinstance(d, BaseException)]
+
+                # Serve repeated images from the result cache
+                digests = {i: await source_digest(downloads[i]) for i in valid}
+                cache_keys = {i: process_cache_key(digests[i], req) for i in valid}
+                cached = {}
+                for i in valid:
+                    hit = result_cache.get(cache_keys[i]) if cache_keys[i] else None
+                    if cache_keys[i]:
+                        metrics.CACHE_REQUESTS.inc(result="hit" if hit is not None else "miss")
+                    if hit is not None:
+                        cached[i] = hit
+                to_process = [i for i in valid if i not in cached]
+
+                # Images with stored detections skip detection and only re-render
+                detections_keys = {i: stored_detections_key(digests[i], req) for i in to_process}
+                stored = [lookup_detections(detections_keys[i]) for i in to_process]
+                stored_by_index = dict(zip(to_process, stored))
+
+                # Process the downloaded images as one batch (off the event loop)
+                timings = {}
+                detections = []
+                processed = await execution.run_cpu(
+                    face_processor.process_images_batch,
+                    images_bytes=[downloads[i] for i in to_process],
+                    mode=req.mode,
+                    pixelate_size=req.pixelateSize,
+                    blur_strength=req.blurStrength,
+                    max_dimension=req.downscaleForDetection,
+                    detection_strategy=req.detectionStrategy,
+                    detector=req.detector,
+                    soft_mask=req.softMask,
+                    soft_mask_strength=req.softMaskStrength,
+                    timings=timings,
+                    encode=partial(encode_derivatives, specs=specs),
+                    stored_boxes=[entry["boxes"] if entry is not None else None for entry in stored],
+                    detections=detections
+                ) if to_process else []
+                detected_reliably = detector_available(req)
+                for i, detection in zip(to_process, detections):
+                    if detection is not None and detections_keys[i] and detected_reliably:
+                        detection_cache.put(detections_keys[i], detection)
+                metrics.observe_stages(timings)
+                outcomes = list(downloads)
+                for i, result in zip(to_process, processed):
+                    outcomes[i] = result
+
+                # Upload every derivative of every processed image concurrently
+                timestamp = int(time.time()*1000)
+                upload_indexes = [i for i in to_process if not isinstance(outcomes[i], BaseException)]
+                uploads = await asyncio.gather(
+                    *(
+                        upload_derivatives(outcomes[i][0], f"{req.userId}/{timestamp}-{i}-processed")
+                        for i in upload_indexes
+                    ),
+                    return_exceptions=True
+                )
+                uploaded = dict(zip(upload_indexes, uploads))
+
+                results = []
+                for i, path in enumerate(req.imagePaths):
+                    if i in cached:
+                        results.append({
+                            "imagePath": path,
+                            "success": True,
+                            "processedImageUrl": cached[i]["processedImageUrl"],
+                            "facesDetected": cached[i]["facesDetected"],
+                            "derivatives": cached[i]["derivatives"],
+                            "cached": True
+                        })
+                        continue
+
+                    # Report the first failure (download, processing or upload) for this image
+                    error = outcomes[i] if i not in uploaded else uploaded[i]
+                    if isinstance(error, BaseException):
+                        metrics.ERRORS.inc(endpoint="process_batch", error=type(error).__name__)
+                        results.append({"imagePath": path, "success": False, "error": str(error)})
+                    else:
+                        metrics.IMAGES_PROCESSED.inc(endpoint="process_batch")
+                        metrics.FACES_DETECTED.inc(outcomes[i][1], endpoint="process_batch")
+                        result = {
+                            "processedImageUrl": primary_url(uploaded[i]),
+                            "facesDetected": outcomes[i][1],
+                            "derivatives": uploaded[i]
+                        }
+                        results.append({"imagePath": path, "success": True, **result})
+                        if cache_keys[i] and (stored_by_index[i] is not None or detected_reliably):
+                            result_cache.put(cache_keys[i], result)
+
+                return {
+                    "success": all(r["success"] for r in results),
+                    "results": results,
+                    "mode": req.mode
+                }
+
+            except Exception as e:
+                raise HTTPException(500, str(e))
+
+@router.get("/ready")
+async def ready():
+    """Readiness: 200 once the face detector is loaded and warmed up, 503 before (or if it is unavailable)"""
+    if face_processor is None:
+        failed = model_warmup is not None and model_warmup.done() and not model_warmup.cancelled()
+        status = "failed" if failed and model_warmup.exception() is not None else "starting"
+        return JSONResponse(status_code=503, content={"status": status, "service": "loppestars"})
+    if not face_processor.detector.available:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "detector_unavailable", "service": "loppestars", "detector": face_processor.detector_backend}
+        )
+    return {
+        "status": "ready",
+        "service": "loppestars",
+        "detector": face_processor.detector_backend,
+        "warmupSeconds": round(model_warmup_seconds, 3)
+    }
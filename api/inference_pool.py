@@ -0,0 +1,392 @@
+import asyncio
+import itertools
+import multiprocessing as mp
+import os
+import threading
+import time
+from functools import partial
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+import image_ingest
+
+
+# Number of inference worker processes (0 disables the pool and keeps detection in-process)
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "0"))
+# OpenCV threads per worker (cv2.setNumThreads); 1 avoids oversubscribing cores
+INFERENCE_THREADS_PER_WORKER = int(os.environ.get("INFERENCE_THREADS_PER_WORKER", "1"))
+# Maximum number of frames queued or in progress across all workers
+INFERENCE_QUEUE_SIZE = int(os.environ.get("INFERENCE_QUEUE_SIZE", str(max(1, INFERENCE_WORKERS) * 2)))
+# Seconds to wait for a free frame slot before rejecting the request
+INFERENCE_QUEUE_TIMEOUT = float(os.environ.get("INFERENCE_QUEUE_TIMEOUT", "10"))
+# Seconds to wait for a worker to finish one frame
+INFERENCE_TASK_TIMEOUT = float(os.environ.get("INFERENCE_TASK_TIMEOUT", "60"))
+
+# Shared memory segments are rounded up to this size so slots are rarely reallocated
+_SLOT_ALIGNMENT = 1 << 20
+
+
+class InferencePoolFull(RuntimeError):
+    """Raised when no frame slot becomes free within the queue timeout."""
+
+
+def _worker_main(task_queue, result_queue, num_threads: int, processor_kwargs: Dict[str, Any]):
+    """
+    Inference worker loop: loads the face model once, then detects and
+    anonymizes frames in place inside the shared memory segment of each task.
+    Every task is announced with a ("started", task_id, pid) message before
+    it runs, so the pool knows which process to replace when it hangs.
+    """
+    import cv2
+    from face_processor import FaceProcessor, detection_record
+
+    cv2.setNumThreads(num_threads)
+    processor = FaceProcessor(**processor_kwargs)
+    processor.warm_up()
+
+    # Segments stay mapped between tasks; slot index -> SharedMemory
+    attached: Dict[int, shared_memory.SharedMemory] = {}
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+
+        (task_id, slot_index, shm_name, shape,
+         mode, pixelate_size, blur_strength, max_dimension, detection_strategy, detector,
+         soft_mask, soft_mask_strength) = task
+        result_queue.put(("started", task_id, os.getpid()))
+        frame = None
+        try:
+            shm = attached.get(slot_index)
+            if shm is None or shm.name != shm_name:
+                if shm is not None:
+                    shm.close()
+                shm = shared_memory.SharedMemory(name=shm_name)
+                attached[slot_index] = shm
+
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+            timings = {}
+            # Same no-face handling as FaceProcessor.process_image
+            face_free = False
+            if detection_strategy == "single" and processor.precheck_dimension:
+                start = time.perf_counter()
+                face_free = processor.likely_face_free(frame, max_dimension, detector)
+                timings["precheck"] = time.perf_counter() - start
+            if face_free:
+                boxes, scores = np.empty((0, 4)), np.empty(0)
+            else:
+                start = time.perf_counter()
+                boxes, scores = processor.locate_faces(frame, max_dimension, detection_strategy, detector)
+                timings["detect"] = time.perf_counter() - start
+            if len(boxes):
+                start = time.perf_counter()
+                processor.anonymize(
+                    frame, [tuple(box) for box in boxes.tolist()], mode, pixelate_size, blur_strength,
+                    soft_mask, soft_mask_strength, in_place=True
+                )
+                timings["anonymize"] = time.perf_counter() - start
+
+            result_queue.put(("done", task_id, (detection_record(boxes, scores), timings, None)))
+        except Exception as e:
+            result_queue.put(("done", task_id, (None, None, str(e))))
+        finally:
+            # Drop the view into the segment so it can be closed when the slot is remapped
+            frame = None
+
+    for shm in attached.values():
+        shm.close()
+
+
+class _FrameSlot:
+    """A reusable shared memory buffer holding one decoded frame."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.shm: Optional[shared_memory.SharedMemory] = None
+
+    def frame(self, shape: Tuple[int, ...]) -> np.ndarray:
+        """Get a numpy view of the slot buffer, growing the segment if needed."""
+        nbytes = int(np.prod(shape))
+        if self.shm is None or self.shm.size < nbytes:
+            self.release()
+            size = -(-nbytes // _SLOT_ALIGNMENT) * _SLOT_ALIGNMENT
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf)
+
+    def release(self):
+        """Free the shared memory segment."""
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+class InferencePool:
+    """
+    Pool of worker processes that each hold their own face detection model.
+    Decoded frames are handed to workers through shared memory slots; the
+    number of slots bounds the queue and provides backpressure.
+    """
+
+    def __init__(
+        self,
+        workers: int = INFERENCE_WORKERS,
+        threads_per_worker: int = INFERENCE_THREADS_PER_WORKER,
+        queue_size: int = INFERENCE_QUEUE_SIZE,
+        queue_timeout: float = INFERENCE_QUEUE_TIMEOUT,
+        task_timeout: float = INFERENCE_TASK_TIMEOUT,
+        processor_kwargs: Optional[Dict[str, Any]] = None,
+        run_cpu: Optional[Callable[..., Any]] = None
+    ):
+        """
+        Initialize the inference pool (workers are started by start()).
+
+        Args:
+            workers: Number of worker processes
+            threads_per_worker: OpenCV thread count inside each worker
+            queue_size: Maximum number of frames queued or in progress
+            queue_timeout: Seconds to wait for a free slot before raising InferencePoolFull
+            task_timeout: Seconds to wait for a worker result
+            processor_kwargs: Keyword arguments for FaceProcessor in each worker
+            run_cpu: Awaitable runner for the frame copy and encode in this process
+                (e.g. ExecutionLayer.run_cpu); defaults to the loop's default executor
+        """
+        self.workers = max(1, workers)
+        self.threads_per_worker = max(1, threads_per_worker)
+        self.queue_size = max(self.workers, queue_size)
+        self.queue_timeout = queue_timeout
+        self.task_timeout = task_timeout
+        self.processor_kwargs = processor_kwargs or {}
+        self._run_cpu = run_cpu or self._run_in_default_executor
+
+        self._ctx = mp.get_context("spawn")
+        self._task_queue = self._ctx.Queue()
+        self._result_queue = self._ctx.Queue()
+        self._processes: list = []
+        self._slots = [_FrameSlot(i) for i in range(self.queue_size)]
+        self._free_slots: asyncio.Queue = asyncio.Queue()
+        for slot in self._slots:
+            self._free_slots.put_nowait(slot)
+
+        self._task_ids = itertools.count()
+        self._pending: Dict[int, asyncio.Future] = {}
+        # task_id -> pid of the worker running it (written by the result reader thread)
+        self._owners: Dict[int, int] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reader: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start the worker processes and the result reader thread."""
+        self._loop = asyncio.get_running_loop()
+        for _ in range(self.workers):
+            self._spawn_worker()
+        self._reader = threading.Thread(target=self._read_results, name="inference-results", daemon=True)
+        self._reader.start()
+
+    def _spawn_worker(self):
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(self._task_queue, self._result_queue, self.threads_per_worker, self.processor_kwargs),
+            daemon=True
+        )
+        process.start()
+        self._processes.append(process)
+
+    def _ensure_workers(self):
+        """Replace worker processes that have died."""
+        alive = [p for p in self._processes if p.is_alive()]
+        missing = self.workers - len(alive)
+        if missing > 0:
+            print(f"Warning: restarting {missing} inference worker(s)")
+            self._processes = alive
+            for _ in range(missing):
+                self._spawn_worker()
+
+    def _replace_worker(self, pid: int):
+        """Terminate a hung worker process and start a new one in its place."""
+        for process in self._processes:
+            if process.pid == pid:
+                print(f"Warning: replacing hung inference worker {pid}")
+                self._processes.remove(process)
+                process.terminate()
+                self._spawn_worker()
+                # Reap the old process without blocking the event loop
+                threading.Thread(target=process.join, name="inference-reaper", daemon=True).start()
+                return
+
+    def _read_results(self):
+        """Forward worker results to the futures waiting on the event loop."""
+        while True:
+            message = self._result_queue.get()
+            if message is None:
+                break
+            kind, task_id, payload = message
+            if kind == "started":
+                self._owners[task_id] = payload
+                continue
+            self._owners.pop(task_id, None)
+            detection, timings, error = payload
+            future = self._pending.pop(task_id, None)
+            if future is not None:
+                self._loop.call_soon_threadsafe(self._resolve, future, (detection, timings), error)
+
+    @staticmethod
+    async def _run_in_default_executor(func: Callable[..., Any], *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, result, error: Optional[str]):
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(RuntimeError(f"Inference worker failed: {error}"))
+        else:
+            future.set_result(result)
+
+    async def process_image(
+        self,
+        image: np.ndarray,
+        encode: Callable[..., Any],
+        image_bytes: Optional[bytes] = None,
+        mode: str = "pixelate",
+        pixelate_size: int = 15,
+        blur_strength: int = 31,
+        max_dimension: int = 800,
+        detection_strategy: str = "single",
+        detector: Optional[str] = None,
+        soft_mask: Optional[bool] = None,
+        soft_mask_strength: Optional[int] = None,
+        timings: Optional[dict] = None,
+        detections: Optional[dict] = None
+    ) -> Tuple[Any, int]:
+        """
+        Detect and anonymize faces in a decoded frame on a worker process.
+
+        Args:
+            image: Decoded image as numpy array (BGR format)
+            encode: Called with the anonymized frame while it is still in shared memory
+                (and with source_jpeg when no face was found, as in FaceProcessor.encode_unchanged)
+            image_bytes: Source the frame was decoded from; served unchanged
+                (metadata stripped) when no face is found and it is a matching JPEG
+            mode: Anonymization mode ("pixelate", "blur" or "color")
+            pixelate_size: Pixelation block size
+            blur_strength: Blur kernel size
+            max_dimension: Maximum dimension for detection downscaling
+            detection_strategy: Detection strategy (see FaceProcessor.find_faces)
+            detector: Detector backend name (None for the workers' default)
+            soft_mask: Feather the anonymized regions (None for the workers' default)
+            soft_mask_strength: Feather width in percent of the face box size
+            timings: Optional dict that receives seconds per stage ("inference_queue",
+                "precheck", "detect", "anonymize", "encode"), as FaceProcessor.process_image
+            detections: Optional dict that receives the detected "boxes" and "scores"
+                (see face_processor.detection_record)
+
+        Returns:
+            Tuple of (encode result, faces_detected)
+        """
+        queued = time.perf_counter()
+        try:
+            slot = await asyncio.wait_for(self._free_slots.get(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise InferencePoolFull(
+                f"Inference queue full ({self.queue_size} frames in flight)"
+            ) from None
+
+        if timings is not None:
+            timings["inference_queue"] = time.perf_counter() - queued
+
+        frame = None
+        try:
+            shape = image.shape
+            frame = slot.frame(shape)
+            await self._run_cpu(np.copyto, frame, image)
+            # The frame lives in shared memory now; let the decoded copy go
+            # (callers that drop their own reference free it before the encode)
+            image = None
+
+            self._ensure_workers()
+            task_id = next(self._task_ids)
+            future = self._loop.create_future()
+            self._pending[task_id] = future
+            self._task_queue.put((
+                task_id, slot.index, slot.shm.name, shape,
+                mode, pixelate_size, blur_strength, max_dimension, detection_strategy, detector,
+                soft_mask, soft_mask_strength
+            ))
+            try:
+                detection, worker_timings = await asyncio.wait_for(future, timeout=self.task_timeout)
+            except asyncio.TimeoutError:
+                # The worker is stuck on this frame: replace it, and retire the
+                # segment it may still write into instead of reusing it
+                owner = self._owners.pop(task_id, None)
+                if owner is not None:
+                    self._replace_worker(owner)
+                del frame
+                frame = None
+                slot.release()
+                slot = _FrameSlot(slot.index)
+                self._slots[slot.index] = slot
+                raise RuntimeError(f"Inference worker timed out after {self.task_timeout}s") from None
+            finally:
+                self._pending.pop(task_id, None)
+
+            if timings is not None:
+                timings.update(worker_timings)
+            if detections is not None:
+                detections.update(detection)
+
+            encode_start = time.perf_counter()
+            if not len(detection["boxes"]) and image_bytes is not None:
+                source_jpeg = await self._run_cpu(image_ingest.passthrough_jpeg, image_bytes, shape)
+                encode = partial(encode, source_jpeg=source_jpeg)
+            result = await self._run_cpu(encode, frame)
+            if timings is not None:
+                timings["encode"] = time.perf_counter() - encode_start
+            return result, len(detection["boxes"])
+        finally:
+            del frame
+            self._free_slots.put_nowait(slot)
+
+    def close(self):
+        """Stop the workers and free all shared memory."""
+        for _ in self._processes:
+            self._task_queue.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._result_queue.put(None)
+        for slot in self._slots:
+            slot.release()
+
+
+# Singleton instance for reuse
+_pool_instance: Optional[InferencePool] = None
+
+
+def get_inference_pool(
+    processor_kwargs: Optional[Dict[str, Any]] = None,
+    run_cpu: Optional[Callable[..., Any]] = None
+) -> Optional[InferencePool]:
+    """
+    Get or create the singleton InferencePool.
+
+    Args:
+        processor_kwargs: Keyword arguments for FaceProcessor in each worker
+        run_cpu: Awaitable runner for CPU work in this process
+
+    Returns:
+        InferencePool instance, or None when INFERENCE_WORKERS is 0
+    """
+    global _pool_instance
+
+    if INFERENCE_WORKERS <= 0:
+        return None
+
+    if _pool_instance is None:
+        _pool_instance = InferencePool(processor_kwargs=processor_kwargs, run_cpu=run_cpu)
+
+    return _pool_instance
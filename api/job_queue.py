@@ -0,0 +1,444 @@
+import asyncio
+import ipaddress
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+from aiohttp.abc import AbstractResolver
+
+
+# SQLite file holding queued and finished jobs; mount a volume here so queued jobs survive a redeploy
+JOB_DB_PATH = os.environ.get("JOB_DB_PATH", "/app/data/jobs.db")
+# Number of jobs processed concurrently per API process (independent of HTTP workers)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+# Seconds an idle job worker waits before checking the database again
+# (new submissions in this process wake workers immediately)
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", "1"))
+# Seconds a running job is leased to its worker; expired leases are requeued
+# (a worker that crashed or was restarted mid-job)
+JOB_LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", "300"))
+# Attempts before a job that keeps losing its worker is marked failed
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+# Seconds finished jobs stay available for polling
+JOB_RETENTION_SECONDS = float(os.environ.get("JOB_RETENTION_SECONDS", str(24 * 3600)))
+# Most jobs waiting in the queue; further submissions are refused until it drains
+JOB_MAX_QUEUED = int(os.environ.get("JOB_MAX_QUEUED", "1000"))
+# Callback delivery: timeout per attempt (seconds) and number of attempts
+JOB_CALLBACK_TIMEOUT = float(os.environ.get("JOB_CALLBACK_TIMEOUT", "10"))
+JOB_CALLBACK_ATTEMPTS = int(os.environ.get("JOB_CALLBACK_ATTEMPTS", "3"))
+# Comma-separated hosts callbacks may be sent to (".example.com" allows example.com
+# and its subdomains); empty allows any host that resolves to a public address
+JOB_CALLBACK_HOSTS = [h.strip().lower() for h in os.environ.get("JOB_CALLBACK_HOSTS", "").split(",") if h.strip()]
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    payload TEXT NOT NULL,
+    callback_url TEXT,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    lease_expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority DESC, created_at);
+"""
+
+
+def _is_public_address(address: str) -> bool:
+    """Whether an IP address is globally routable (not private, loopback, link-local, reserved, ...)."""
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def validate_callback_url(url: str, allowed_hosts: List[str] = JOB_CALLBACK_HOSTS) -> str:
+    """
+    Check a job callback URL before anything is sent to it.
+    Host names are checked again when they are resolved (see _PublicResolver),
+    so a name pointing at an internal address is refused as well.
+
+    Args:
+        url: Callback URL supplied by the client
+        allowed_hosts: Allowed hosts (".example.com" also allows subdomains); empty allows any
+
+    Returns:
+        The URL
+
+    Raises:
+        ValueError: When the URL is not https, names a host outside allowed_hosts
+            or a non-public IP address
+    """
+    parts = urlsplit(url)
+    if parts.scheme != "https" or not parts.hostname:
+        raise ValueError("callbackUrl must be an https URL")
+    host = parts.hostname.lower()
+    if allowed_hosts and not any(
+        host == allowed.lstrip(".") or (allowed.startswith(".") and host.endswith(allowed)) for allowed in allowed_hosts
+    ):
+        raise ValueError(f"callbackUrl host is not allowed: {host}")
+    try:
+        is_public = _is_public_address(host)
+    except ValueError:
+        # A host name, checked when it is resolved
+        return url
+    if not is_public:
+        raise ValueError(f"callbackUrl must not point at a private or local address: {host}")
+    return url
+
+
+class _PublicResolver(AbstractResolver):
+    """DNS resolver for callbacks that only returns public addresses, so callbacks cannot reach internal hosts."""
+
+    def __init__(self):
+        self._resolver = aiohttp.DefaultResolver()
+
+    async def resolve(self, host: str, port: int = 0, family: socket.AddressFamily = socket.AF_INET):
+        hosts = [h for h in await self._resolver.resolve(host, port, family) if _is_public_address(h["host"])]
+        if not hosts:
+            raise OSError(f"{host} does not resolve to a public address")
+        return hosts
+
+    async def close(self):
+        await self._resolver.close()
+
+
+class JobQueueFull(RuntimeError):
+    """Raised when a job is submitted while max_queued jobs are already waiting."""
+
+
+class JobQueue:
+    """
+    Durable priority queue of processing jobs backed by SQLite.
+    Jobs are claimed with a lease inside a write transaction, so several
+    API processes can share one database file; jobs whose worker died are
+    requeued once their lease expires.
+    """
+
+    def __init__(
+        self,
+        path: str = JOB_DB_PATH,
+        workers: int = JOB_WORKERS,
+        poll_interval: float = JOB_POLL_INTERVAL,
+        lease_seconds: float = JOB_LEASE_SECONDS,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+        retention_seconds: float = JOB_RETENTION_SECONDS,
+        max_queued: int = JOB_MAX_QUEUED
+    ):
+        """
+        Initialize the queue and create the database if needed (workers are started by start()).
+        Raises OSError or sqlite3.Error when the database cannot be created or opened.
+
+        Args:
+            path: SQLite database file
+            workers: Number of concurrent job workers in this process
+            poll_interval: Seconds an idle worker waits between database checks
+            lease_seconds: Seconds before a running job is considered abandoned
+            max_attempts: Attempts before an abandoned job is marked failed
+            retention_seconds: Seconds finished jobs are kept
+            max_queued: Most jobs waiting to run before submit raises JobQueueFull
+        """
+        self.path = path
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.retention_seconds = retention_seconds
+        self.max_queued = max(1, max_queued)
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        try:
+            self._db.row_factory = sqlite3.Row
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+        except sqlite3.Error:
+            self._db.close()
+            raise
+        self._lock = threading.Lock()
+
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: list = []
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    # Database access (blocking; called through asyncio.to_thread)
+
+    def _submit(self, payload: Dict[str, Any], priority: int, callback_url: Optional[str]) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            # Count and insert in one write transaction, so processes sharing the file respect the limit
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                (queued,) = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()
+                if queued >= self.max_queued:
+                    raise JobQueueFull(f"Job queue full ({queued} jobs waiting)")
+                self._db.execute(
+                    "INSERT INTO jobs (id, status, priority, payload, callback_url, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (job_id, QUEUED, priority, json.dumps(payload), callback_url, time.time())
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return self._get(job_id)
+
+    def _get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job_dict(row) if row is not None else None
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """Lease the highest-priority queued (or abandoned) job to this worker."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                # Abandoned jobs that used up their attempts are failed instead of retried forever
+                self._db.execute(
+                    "UPDATE jobs SET status = ?, error = ?, finished_at = ? "
+                    "WHERE status = ? AND lease_expires_at < ? AND attempts >= ?",
+                    (FAILED, "Job abandoned by its worker too many times", now, RUNNING, now, self.max_attempts)
+                )
+                row = self._db.execute(
+                    "SELECT * FROM jobs WHERE status = ? OR (status = ? AND lease_expires_at < ?) "
+                    "ORDER BY priority DESC, created_at LIMIT 1",
+                    (QUEUED, RUNNING, now)
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, started_at = ?, lease_expires_at = ? "
+                        "WHERE id = ?",
+                        (RUNNING, now, now + self.lease_seconds, row["id"])
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return row
+
+    def _finish(self, job_id: str, result: Optional[Dict[str, Any]], error: Optional[str]) -> Dict[str, Any]:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_expires_at = NULL "
+                "WHERE id = ?",
+                (
+                    FAILED if error is not None else SUCCEEDED,
+                    json.dumps(result) if result is not None else None,
+                    error, time.time(), job_id
+                )
+            )
+        return self._get(job_id)
+
+    def _purge(self):
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (SUCCEEDED, FAILED, time.time() - self.retention_seconds)
+            )
+
+    def _counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    # Async API
+
+    async def submit(
+        self,
+        payload: Dict[str, Any],
+        priority: int = 0,
+        callback_url: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Queue a job.
+
+        Args:
+            payload: JSON-serializable request passed to the job handler
+            priority: Higher priorities run first; equal priorities run in submission order
+            callback_url: URL that receives the finished job as a JSON POST
+                (checked with validate_callback_url when it is sent)
+
+        Returns:
+            The queued job (see get)
+
+        Raises:
+            JobQueueFull: When max_queued jobs are already waiting
+        """
+        job = await asyncio.to_thread(self._submit, payload, priority, callback_url)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a job.
+
+        Args:
+            job_id: Job id returned by submit
+
+        Returns:
+            Dict with id, status, priority, attempts, timestamps, result and
+            error, or None for unknown (or purged) jobs
+        """
+        return await asyncio.to_thread(self._get, job_id)
+
+    async def counts(self) -> Dict[str, int]:
+        """Number of jobs per status."""
+        return await asyncio.to_thread(self._counts)
+
+    def start(self, handler: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]):
+        """
+        Start the job workers on the running event loop.
+
+        Args:
+            handler: Coroutine called with a job payload; its return value is
+                stored as the job result, an exception marks the job failed
+        """
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._work(handler), name=f"job-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def _work(self, handler: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]):
+        # Nothing awaits the worker tasks: an error must not end the loop
+        # (cancellation on shutdown still does)
+        while True:
+            try:
+                await self._work_once(handler)
+            except Exception as e:
+                # A job left running is requeued when its lease expires
+                print(f"Warning: job worker error: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _work_once(self, handler: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]):
+        """Run one queued job, or wait for one when the queue is empty."""
+        try:
+            row = await asyncio.to_thread(self._claim)
+        except sqlite3.Error as e:
+            print(f"Warning: could not claim job: {e}")
+            row = None
+
+        if row is None:
+            await asyncio.to_thread(self._purge)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            return
+
+        result = error = None
+        try:
+            result = await handler(json.loads(row["payload"]))
+        except asyncio.CancelledError:
+            # Shutting down: the lease expires and another worker picks the job up
+            raise
+        except Exception as e:
+            error = str(getattr(e, "detail", None) or e)
+
+        job = await asyncio.to_thread(self._finish, row["id"], result, error)
+        if row["callback_url"]:
+            await self._send_callback(row["callback_url"], job)
+
+    async def _send_callback(self, url: str, job: Dict[str, Any]):
+        """POST the finished job to its callback URL, retrying with backoff."""
+        try:
+            validate_callback_url(url)
+        except ValueError as e:
+            print(f"Warning: job {job['id']} callback not sent: {e}")
+            return
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(resolver=_PublicResolver()),
+                timeout=aiohttp.ClientTimeout(total=JOB_CALLBACK_TIMEOUT)
+            )
+        for attempt in range(JOB_CALLBACK_ATTEMPTS):
+            try:
+                # Redirects are not followed: they could lead anywhere
+                async with self._session.post(url, json=job, allow_redirects=False) as response:
+                    if response.status < 500:
+                        if response.status >= 400:
+                            print(f"Warning: job {job['id']} callback rejected: HTTP {response.status}")
+                        return
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Warning: job {job['id']} callback failed: {e}")
+            if attempt < JOB_CALLBACK_ATTEMPTS - 1:
+                await asyncio.sleep(2 ** attempt)
+
+    async def close(self):
+        """Stop the workers (running jobs are requeued when their lease expires)."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        with self._lock:
+            self._db.close()
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat() if timestamp is not None else None
+
+
+def _job_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "status": row["status"],
+        "priority": row["priority"],
+        "attempts": row["attempts"],
+        "createdAt": _isoformat(row["created_at"]),
+        "startedAt": _isoformat(row["started_at"]),
+        "finishedAt": _isoformat(row["finished_at"]),
+        "result": json.loads(row["result"]) if row["result"] else None,
+        "error": row["error"]
+    }
+
+
+# Singleton instance for reuse
+_queue_instance: Optional[JobQueue] = None
+
+
+def get_job_queue() -> Optional[JobQueue]:
+    """
+    Get or create the singleton JobQueue.
+
+    Returns:
+        JobQueue instance, or None when JOB_WORKERS is 0 or the job database
+        cannot be opened (asynchronous jobs disabled)
+    """
+    global _queue_instance
+
+    if JOB_WORKERS <= 0:
+        return None
+
+    if _queue_instance is None:
+        try:
+            _queue_instance = JobQueue()
+        except (OSError, sqlite3.Error) as e:
+            # The rest of the API keeps working; only the job endpoints are disabled
+            print(f"Warning: asynchronous jobs disabled, could not open {JOB_DB_PATH}: {e}")
+            return None
+
+    return _queue_instance
@@ -0,0 +1,185 @@
+import asyncio
+import os
+import time
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import metrics
+from geo_index import GeoIndex
+
+
+# Seconds a market snapshot is served before it is refreshed in the background (0 disables the snapshot)
+MARKET_SNAPSHOT_TTL = float(os.environ.get("MARKET_SNAPSHOT_TTL", "900"))
+# Days after today covered by the snapshot; longer look-aheads query the database directly
+MARKET_SNAPSHOT_DAYS = int(os.environ.get("MARKET_SNAPSHOT_DAYS", "90"))
+# Seconds before a failed refresh is retried while the previous snapshot keeps being served
+MARKET_SNAPSHOT_RETRY_SECONDS = float(os.environ.get("MARKET_SNAPSHOT_RETRY_SECONDS", "30"))
+# File touched by scraper_cron after every scrape; when it is newer than the
+# snapshot, the next market request refreshes it
+MARKET_SCRAPE_STAMP = os.environ.get("MARKET_SCRAPE_STAMP", "/app/data/markets.scraped")
+
+
+class Snapshot(NamedTuple):
+    """Immutable set of upcoming markets, replaced as a whole on refresh."""
+    generation: int
+    loaded_at: float  # time.monotonic() when loaded
+    scrape_stamp: float  # mtime of MARKET_SCRAPE_STAMP when the load started
+    start: date
+    end: date
+    markets: tuple  # market dicts (treat as read-only), start_date between start and end
+    geo: GeoIndex  # market coordinates, by position in markets
+    encoded: tuple  # encode(market) by position in markets (e.g. pre-serialized JSON), empty without encode
+
+    @property
+    def age(self) -> float:
+        """Seconds since the snapshot was loaded."""
+        return time.monotonic() - self.loaded_at
+
+    def covers(self, start: date, end: date) -> bool:
+        """Whether every market starting between start and end is in the snapshot."""
+        return self.start <= start and end <= self.end
+
+
+def mark_scraped(path: str = MARKET_SCRAPE_STAMP):
+    """Touch the scrape stamp so API processes refresh their market snapshot."""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a"):
+        os.utime(path)
+
+
+class MarketSnapshot:
+    """
+    In-memory snapshot of the markets starting in the next MARKET_SNAPSHOT_DAYS.
+    Market reads filter the snapshot instead of querying the database. A
+    snapshot older than the TTL, or older than the last scrape, is still
+    served while a single background refresh replaces it; only a missing
+    snapshot (or one that no longer covers the requested days) makes the
+    request wait. Concurrent refreshes are coalesced into one load.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[date, date], List[Dict[str, Any]]],
+        encode: Optional[Callable[[Dict[str, Any]], Any]] = None,
+        ttl: float = MARKET_SNAPSHOT_TTL,
+        days: int = MARKET_SNAPSHOT_DAYS,
+        retry_seconds: float = MARKET_SNAPSHOT_RETRY_SECONDS,
+        stamp_path: str = MARKET_SCRAPE_STAMP
+    ):
+        """
+        Initialize the snapshot (loaded on first use).
+
+        Args:
+            fetch: Blocking loader returning the markets that start between two dates (inclusive)
+            encode: Per-market work done once per snapshot instead of per request
+                (e.g. serializing it), kept in Snapshot.encoded
+            ttl: Seconds before a snapshot is refreshed (0 disables the snapshot)
+            days: Days after today covered by the snapshot
+            retry_seconds: Seconds before a failed background refresh is retried
+            stamp_path: File touched after every scrape
+        """
+        self.fetch = fetch
+        self.encode = encode
+        self.ttl = ttl
+        self.days = max(0, days)
+        self.retry_seconds = retry_seconds
+        self.stamp_path = stamp_path
+        self._snapshot: Optional[Snapshot] = None
+        self._generation = 0
+        self._failed_at = float("-inf")
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    async def get(self, start: date, end: date) -> Optional[Snapshot]:
+        """
+        Snapshot covering the markets that start between start and end.
+
+        Args:
+            start: First start date needed (usually today)
+            end: Last start date needed
+
+        Returns:
+            Snapshot, or None when the snapshot is disabled or the range is
+            longer than it covers (query the database instead)
+
+        Raises:
+            Exception: From fetch, when no usable snapshot exists and loading fails
+        """
+        if not self.enabled or (end - start).days > self.days:
+            return None
+
+        snapshot = self._snapshot
+        if snapshot is None:
+            return await self.refresh("cold")
+        if not snapshot.covers(start, end):
+            # The day rolled over since the snapshot was loaded
+            return await self.refresh("window")
+
+        reason = None
+        if self._scrape_stamp() > snapshot.scrape_stamp:
+            reason = "scrape"
+        elif snapshot.age > self.ttl:
+            reason = "ttl"
+        if reason is not None and time.monotonic() - self._failed_at >= self.retry_seconds:
+            self._start_refresh(reason)
+        return snapshot
+
+    async def refresh(self, reason: str = "manual") -> Snapshot:
+        """
+        Load a new snapshot, or join the load already in progress.
+
+        Args:
+            reason: Metrics label (cold, window, scrape, ttl, manual)
+
+        Returns:
+            The new snapshot
+        """
+        # Shielded: a cancelled request must not cancel the load other requests wait for
+        return await asyncio.shield(self._start_refresh(reason))
+
+    def _start_refresh(self, reason: str) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._load(reason), name="market-snapshot-refresh")
+            # Background refreshes nobody awaits must not log "exception never retrieved"
+            self._task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return self._task
+
+    async def _load(self, reason: str) -> Snapshot:
+        start = date.today()
+        end = start + timedelta(days=self.days)
+        # Read before loading, so a scrape finishing mid-load triggers another refresh
+        stamp = self._scrape_stamp()
+        load_start = time.perf_counter()
+        try:
+            markets, geo, encoded = await asyncio.to_thread(self._fetch_indexed, start, end)
+        except Exception as e:
+            self._failed_at = time.monotonic()
+            metrics.MARKET_SNAPSHOT_REFRESHES.inc(reason=reason, result="error")
+            if self._snapshot is not None:
+                print(f"Warning: market snapshot refresh failed, serving generation {self._snapshot.generation}: {e}")
+            raise
+        metrics.observe_stage("markets_snapshot_load", time.perf_counter() - load_start)
+
+        self._generation += 1
+        self._snapshot = Snapshot(self._generation, time.monotonic(), stamp, start, end, tuple(markets), geo, encoded)
+        metrics.MARKET_SNAPSHOT_REFRESHES.inc(reason=reason, result="ok")
+        metrics.MARKET_SNAPSHOT_GENERATION.set(self._generation)
+        metrics.MARKET_SNAPSHOT_LOADED.set(time.time())
+        metrics.MARKET_SNAPSHOT_MARKETS.set(len(markets))
+        return self._snapshot
+
+    def _fetch_indexed(self, start: date, end: date):
+        markets = self.fetch(start, end)
+        geo = GeoIndex([(market.get('latitude'), market.get('longitude')) for market in markets])
+        encoded = tuple(self.encode(market) for market in markets) if self.encode is not None else ()
+        return markets, geo, encoded
+
+    def _scrape_stamp(self) -> float:
+        try:
+            return os.stat(self.stamp_path).st_mtime
+        except OSError:
+            return 0.0
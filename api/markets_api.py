@@ -0,0 +1,380 @@
+from fastapi import APIRouter, HTTPException, Query, BackgroundTasks, Response
+from pydantic import BaseModel, create_model
+import asyncio, json, os, time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Literal, Optional
+from uuid import UUID
+from supabase import create_client, Client
+import metrics
+from geo_index import haversine_km
+from market_snapshot import MarketSnapshot, Snapshot
+
+# Market reads and the scraper trigger. Imports nothing from the image pipeline
+# (OpenCV, NumPy, face model), so market-only replicas start fast and stay small.
+
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+SUPABASE_SERVICE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+
+# Rows requested per PostgREST call when loading markets (PostgREST caps responses at 1000 by default)
+SNAPSHOT_PAGE_SIZE = 1000
+
+# Supabase client for market queries (created on first use, see get_supabase)
+supabase: Optional[Client] = None
+
+router = APIRouter()
+
+def get_supabase() -> Client:
+    """Supabase client for market queries, created on first use"""
+    global supabase
+    if supabase is None:
+        supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+    return supabase
+
+class MarketResponse(BaseModel):
+    id: str
+    external_id: str
+    name: str
+    municipality: Optional[str]
+    category: str
+    start_date: date
+    end_date: date
+    address: Optional[str]
+    city: Optional[str]
+    postal_code: Optional[str]
+    latitude: Optional[float]
+    longitude: Optional[float]
+    description: Optional[str]
+    organizer_name: Optional[str]
+    organizer_phone: Optional[str]
+    organizer_email: Optional[str]
+    organizer_website: Optional[str]
+    opening_hours: Optional[str]
+    entry_fee: Optional[float]
+    stall_count: Optional[int]
+    has_food: bool
+    has_parking: bool
+    has_toilets: bool
+    has_wifi: bool
+    is_indoor: bool
+    is_outdoor: bool
+    special_features: Optional[str]
+    source_url: Optional[str]
+    loppemarkeder_nu: Optional[dict]  # Raw metadata from loppemarkeder.nu
+    scraped_at: datetime
+    distance: Optional[float] = None  # Calculated distance in km
+
+def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Calculate distance between two points using Haversine formula"""
+    return haversine_km(lat1, lon1, lat2, lon2)
+
+# Columns of the markets table returned by the API (every MarketResponse field but the computed distance)
+MARKET_COLUMNS = [name for name in MarketResponse.model_fields if name != 'distance']
+
+# Named field sets for market lists (?view=). The raw loppemarkeder_nu metadata
+# (whole scraped events, HTML included) is only returned by GET /markets/{market_id}.
+MARKET_VIEWS = {
+    "list": [name for name in MarketResponse.model_fields if name != 'loppemarkeder_nu'],
+    "map": ['id', 'name', 'category', 'start_date', 'end_date', 'latitude', 'longitude', 'distance'],
+    "detail": MARKET_COLUMNS,
+}
+
+# Views offered by the list endpoints (detail is GET /markets/{market_id})
+LIST_VIEWS = ("list", "map")
+
+# Columns always read because the endpoints filter, sort or measure distances with them
+FILTER_COLUMNS = {'id', 'start_date', 'end_date', 'latitude', 'longitude'}
+
+# Market list item: any subset of the "list" fields; unselected fields are left
+# unset and omitted from the response (response_model_exclude_unset)
+MarketSummary = create_model(
+    'MarketSummary',
+    **{name: (Optional[MarketResponse.model_fields[name].annotation], None) for name in MARKET_VIEWS['list']}
+)
+
+def resolve_fields(view: str, fields: Optional[str]) -> List[str]:
+    """Response fields of a list view, or of an explicit comma-separated field list (which wins)"""
+    if not fields:
+        return MARKET_VIEWS[view]
+    requested = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in requested if field not in MARKET_VIEWS['list']]
+    if unknown or not requested:
+        raise HTTPException(
+            400,
+            f"Unknown fields: {', '.join(unknown) or '(none given)'}. "
+            f"Available: {', '.join(MARKET_VIEWS['list'])} (loppemarkeder_nu only via /markets/{{market_id}})"
+        )
+    # Fields are returned in MarketResponse order, whatever order they were asked in
+    return [field for field in MARKET_VIEWS['list'] if field in requested]
+
+def select_columns(fields: List[str]) -> List[str]:
+    """Table columns to read for a set of response fields"""
+    return [name for name in MARKET_COLUMNS if name in fields or name in FILTER_COLUMNS]
+
+def market_json(market: dict) -> dict:
+    """JSON values of a market's list fields, exactly as the response model serializes them"""
+    return MarketSummary(**{field: market.get(field) for field in MARKET_VIEWS['list']}).model_dump(mode='json')
+
+def encode_fields(values: dict, fields: List[str]) -> str:
+    """Members of a JSON object (no braces) in the same compact form as FastAPI's JSONResponse"""
+    return ','.join(
+        json.dumps(field) + ':' + json.dumps(values[field], ensure_ascii=False, allow_nan=False, separators=(',', ':'))
+        for field in fields
+    )
+
+def encode_view(values: dict, view: str) -> str:
+    """A market's JSON in a named view, open-ended: distance (always the last field) is added per request"""
+    return '{' + encode_fields(values, [field for field in MARKET_VIEWS[view] if field != 'distance'])
+
+def encode_market(market: dict) -> Dict[str, str]:
+    """Pre-serialized JSON of a market for every list view, computed once per snapshot"""
+    values = market_json(market)
+    return {view: encode_view(values, view) for view in LIST_VIEWS}
+
+def render_markets(items: List[tuple], fields: List[str], view: Optional[str], headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Serialize a market list straight to JSON bytes, skipping per-row model validation.
+    items are (market, encoded, distance) with encoded from encode_market (or None);
+    view selects a pre-serialized view, None encodes an explicit field list.
+    The bytes equal what response_model would produce.
+    """
+    parts = []
+    for market, encoded, distance in items:
+        if view is None:
+            values = market_json(market)
+            values['distance'] = distance
+            parts.append('{' + encode_fields(values, fields) + '}')
+            continue
+        fragment = encoded[view] if encoded is not None else encode_view(market_json(market), view)
+        if 'distance' in fields:
+            fragment += ',"distance":' + json.dumps(distance)
+        parts.append(fragment + '}')
+    return Response(('[' + ','.join(parts) + ']').encode(), media_type='application/json', headers=headers)
+
+def market_fields(market: dict) -> dict:
+    """MarketResponse fields of a markets row (dates parsed)"""
+    market_dict = dict(market)
+    if market.get('start_date'):
+        market_dict['start_date'] = date.fromisoformat(market['start_date'])
+    if market.get('end_date'):
+        market_dict['end_date'] = date.fromisoformat(market['end_date'])
+    if market.get('scraped_at'):
+        market_dict['scraped_at'] = datetime.fromisoformat(market['scraped_at'].replace('Z', '+00:00'))
+    return market_dict
+
+def fetch_all(build_query) -> List[dict]:
+    """Every row of a markets query (build_query returns a fresh one per page), in id order, as MarketResponse fields"""
+    rows = []
+    while True:
+        page = build_query().order('id').range(len(rows), len(rows) + SNAPSHOT_PAGE_SIZE - 1).execute().data
+        rows.extend(page)
+        if len(page) < SNAPSHOT_PAGE_SIZE:
+            break
+    return [market_fields(row) for row in rows]
+
+def fetch_markets(start: date, end: date, columns: List[str] = select_columns(MARKET_VIEWS['list'])) -> List[dict]:
+    """Markets starting between start and end (inclusive), all pages, as MarketResponse fields"""
+    return fetch_all(
+        lambda: get_supabase().table('markets').select(','.join(columns))
+        .gte('start_date', start.isoformat()).lte('start_date', end.isoformat())
+    )
+
+def fetch_todays_markets(today: date, columns: List[str], limit: Optional[int] = None) -> List[dict]:
+    """
+    Markets active today as MarketResponse fields: the first limit by start
+    date (then id, like the snapshot path), or all of them when limit is None
+    (e.g. to sort them by distance before cutting to the limit).
+    """
+    def build_query():
+        return get_supabase().table('markets').select(','.join(columns)) \
+            .gte('start_date', today.isoformat()).lte('end_date', today.isoformat())
+
+    if limit is None:
+        return fetch_all(build_query)
+    rows = build_query().order('start_date').order('id').limit(limit).execute().data
+    return [market_fields(row) for row in rows]
+
+def fetch_nearby_markets(
+    latitude: float, longitude: float, radius_km: float, start: date, end: date, limit: int, columns: List[str]
+) -> List[dict]:
+    """Nearest markets starting between start and end via the nearby_markets RPC (columns plus distance)"""
+    return get_supabase().rpc('nearby_markets', {
+        'user_latitude': latitude,
+        'user_longitude': longitude,
+        'radius_km': radius_km,
+        'from_date': start.isoformat(),
+        'to_date': end.isoformat(),
+        'max_results': limit
+    }).select('distance', *[f'market->{column}' for column in columns]).execute().data
+
+# Upcoming markets served from memory (list columns only, pre-serialized per view);
+# refreshed on a TTL and after every scrape
+market_snapshot = MarketSnapshot(fetch_markets, encode=encode_market)
+
+def report_snapshot(trace, snapshot: Optional[Snapshot]) -> Dict[str, str]:
+    """Response headers exposing the snapshot generation and age (also recorded on the trace)"""
+    if snapshot is None:
+        return {}
+    trace.attributes['snapshotGeneration'] = snapshot.generation
+    return {
+        'X-Market-Snapshot-Generation': str(snapshot.generation),
+        'X-Market-Snapshot-Age': str(int(snapshot.age))
+    }
+
+@router.get("/markets/today", response_model=List[MarketSummary], response_model_exclude_unset=True)
+async def get_todays_markets(
+    latitude: Optional[float] = Query(None, description="User's latitude for distance calculation"),
+    longitude: Optional[float] = Query(None, description="User's longitude for distance calculation"),
+    limit: int = Query(50, description="Maximum number of markets to return"),
+    view: Literal["list", "map"] = Query("list", description="Named field set: list (everything but the raw metadata) or map (pins)"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (overrides view)")
+):
+    """Get markets happening today"""
+    selected = resolve_fields(view, fields)
+    with metrics.request_trace("markets_today") as trace:
+        try:
+            today = date.today()
+
+            with metrics.stage_timer("markets_query"):
+                snapshot = await market_snapshot.get(today, today)
+                if snapshot is not None:
+                    rows = [
+                        (market, snapshot.encoded[i]) for i, market in enumerate(snapshot.markets)
+                        if market['start_date'] >= today and market['end_date'] <= today
+                    ]
+                else:
+                    # Query markets that are active today; sorting by distance needs all of
+                    # them, by start date only the first limit (the database sorts those)
+                    by_distance = latitude is not None and longitude is not None
+                    rows = [(market, None) for market in await asyncio.to_thread(
+                        fetch_todays_markets, today, select_columns(selected), None if by_distance else limit
+                    )]
+
+            build_start = time.perf_counter()
+            markets = []
+            for market, encoded in rows:
+                distance = None
+
+                # Calculate distance if coordinates provided
+                if latitude is not None and longitude is not None and market.get('latitude') and market.get('longitude'):
+                    distance = calculate_distance(
+                        latitude, longitude,
+                        market['latitude'], market['longitude']
+                    )
+
+                markets.append((market, encoded, distance))
+
+            # Sort by distance if coordinates provided, otherwise by start date
+            if latitude is not None and longitude is not None:
+                markets.sort(key=lambda x: x[2] or float('inf'))
+            else:
+                markets.sort(key=lambda x: x[0]['start_date'])
+
+            result = render_markets(markets[:limit], selected, None if fields else view, report_snapshot(trace, snapshot))
+            metrics.observe_stage("markets_build", time.perf_counter() - build_start)
+            return result
+
+        except Exception as e:
+            raise HTTPException(500, f"Error fetching today's markets: {str(e)}")
+
+@router.get("/markets/nearby", response_model=List[MarketSummary], response_model_exclude_unset=True)
+async def get_nearby_markets(
+    latitude: float = Query(..., description="User's latitude"),
+    longitude: float = Query(..., description="User's longitude"),
+    radius_km: float = Query(50.0, description="Search radius in kilometers"),
+    days_ahead: int = Query(30, description="Number of days to look ahead"),
+    limit: int = Query(50, description="Maximum number of markets to return"),
+    view: Literal["list", "map"] = Query("list", description="Named field set: list (everything but the raw metadata) or map (pins)"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (overrides view)")
+):
+    """Get markets within a certain radius and time frame"""
+    selected = resolve_fields(view, fields)
+    with metrics.request_trace("markets_nearby") as trace:
+        try:
+            today = date.today()
+            end_date = today + timedelta(days=days_ahead)
+
+            with metrics.stage_timer("markets_query"):
+                snapshot = await market_snapshot.get(today, end_date)
+                if snapshot is not None:
+                    markets = snapshot.markets
+                else:
+                    # Radius, date window, ordering, limit and columns are applied in Postgres
+                    markets = await asyncio.to_thread(
+                        fetch_nearby_markets, latitude, longitude, radius_km, today, end_date, limit,
+                        select_columns(selected)
+                    )
+                    markets = [market_fields(row) for row in markets]
+
+            # (position, distance) of the closest markets within the radius, by distance
+            with metrics.stage_timer("markets_search"):
+                if snapshot is not None:
+                    # Only the grid cells around the user are examined
+                    matches = snapshot.geo.nearest(
+                        latitude, longitude, limit, max_km=radius_km,
+                        predicate=lambda i: today <= markets[i]['start_date'] <= end_date
+                    )
+                else:
+                    matches = [(i, market['distance']) for i, market in enumerate(markets)]
+
+            build_start = time.perf_counter()
+            result = render_markets(
+                [(markets[i], snapshot.encoded[i] if snapshot is not None else None, distance) for i, distance in matches[:limit]],
+                selected, None if fields else view, report_snapshot(trace, snapshot)
+            )
+
+            metrics.observe_stage("markets_build", time.perf_counter() - build_start)
+            return result
+
+        except Exception as e:
+            raise HTTPException(500, f"Error fetching nearby markets: {str(e)}")
+
+@router.get("/markets/{market_id}", response_model=MarketResponse)
+async def get_market(market_id: UUID):
+    """Get one market with every field, including the raw loppemarkeder.nu metadata"""
+    with metrics.request_trace("market_detail"):
+        try:
+            with metrics.stage_timer("markets_query"):
+                query = get_supabase().table('markets').select(','.join(MARKET_VIEWS['detail'])).eq('id', str(market_id))
+                rows = (await asyncio.to_thread(query.limit(1).execute)).data
+        except Exception as e:
+            raise HTTPException(500, f"Error fetching market: {str(e)}")
+
+        if not rows:
+            raise HTTPException(404, f"Market {market_id} not found")
+        return MarketResponse(**market_fields(rows[0]))
+
+@router.post("/scraper/trigger")
+async def trigger_scraper(background_tasks: BackgroundTasks):
+    """Manually trigger the market scraper (runs in background)"""
+    try:
+        import subprocess
+        import sys
+        
+        def run_scraper_background():
+            """Run scraper in background without blocking API"""
+            try:
+                print("Starting background scraper task...")
+                # Use Popen instead of run to avoid blocking
+                process = subprocess.Popen(
+                    [sys.executable, "/app/scraper_cron.py"],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    cwd="/app"
+                )
+                print(f"Scraper process started with PID: {process.pid}")
+                # Don't wait for completion - let it run in background
+                # Process will be monitored by the scheduler
+            except Exception as e:
+                print(f"Error starting scraper: {str(e)}")
+        
+        # Add to background tasks
+        background_tasks.add_task(run_scraper_background)
+        
+        return {
+            "success": True,
+            "message": "Scraper triggered successfully in background",
+            "note": "The scraper will run asynchronously. Check logs for progress."
+        }
+
+    except Exception as e:
+        raise HTTPException(500, f"Error triggering scraper: {str(e)}")
@@ -0,0 +1,287 @@
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+
+# Fraction of requests whose per-stage timings are logged as one JSON line (0 disables)
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0"))
+
+# Prometheus' default buckets plus a tail for large photos and slow storage
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], le: Optional[str] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with optional labels (Prometheus counter)."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return "\n".join(lines)
+
+
+class Gauge:
+    """Value that can go up and down, with optional labels (Prometheus gauge)."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return "\n".join(lines)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels (Prometheus histogram)."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (per-bucket counts, sum, count)
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, [list(s[0]), s[1], s[2]]) for key, s in self._series.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, str(bound))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, '+Inf')} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return "\n".join(lines)
+
+
+STAGE_SECONDS = Histogram(
+    "loppestars_stage_duration_seconds",
+    "Time spent per pipeline stage (storage, OpenCV, Supabase queries, Python post-processing)",
+    ["stage"]
+)
+REQUEST_SECONDS = Histogram(
+    "loppestars_request_duration_seconds",
+    "End-to-end request latency per endpoint",
+    ["endpoint"]
+)
+FACES_DETECTED = Counter(
+    "loppestars_faces_detected_total",
+    "Faces detected and anonymized",
+    ["endpoint"]
+)
+IMAGES_PROCESSED = Counter(
+    "loppestars_images_processed_total",
+    "Images processed (excluding cache hits)",
+    ["endpoint"]
+)
+CACHE_REQUESTS = Counter(
+    "loppestars_result_cache_requests_total",
+    "Result cache lookups by outcome",
+    ["result"]
+)
+DETECTION_CACHE_REQUESTS = Counter(
+    "loppestars_detection_cache_requests_total",
+    "Stored detection lookups by outcome (a hit skips face detection)",
+    ["result"]
+)
+NO_FACE_PRECHECKS = Counter(
+    "loppestars_no_face_prechecks_total",
+    "No-face pre-checks by outcome (skipped = detection and anonymization skipped)",
+    ["result"]
+)
+MARKET_SNAPSHOT_REFRESHES = Counter(
+    "loppestars_market_snapshot_refreshes_total",
+    "Market snapshot loads by trigger (cold, window, scrape, ttl) and outcome",
+    ["reason", "result"]
+)
+MARKET_SNAPSHOT_GENERATION = Gauge(
+    "loppestars_market_snapshot_generation",
+    "Generation of the market snapshot being served (incremented on every load)"
+)
+MARKET_SNAPSHOT_LOADED = Gauge(
+    "loppestars_market_snapshot_loaded_timestamp_seconds",
+    "Unix time the market snapshot being served was loaded"
+)
+MARKET_SNAPSHOT_MARKETS = Gauge(
+    "loppestars_market_snapshot_markets",
+    "Markets in the snapshot being served"
+)
+ADMISSION_REJECTIONS = Counter(
+    "loppestars_admission_rejections_total",
+    "Image requests shed by admission control (queue_full, queue_timeout, rate_limited)",
+    ["reason"]
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "loppestars_admission_in_flight",
+    "Processing slots currently held (batches count once per image)"
+)
+ADMISSION_QUEUED = Gauge(
+    "loppestars_admission_queued",
+    "Requests waiting for a processing slot"
+)
+ERRORS = Counter(
+    "loppestars_errors_total",
+    "Failed requests or batch items by endpoint and exception type",
+    ["endpoint", "error"]
+)
+
+_REGISTRY = [
+    STAGE_SECONDS, REQUEST_SECONDS, FACES_DETECTED, IMAGES_PROCESSED, CACHE_REQUESTS,
+    DETECTION_CACHE_REQUESTS, NO_FACE_PRECHECKS, MARKET_SNAPSHOT_REFRESHES, MARKET_SNAPSHOT_GENERATION,
+    MARKET_SNAPSHOT_LOADED, MARKET_SNAPSHOT_MARKETS, ADMISSION_REJECTIONS, ADMISSION_IN_FLIGHT, ADMISSION_QUEUED, ERRORS
+]
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return "\n".join(metric.render() for metric in _REGISTRY) + "\n"
+
+
+class Trace:
+    """Per-request stage timings, logged as one JSON line when sampled."""
+
+    def __init__(self, endpoint: str, sampled: bool):
+        self.endpoint = endpoint
+        self.sampled = sampled
+        self.id = uuid.uuid4().hex[:16]
+        self.start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.attributes: Dict[str, object] = {}
+
+    def record(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def log(self, status: str):
+        print(json.dumps({
+            "trace": self.id,
+            "endpoint": self.endpoint,
+            "status": status,
+            "total_ms": round(1000 * (time.perf_counter() - self.start), 2),
+            "stages_ms": {stage: round(1000 * seconds, 2) for stage, seconds in self.stages.items()},
+            **self.attributes
+        }))
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+
+
+def observe_stage(stage: str, seconds: float):
+    """Record a stage duration in the histogram and the current request's trace."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record(stage, seconds)
+
+
+def observe_stages(timings: Dict[str, float]):
+    """Record stage durations measured elsewhere (e.g. on an executor thread)."""
+    for stage, seconds in timings.items():
+        observe_stage(stage, seconds)
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """Time a block as one pipeline stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+@contextmanager
+def request_trace(endpoint: str) -> Iterator[Trace]:
+    """
+    Time a request, count its errors and make its trace current so stages
+    observed anywhere in the request (including storage calls) are attached.
+
+    Args:
+        endpoint: Endpoint label, e.g. "process"
+
+    Yields:
+        Trace of the request (attributes can be added for the log line)
+    """
+    trace = Trace(endpoint, TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE)
+    token = _current_trace.set(trace)
+    status = "ok"
+    try:
+        yield trace
+    except BaseException as e:
+        status_code = getattr(e, "status_code", None)
+        status = f"http_{status_code}" if status_code else type(e).__name__
+        ERRORS.inc(endpoint=endpoint, error=status)
+        raise
+    finally:
+        _current_trace.reset(token)
+        REQUEST_SECONDS.observe(time.perf_counter() - trace.start, endpoint=endpoint)
+        if trace.sampled:
+            trace.log(status)
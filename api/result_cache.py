@@ -0,0 +1,280 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+# Set to "false" to disable result caching
+RESULT_CACHE_ENABLED = os.environ.get("RESULT_CACHE_ENABLED", "true").lower() == "true"
+# Number of results kept in memory
+RESULT_CACHE_MEMORY_ENTRIES = int(os.environ.get("RESULT_CACHE_MEMORY_ENTRIES", "1024"))
+# Directory and size budget (bytes) of the disk tier; an empty directory disables it
+RESULT_CACHE_DIR = os.environ.get("RESULT_CACHE_DIR", "/app/cache/results")
+RESULT_CACHE_DISK_BYTES = int(os.environ.get("RESULT_CACHE_DISK_BYTES", str(64 * 1024 * 1024)))
+
+# Set to "false" to disable stored detections (face boxes per source image, reused
+# when only the anonymization parameters change)
+DETECTION_CACHE_ENABLED = os.environ.get("DETECTION_CACHE_ENABLED", "true").lower() == "true"
+# Number of detections kept in memory
+DETECTION_CACHE_MEMORY_ENTRIES = int(os.environ.get("DETECTION_CACHE_MEMORY_ENTRIES", "4096"))
+# Directory and size budget (bytes) of the detection disk tier; an empty directory disables it
+DETECTION_CACHE_DIR = os.environ.get("DETECTION_CACHE_DIR", "/app/cache/detections")
+DETECTION_CACHE_DISK_BYTES = int(os.environ.get("DETECTION_CACHE_DISK_BYTES", str(16 * 1024 * 1024)))
+
+
+def content_digest(data: bytes) -> str:
+    """SHA-256 hex digest of the source image bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def result_cache_key(source_digest: str, **params) -> str:
+    """
+    Build a cache key from the source digest and the processing parameters.
+
+    Args:
+        source_digest: Digest of the source image (see content_digest)
+        **params: Parameters that affect the processed output
+
+    Returns:
+        Hex digest identifying the (source, parameters) combination
+    """
+    canonical = json.dumps(params, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{source_digest}:{canonical}".encode()).hexdigest()
+
+
+def detection_cache_key(
+    source_digest: str,
+    max_dimension: int,
+    detection_strategy: str,
+    detector: str,
+    confidence_threshold: float,
+    frame_dimension: Optional[int] = None
+) -> str:
+    """
+    Build the key of stored detections: only parameters that change which
+    faces are found, so any anonymization mode or strength shares one entry.
+
+    Args:
+        source_digest: Digest of the source image (see content_digest)
+        max_dimension: Detection downscale dimension
+        detection_strategy: Detection strategy ("single", "tiled" or "adaptive")
+        detector: Resolved detector backend name
+        confidence_threshold: Minimum detection confidence
+        frame_dimension: Longest side sources are decoded to (boxes are in those pixels)
+
+    Returns:
+        Hex digest identifying the (source, detection parameters) combination
+    """
+    return result_cache_key(
+        source_digest,
+        kind="detections",
+        maxDimension=max_dimension,
+        detectionStrategy=detection_strategy,
+        detector=detector,
+        confidenceThreshold=confidence_threshold,
+        frameDimension=frame_dimension
+    )
+
+
+class _MemoryLRU:
+    """Bounded in-memory LRU of JSON-serializable values."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(0, max_entries)
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]):
+        if self.max_entries == 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class _DiskLRU:
+    """
+    Disk tier storing one JSON file per key, evicting the least recently
+    used files once the total size exceeds the byte budget.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._total_bytes = 0
+        # key -> file size, least recently used first
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+
+        os.makedirs(directory, exist_ok=True)
+        existing = []
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if name.endswith(".json"):
+                    stat = os.stat(os.path.join(root, name))
+                    existing.append((stat.st_mtime, name[:-5], stat.st_size))
+        for _, key, size in sorted(existing):
+            self._index[key] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if key not in self._index:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                value = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            self._remove(key)
+            return None
+        self._index.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]):
+        path = self._path(key)
+        data = json.dumps(value).encode()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        self._total_bytes += len(data) - self._index.get(key, 0)
+        self._index[key] = len(data)
+        self._index.move_to_end(key)
+        self._evict()
+
+    def _remove(self, key: str):
+        self._total_bytes -= self._index.pop(key, 0)
+        try:
+            os.unlink(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._index:
+            self._remove(next(iter(self._index)))
+
+
+class ResultCache:
+    """
+    Two-tier (memory + disk) LRU cache for processed image results,
+    keyed by source content hash plus processing parameters.
+    Also holds stored detections (see get_detection_cache).
+    """
+
+    def __init__(
+        self,
+        memory_entries: int = RESULT_CACHE_MEMORY_ENTRIES,
+        disk_dir: Optional[str] = RESULT_CACHE_DIR,
+        disk_bytes: int = RESULT_CACHE_DISK_BYTES
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            memory_entries: Maximum number of entries in the memory tier
+            disk_dir: Directory for the disk tier (None or "" disables it)
+            disk_bytes: Size budget of the disk tier in bytes
+        """
+        self._memory = _MemoryLRU(memory_entries)
+        self._disk: Optional[_DiskLRU] = None
+        self._lock = threading.Lock()
+
+        if disk_dir:
+            try:
+                self._disk = _DiskLRU(disk_dir, disk_bytes)
+            except OSError as e:
+                print(f"Warning: result cache disk tier disabled: {e}")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached result, promoting disk hits into memory.
+
+        Args:
+            key: Cache key (see result_cache_key)
+
+        Returns:
+            Cached result, or None on a miss
+        """
+        with self._lock:
+            value = self._memory.get(key)
+            if value is None and self._disk is not None:
+                value = self._disk.get(key)
+                if value is not None:
+                    self._memory.put(key, value)
+            return value
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """
+        Store a result in both tiers.
+
+        Args:
+            key: Cache key (see result_cache_key)
+            value: JSON-serializable result
+        """
+        with self._lock:
+            self._memory.put(key, value)
+            if self._disk is not None:
+                try:
+                    self._disk.put(key, value)
+                except OSError as e:
+                    print(f"Warning: could not write result cache entry: {e}")
+
+
+# Singleton instance for reuse
+_cache_instance: Optional[ResultCache] = None
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """
+    Get or create the singleton ResultCache.
+
+    Returns:
+        ResultCache instance, or None when RESULT_CACHE_ENABLED is false
+    """
+    global _cache_instance
+
+    if not RESULT_CACHE_ENABLED:
+        return None
+
+    if _cache_instance is None:
+        _cache_instance = ResultCache()
+
+    return _cache_instance
+
+
+# Singleton instance for reuse
+_detection_cache_instance: Optional[ResultCache] = None
+
+
+def get_detection_cache() -> Optional[ResultCache]:
+    """
+    Get or create the singleton cache of stored detections.
+
+    Returns:
+        ResultCache instance, or None when DETECTION_CACHE_ENABLED is false
+    """
+    global _detection_cache_instance
+
+    if not DETECTION_CACHE_ENABLED:
+        return None
+
+    if _detection_cache_instance is None:
+        _detection_cache_instance = ResultCache(
+            DETECTION_CACHE_MEMORY_ENTRIES, DETECTION_CACHE_DIR, DETECTION_CACHE_DISK_BYTES
+        )
+
+    return _detection_cache_instance
@@ -11,6 +11,8 @@ from datetime import datetime
 import schedule
 import time
 
+from market_snapshot import mark_scraped
+
 # Add the scrapy project to Python path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'scrapy_project'))
 
@@ -112,6 +114,12 @@ def run_scraper():
             
             logger.info("")
 
+        # Let API processes in this container refresh their market snapshot now
+        try:
+            mark_scraped()
+        except OSError as e:
+            logger.warning(f"Could not touch the market scrape stamp: {e}")
+
         total_duration = time.time() - total_start
         logger.info("="*80)
         logger.info(f"Scraper run completed in {total_duration:.2f} seconds ({total_duration/60:.1f} minutes)")
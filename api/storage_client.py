@@ -0,0 +1,307 @@
+import asyncio
+import json
+import os
+import random
+import ssl
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import aiohttp
+
+from metrics import stage_timer
+
+
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+SUPABASE_SERVICE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+SOURCE_BUCKET = os.environ.get("SOURCE_BUCKET", "stall-photos")
+STORAGE_BUCKET = os.environ.get("STORAGE_BUCKET", "stall-photos-processed")
+
+# Maximum number of pooled connections to Supabase Storage
+STORAGE_CONCURRENCY = int(os.environ.get("STORAGE_CONCURRENCY", "16"))
+# Seconds an idle connection is kept open for reuse
+STORAGE_KEEPALIVE = float(os.environ.get("STORAGE_KEEPALIVE", "60"))
+# Connect and total timeouts (seconds) for a single storage request
+STORAGE_CONNECT_TIMEOUT = float(os.environ.get("STORAGE_CONNECT_TIMEOUT", "5"))
+STORAGE_TIMEOUT = float(os.environ.get("STORAGE_TIMEOUT", "30"))
+# Retries for connection errors, 429 and 5xx responses
+STORAGE_MAX_RETRIES = int(os.environ.get("STORAGE_MAX_RETRIES", "3"))
+STORAGE_BACKOFF_BASE = float(os.environ.get("STORAGE_BACKOFF_BASE", "0.2"))
+STORAGE_BACKOFF_MAX = float(os.environ.get("STORAGE_BACKOFF_MAX", "3"))
+# Read source objects with the service key instead of signing a URL first
+STORAGE_DIRECT_READ = os.environ.get("STORAGE_DIRECT_READ", "true").lower() == "true"
+# Lifetime of signed download URLs; cached URLs are reused until shortly before expiry
+STORAGE_SIGNED_URL_TTL = int(os.environ.get("STORAGE_SIGNED_URL_TTL", "600"))
+STORAGE_SIGNED_URL_CACHE_SIZE = int(os.environ.get("STORAGE_SIGNED_URL_CACHE_SIZE", "1024"))
+
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+async def _read_body(response: aiohttp.ClientResponse, max_bytes: Optional[int] = None) -> bytes:
+    """
+    Read a response body into one preallocated buffer when its length is known.
+    response.read() collects the chunks and joins them, briefly holding every
+    downloaded image twice; the bytearray is filled as chunks arrive and is
+    decoded later without another copy (np.frombuffer accepts it).
+
+    Raises:
+        StorageError: (413) When a successful response is larger than max_bytes
+    """
+    length = response.content_length
+    if max_bytes is not None and response.status == 200:
+        if length is not None and length > max_bytes:
+            raise StorageError(f"Object is {length} bytes; the limit is {max_bytes}", 413)
+        if length is None:
+            # Unannounced size: stop reading as soon as the limit is passed
+            body = bytearray()
+            async for chunk in response.content.iter_any():
+                body += chunk
+                if len(body) > max_bytes:
+                    raise StorageError(f"Object is larger than the limit of {max_bytes} bytes", 413)
+            return body
+    if length is None:
+        return await response.read()
+
+    body = bytearray(length)
+    view = memoryview(body)
+    received = 0
+    async for chunk in response.content.iter_any():
+        end = received + len(chunk)
+        if end > length:
+            # Longer than announced (should not happen): fall back to a growing buffer
+            view.release()
+            del body[received:]
+            body += chunk
+            body += await response.content.read()
+            return body
+        view[received:end] = chunk
+        received = end
+    view.release()
+    if received < length:
+        del body[received:]
+    return body
+
+
+class StorageError(RuntimeError):
+    """Raised when a Supabase Storage request fails."""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class SupabaseStorageClient:
+    """
+    Supabase Storage client with a persistent keep-alive connection pool,
+    signed-URL caching and retry with jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        url: str = SUPABASE_URL,
+        service_key: str = SUPABASE_SERVICE_KEY,
+        source_bucket: str = SOURCE_BUCKET,
+        dest_bucket: str = STORAGE_BUCKET,
+        pool_size: int = STORAGE_CONCURRENCY,
+        keepalive: float = STORAGE_KEEPALIVE,
+        connect_timeout: float = STORAGE_CONNECT_TIMEOUT,
+        timeout: float = STORAGE_TIMEOUT,
+        max_retries: int = STORAGE_MAX_RETRIES,
+        direct_read: bool = STORAGE_DIRECT_READ,
+        signed_url_ttl: int = STORAGE_SIGNED_URL_TTL
+    ):
+        """
+        Initialize the storage client (the HTTP session is created on first use).
+
+        Args:
+            url: Supabase project URL
+            service_key: Supabase service role key
+            source_bucket: Bucket holding uploaded photos
+            dest_bucket: Bucket receiving processed photos
+            pool_size: Maximum number of pooled connections
+            keepalive: Seconds an idle connection is kept for reuse
+            connect_timeout: Connect timeout in seconds
+            timeout: Total timeout in seconds per request attempt
+            max_retries: Retries for transient failures
+            direct_read: Try reading objects with the service key before signing
+            signed_url_ttl: Expiry in seconds requested for signed URLs
+        """
+        self.url = url
+        self.service_key = service_key
+        self.source_bucket = source_bucket
+        self.dest_bucket = dest_bucket
+        self.pool_size = max(1, pool_size)
+        self.keepalive = keepalive
+        self.max_retries = max(0, max_retries)
+        self.direct_read = direct_read
+        self.signed_url_ttl = signed_url_ttl
+        self._timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        # One SSL context for all connections so TLS sessions can be resumed
+        self._ssl_context = ssl.create_default_context()
+        # path -> (signed URL, expiry timestamp)
+        self._signed_urls: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    @property
+    def _auth_headers(self) -> dict:
+        return {
+            "apikey": self.service_key,
+            "Authorization": f"Bearer {self.service_key}"
+        }
+
+    async def session(self) -> aiohttp.ClientSession:
+        """Get (or lazily create) the pooled HTTP session."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                keepalive_timeout=self.keepalive,
+                ttl_dns_cache=300,
+                ssl=self._ssl_context
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self._timeout)
+        return self._session
+
+    async def _request(self, method: str, url: str, max_bytes: Optional[int] = None, **kwargs) -> Tuple[int, bytes]:
+        """
+        Send a request, retrying connection errors, 429 and 5xx responses.
+
+        Args:
+            method: HTTP method
+            url: Request URL
+            max_bytes: Reject successful responses with a larger body (StorageError 413)
+            **kwargs: Passed to aiohttp
+
+        Returns:
+            Tuple of (status, body) of the last attempt
+        """
+        session = await self.session()
+        attempt = 0
+        while True:
+            try:
+                async with session.request(method, url, **kwargs) as response:
+                    body = await _read_body(response, max_bytes)
+                    if response.status not in _RETRY_STATUSES or attempt >= self.max_retries:
+                        return response.status, body
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt >= self.max_retries:
+                    raise StorageError(f"{method} {url} failed: {e}") from e
+
+            # Full jitter: sleep a random time up to the exponential backoff cap
+            delay = min(STORAGE_BACKOFF_MAX, STORAGE_BACKOFF_BASE * (2 ** attempt))
+            await asyncio.sleep(random.uniform(0, delay))
+            attempt += 1
+
+    async def _signed_download_url(self, image_path: str) -> str:
+        """Get a signed download URL for a source object, reusing cached URLs."""
+        cached = self._signed_urls.get(image_path)
+        if cached is not None and cached[1] > time.time():
+            self._signed_urls.move_to_end(image_path)
+            return cached[0]
+
+        sign_url = f"{self.url}/storage/v1/object/sign/{self.source_bucket}/{image_path}"
+        with stage_timer("storage_sign"):
+            status, body = await self._request(
+                "POST", sign_url,
+                headers=self._auth_headers,
+                json={"expiresIn": self.signed_url_ttl}
+            )
+        if status != 200:
+            raise StorageError(f"Failed to create signed URL: {status} {body[:200]!r}", status)
+
+        signed_path = json.loads(body).get("signedURL")
+        if not signed_path:
+            raise StorageError(f"No signed URL returned: {body[:200]!r}", status)
+
+        signed_url = f"{self.url}/storage/v1{signed_path}"
+        # Stop reusing the URL well before it actually expires
+        self._signed_urls[image_path] = (signed_url, time.time() + self.signed_url_ttl * 0.8)
+        while len(self._signed_urls) > STORAGE_SIGNED_URL_CACHE_SIZE:
+            self._signed_urls.popitem(last=False)
+        return signed_url
+
+    async def download(self, image_path: str, max_bytes: Optional[int] = None) -> bytes:
+        """
+        Download a source image.
+
+        Args:
+            image_path: Object path inside the source bucket
+            max_bytes: Largest accepted object; larger ones raise StorageError
+                (status 413) without being read in full
+
+        Returns:
+            Image bytes (a bytearray when the size was announced)
+        """
+        direct_status = None
+        if self.direct_read:
+            url = f"{self.url}/storage/v1/object/authenticated/{self.source_bucket}/{image_path}"
+            with stage_timer("storage_download"):
+                direct_status, body = await self._request("GET", url, max_bytes, headers=self._auth_headers)
+            if direct_status == 200:
+                return body
+            if direct_status not in (400, 401, 403):
+                raise StorageError(f"Download failed: {direct_status} {body[:200]!r}", direct_status)
+
+        signed_url = await self._signed_download_url(image_path)
+        with stage_timer("storage_download"):
+            status, body = await self._request("GET", signed_url, max_bytes, headers={"apikey": self.service_key})
+        if status != 200:
+            self._signed_urls.pop(image_path, None)
+            raise StorageError(f"Download failed: {status} {body[:200]!r}", status)
+
+        if direct_status is not None:
+            # Signing works where the direct read was rejected; stop trying direct reads
+            print(f"Warning: direct storage read rejected ({direct_status}), using signed URLs")
+            self.direct_read = False
+        return body
+
+    async def upload(self, image_bytes: bytes, dest_path: str, content_type: str = "image/jpeg") -> str:
+        """
+        Upload a processed image.
+
+        Args:
+            image_bytes: Encoded image
+            dest_path: Object path inside the destination bucket
+            content_type: MIME type of the image
+
+        Returns:
+            Public URL of the uploaded object
+        """
+        url = f"{self.url}/storage/v1/object/{self.dest_bucket}/{dest_path}"
+        # Upsert: when an attempt was stored but its response lost, the retry
+        # overwrites the same bytes instead of failing with "Duplicate"
+        # (dest_path is unique per upload, so nothing else is overwritten)
+        headers = {**self._auth_headers, "Content-Type": content_type, "x-upsert": "true"}
+        with stage_timer("storage_upload"):
+            status, body = await self._request("PUT", url, headers=headers, data=image_bytes)
+        if status not in (200, 201):
+            raise StorageError(f"Upload failed: {status} {body[:200]!r}", status)
+        return self.public_url(dest_path)
+
+    def public_url(self, dest_path: str) -> str:
+        """Public URL of an object in the destination bucket."""
+        return f"{self.url}/storage/v1/object/public/{self.dest_bucket}/{dest_path}"
+
+    async def close(self):
+        """Close the connection pool."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+# Singleton instance for reuse
+_storage_instance: Optional[SupabaseStorageClient] = None
+
+
+def get_storage_client() -> SupabaseStorageClient:
+    """
+    Get or create a singleton SupabaseStorageClient instance.
+
+    Returns:
+        SupabaseStorageClient instance
+    """
+    global _storage_instance
+
+    if _storage_instance is None:
+        _storage_instance = SupabaseStorageClient()
+
+    return _storage_instance
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Tests for image_ingest.passthrough_jpeg: photos served without re-encoding
+must keep none of the source's metadata (EXIF/GPS, XMP, MPF and the
+embedded images of multi-picture files) and decode to the same pixels.
+Runs with pytest or as a script.
+"""
+
+import struct
+
+import cv2
+import numpy as np
+
+from image_ingest import passthrough_jpeg
+
+
+GPS_TEXT = b"GPSLatitude 55.6761N GPSLongitude 12.5683E"
+
+
+def _jpeg(image: np.ndarray, progressive: bool = False) -> bytes:
+    flags = [cv2.IMWRITE_JPEG_QUALITY, 90, cv2.IMWRITE_JPEG_PROGRESSIVE, int(progressive)]
+    success, encoded = cv2.imencode(".jpg", image, flags)
+    assert success
+    return encoded.tobytes()
+
+
+def _segment(marker: int, payload: bytes) -> bytes:
+    return struct.pack(">BBH", 0xFF, marker, len(payload) + 2) + payload
+
+
+def _exif(orientation: int = 1) -> bytes:
+    """APP1 EXIF segment with an orientation tag and GPS coordinates."""
+    ifd = struct.pack("<H", 1) + struct.pack("<HHIHH", 0x0112, 3, 1, orientation, 0) + struct.pack("<I", 0)
+    return _segment(0xE1, b"Exif\x00\x00" + b"II*\x00" + struct.pack("<I", 8) + ifd + GPS_TEXT)
+
+
+def _with_segments(jpeg: bytes, *segments: bytes) -> bytes:
+    """Insert segments right after SOI, like a camera writes them."""
+    return jpeg[:2] + b"".join(segments) + jpeg[2:]
+
+
+def _photo() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    image = cv2.resize(rng.integers(0, 255, (24, 32, 3), dtype=np.uint8), (320, 240))
+    cv2.putText(image, "LOPPE", (40, 130), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+    return image
+
+
+def _decode(data: bytes) -> np.ndarray:
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+
+def _assert_same_pixels(source: bytes, output: bytes):
+    assert np.array_equal(_decode(source), _decode(output))
+
+
+def test_multi_picture_file_with_trailing_data():
+    """MPF files: APP2 index, a second JPEG with its own EXIF after EOI, then trailing bytes."""
+    image = _photo()
+    main = _with_segments(
+        _jpeg(image), _exif(),
+        _segment(0xE2, b"MPF\x00" + b"II*\x00" + b"\x00" * 40),
+        _segment(0xE1, b"http://ns.adobe.com/xap/1.0/\x00<x:xmpmeta>" + GPS_TEXT + b"</x:xmpmeta>"),
+        _segment(0xFE, b"Comment " + GPS_TEXT)
+    )
+    embedded = _with_segments(_jpeg(cv2.resize(image, (160, 120))), _exif())
+    source = main + embedded + b"TRAILER" + GPS_TEXT
+
+    output = passthrough_jpeg(source, image.shape)
+
+    assert output is not None
+    assert output.endswith(b"\xff\xd9") and output.count(b"\xff\xd8") == 1
+    for leaked in (b"Exif", b"MPF", b"GPS", b"xmpmeta", b"Comment", b"TRAILER"):
+        assert leaked not in output, leaked
+    _assert_same_pixels(source, output)
+
+
+def test_progressive_scans_are_copied():
+    image = _photo()
+    source = _with_segments(_jpeg(image, progressive=True), _exif()) + b"\x00" * 16
+    output = passthrough_jpeg(source, image.shape)
+    assert output is not None and b"GPS" not in output
+    _assert_same_pixels(source, output)
+
+
+def test_icc_profile_kept_other_app2_dropped():
+    image = _photo()
+    icc = _segment(0xE2, b"ICC_PROFILE\x00\x01\x01" + b"profile-bytes")
+    flashpix = _segment(0xE2, b"FPXR\x00" + b"flashpix-bytes")
+    output = passthrough_jpeg(_with_segments(_jpeg(image), icc, flashpix), image.shape)
+    assert output is not None
+    assert icc in output and b"flashpix-bytes" not in output
+
+
+def test_falls_back_to_reencoding():
+    image = _photo()
+    jpeg = _jpeg(image)
+    # EXIF rotation would be lost with the EXIF segment
+    assert passthrough_jpeg(_with_segments(jpeg, _exif(orientation=6)), image.shape) is None
+    # Unknown segment (JPEG-LS frame)
+    assert passthrough_jpeg(_with_segments(jpeg, _segment(0xF7, b"\x00" * 8)), image.shape) is None
+    # Truncated before EOI
+    assert passthrough_jpeg(jpeg[:len(jpeg) // 2], image.shape) is None
+    # Decoded at another size
+    assert passthrough_jpeg(jpeg, (120, 160, 3)) is None
+    # Not a JPEG
+    success, png = cv2.imencode(".png", image)
+    assert passthrough_jpeg(png.tobytes(), image.shape) is None
+
+
+if __name__ == "__main__":
+    tests = [(name, test) for name, test in sorted(globals().items()) if name.startswith("test_")]
+    for name, test in tests:
+        test()
+        print(f"✅ {name}")
+    print(f"\n{len(tests)} tests passed")
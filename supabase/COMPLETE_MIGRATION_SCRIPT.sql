@@ -1006,13 +1006,101 @@ GRANT EXECUTE ON FUNCTION public.handle_new_user_admin_assignment() TO anon;
 COMMENT ON FUNCTION public.handle_new_user_admin_assignment() IS 'Automatically assigns admin role to users with ADMIN_EMAIL on signup';
 COMMENT ON TRIGGER trigger_auto_admin_assignment ON auth.users IS 'Auto-assigns admin role to ADMIN_EMAIL user on signup';
 
+-- ============================================================================
+-- 027: CREATE NEARBY MARKETS FUNCTION
+-- ============================================================================
+
+-- Markets starting between from_date and to_date within radius_km of a point,
+-- nearest first. A bounding box on (latitude, longitude) narrows the rows
+-- through idx_markets_location before the exact haversine distance is computed.
+CREATE OR REPLACE FUNCTION public.nearby_markets(
+    user_latitude DOUBLE PRECISION,
+    user_longitude DOUBLE PRECISION,
+    radius_km DOUBLE PRECISION DEFAULT 50,
+    from_date DATE DEFAULT CURRENT_DATE,
+    to_date DATE DEFAULT CURRENT_DATE + 30,
+    max_results INTEGER DEFAULT 50
+)
+RETURNS TABLE (market public.markets, distance DOUBLE PRECISION)
+LANGUAGE sql
+STABLE
+AS $$
+    WITH bounds AS (
+        -- Angular radius, plus a little slack so rounding never drops an edge row
+        SELECT
+            degrees(radius_km / 6371.0) + 0.000001 AS dlat,
+            -- Widest longitude offset of the circle; NULL when it contains a pole
+            CASE
+                WHEN abs(user_latitude) + degrees(radius_km / 6371.0) < 90
+                     AND sin(radius_km / 6371.0) < cos(radians(user_latitude))
+                THEN degrees(asin(sin(radius_km / 6371.0) / cos(radians(user_latitude)))) + 0.000001
+            END AS dlon
+    ),
+    candidates AS (
+        -- Bounds are cast to numeric so the comparisons can use idx_markets_location
+        SELECT m AS market_row, m.id, m.latitude::float8 AS lat, m.longitude::float8 AS lon
+        FROM public.markets m, bounds b
+        WHERE m.start_date BETWEEN from_date AND to_date
+          AND m.latitude BETWEEN (user_latitude - b.dlat)::numeric AND (user_latitude + b.dlat)::numeric
+          AND (
+              b.dlon IS NULL
+              OR user_longitude - b.dlon < -180
+              OR user_longitude + b.dlon > 180
+              OR m.longitude BETWEEN (user_longitude - b.dlon)::numeric AND (user_longitude + b.dlon)::numeric
+          )
+          -- Rows without real coordinates are skipped, as the API always did
+          AND m.latitude <> 0
+          AND m.longitude <> 0
+    )
+    SELECT c.market_row, d.distance_km
+    FROM candidates c,
+    LATERAL (
+        -- Haversine, in the same form as the API's calculate_distance
+        SELECT 2 * 6371 * asin(least(1.0, sqrt(
+            sin((radians(c.lat) - radians(user_latitude)) / 2) ^ 2
+            + cos(radians(user_latitude)) * cos(radians(c.lat))
+            * sin((radians(c.lon) - radians(user_longitude)) / 2) ^ 2
+        ))) AS distance_km
+    ) d
+    WHERE d.distance_km <= radius_km
+    ORDER BY d.distance_km, c.id
+    LIMIT max_results;
+$$;
+
+-- Markets are public (see "Everyone can read markets")
+GRANT EXECUTE ON FUNCTION public.nearby_markets TO anon;
+GRANT EXECUTE ON FUNCTION public.nearby_markets TO authenticated;
+GRANT EXECUTE ON FUNCTION public.nearby_markets TO service_role;
+
+-- Function comment
+COMMENT ON FUNCTION public.nearby_markets IS 'Markets starting in a date window within radius_km of a point, nearest first (bounding-box prefilter on idx_markets_location, exact haversine)';
+
+-- ============================================================================
+-- 028: ALLOW AVIF PROCESSED PHOTOS
+-- ============================================================================
+
+-- Add image/avif to the processed bucket (safe to run more than once)
+DO $$
+BEGIN
+    UPDATE storage.buckets
+    SET allowed_mime_types = array_append(allowed_mime_types, 'image/avif')
+    WHERE id = 'stall-photos-processed'
+      AND allowed_mime_types IS NOT NULL
+      AND NOT ('image/avif' = ANY (allowed_mime_types));
+    
+    RAISE NOTICE 'AVIF allowed in stall-photos-processed';
+EXCEPTION
+    WHEN OTHERS THEN
+        RAISE NOTICE 'AVIF bucket update completed with warnings: %', SQLERRM;
+END $$;
+
 -- Success message
 SELECT 'Role-based database system migration completed successfully!' as result;
 
 -- ============================================================================
 -- MIGRATION COMPLETE
 -- ============================================================================
--- All 26 migrations have been executed successfully!
+-- All 28 migrations have been executed successfully!
 -- Your role-based system is now ready with:
 -- ✅ Complete table structure (markets, ratings, events, scraping_logs, user_roles)
 -- ✅ Role system (visitor, seller, organiser, admin) with organiser as simple label
@@ -1020,7 +1108,8 @@ SELECT 'Role-based database system migration completed successfully!' as result;
 -- ✅ Admin system with ADMIN_EMAIL integration
 -- ✅ Auto admin assignment trigger for ADMIN_EMAIL users
 -- ✅ Row Level Security policies
--- ✅ Storage buckets and policies
+-- ✅ Storage buckets and policies (AVIF allowed for processed photos)
 -- ✅ Event tracking system
 -- ✅ Function permissions granted
+-- ✅ Nearby markets search function (nearby_markets)
 -- ============================================================================
\ No newline at end of file
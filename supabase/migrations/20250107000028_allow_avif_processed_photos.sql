@@ -0,0 +1,22 @@
+-- ============================================================================
+-- ALLOW AVIF PROCESSED PHOTOS
+-- ============================================================================
+-- The API can write AVIF derivatives (format "avif" on OpenCV builds with an
+-- AVIF encoder); without this the processed bucket rejects their uploads
+-- Created: 2025-01-07
+-- ============================================================================
+
+-- Add image/avif to the processed bucket (safe to run more than once)
+DO $$
+BEGIN
+    UPDATE storage.buckets
+    SET allowed_mime_types = array_append(allowed_mime_types, 'image/avif')
+    WHERE id = 'stall-photos-processed'
+      AND allowed_mime_types IS NOT NULL
+      AND NOT ('image/avif' = ANY (allowed_mime_types));
+    
+    RAISE NOTICE 'AVIF allowed in stall-photos-processed';
+EXCEPTION
+    WHEN OTHERS THEN
+        RAISE NOTICE 'AVIF bucket update completed with warnings: %', SQLERRM;
+END $$;
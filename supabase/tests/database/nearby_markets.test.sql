@@ -0,0 +1,78 @@
+-- ============================================================================
+-- TESTS: NEARBY MARKETS FUNCTION
+-- ============================================================================
+-- pgTAP tests for public.nearby_markets (run with: supabase test db)
+-- Fixtures use dates in 2030 and roll back, so live markets are untouched
+-- ============================================================================
+
+BEGIN;
+
+CREATE EXTENSION IF NOT EXISTS pgtap WITH SCHEMA extensions;
+
+SELECT plan(9);
+
+SELECT has_function(
+    'public', 'nearby_markets',
+    ARRAY['double precision', 'double precision', 'double precision', 'date', 'date', 'integer'],
+    'nearby_markets(lat, lon, radius, from, to, limit) exists'
+);
+
+-- Around Copenhagen Town Hall Square (55.6761, 12.5683)
+INSERT INTO public.markets (external_id, name, start_date, end_date, latitude, longitude) VALUES
+    ('test-nearby-townhall', 'Town Hall Square', '2030-06-01', '2030-06-01', 55.6761, 12.5683),
+    ('test-nearby-norrebro', 'Nørrebro', '2030-06-02', '2030-06-02', 55.6950, 12.5500),
+    ('test-nearby-roskilde', 'Roskilde', '2030-06-03', '2030-06-03', 55.6419, 12.0878),
+    ('test-nearby-aarhus', 'Aarhus', '2030-06-04', '2030-06-04', 56.1629, 10.2039),
+    ('test-nearby-later', 'Later in the year', '2030-09-01', '2030-09-01', 55.6800, 12.5700),
+    ('test-nearby-nowhere', 'No coordinates', '2030-06-05', '2030-06-05', NULL, NULL),
+    ('test-nearby-zero', 'Zero coordinates', '2030-06-05', '2030-06-05', 0, 0);
+
+SELECT results_eq(
+    $$ SELECT (market).external_id::text FROM public.nearby_markets(55.6761, 12.5683, 50, '2030-06-01', '2030-06-30', 10) $$,
+    ARRAY['test-nearby-townhall', 'test-nearby-norrebro', 'test-nearby-roskilde']::text[],
+    'Markets within the radius and date window, nearest first'
+);
+
+SELECT results_eq(
+    $$ SELECT (market).external_id::text FROM public.nearby_markets(55.6761, 12.5683, 500, '2030-06-01', '2030-06-30', 10) $$,
+    ARRAY['test-nearby-townhall', 'test-nearby-norrebro', 'test-nearby-roskilde', 'test-nearby-aarhus']::text[],
+    'A larger radius reaches Aarhus; rows without coordinates are never returned'
+);
+
+SELECT results_eq(
+    $$ SELECT (market).external_id::text FROM public.nearby_markets(55.6761, 12.5683, 500, '2030-06-01', '2030-06-30', 2) $$,
+    ARRAY['test-nearby-townhall', 'test-nearby-norrebro']::text[],
+    'max_results limits the rows after ordering'
+);
+
+SELECT results_eq(
+    $$ SELECT (market).external_id::text FROM public.nearby_markets(55.6761, 12.5683, 50, '2030-08-01', '2030-09-30', 10) $$,
+    ARRAY['test-nearby-later']::text[],
+    'Only markets starting in the date window'
+);
+
+SELECT is(
+    (SELECT distance FROM public.nearby_markets(55.6761, 12.5683, 50, '2030-06-01', '2030-06-01', 1)),
+    0::double precision,
+    'A market at the search point is 0 km away'
+);
+
+-- Reference distances from the API's calculate_distance
+SELECT ok(
+    (SELECT abs(distance - 30.38) < 0.01 FROM public.nearby_markets(55.6761, 12.5683, 50, '2030-06-03', '2030-06-03', 1)),
+    'Roskilde is ~30.38 km from Town Hall Square'
+);
+
+SELECT ok(
+    (SELECT abs(distance - 156.94) < 0.01 FROM public.nearby_markets(55.6761, 12.5683, 500, '2030-06-04', '2030-06-04', 1)),
+    'Aarhus is ~156.94 km from Town Hall Square'
+);
+
+SELECT is_empty(
+    $$ SELECT 1 FROM public.nearby_markets(55.6761, 12.5683, 30, '2030-06-03', '2030-06-03', 10) $$,
+    'A radius just short of Roskilde excludes it'
+);
+
+SELECT * FROM finish();
+
+ROLLBACK;